@@ -1,8 +1,39 @@
 import json, os
 from PyQt6.QtWidgets import (QWidget, QFormLayout, QComboBox, QSpinBox, 
                           QVBoxLayout, QLineEdit, QDateEdit, QPushButton, 
-                          QMessageBox, QHBoxLayout, QLabel)
-from PyQt6.QtCore import Qt, QDate
+                          QMessageBox, QHBoxLayout, QLabel, QScrollArea, QFileDialog, QCompleter,
+                          QInputDialog)
+from PyQt6.QtCore import Qt, QDate, QStringListModel, QObject, QRunnable, QThreadPool, pyqtSignal
+from roster import read_roster, build_pools, DEFAULT_PAYMENT, MAX_PARTICIPANTS
+from planner import format_plan, simulate_plan
+
+
+class DepositPlanSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class DepositPlanTask(QRunnable):
+    """
+    Симуляция взноса в пуле потоков Qt, чтобы окно не замирало на время расчёта.
+    Считается в одном потоке: пул процессов внутри приложения Qt не запускается.
+    """
+
+    def __init__(self, fitted, days):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fitted = fitted
+        self.days = days
+        self.signals = DepositPlanSignals()
+
+    def run(self):
+        try:
+            plan = simulate_plan(self.fitted, self.days, workers=1)
+        except ValueError as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(plan)
+
 
 class AddExpeditionWidget(QWidget):
     def __init__(self, parent=None):
@@ -12,6 +43,11 @@ class AddExpeditionWidget(QWidget):
         """
         super().__init__(parent)
         self.parent = parent
+        # Справочник участников архива для подсказок имён (если папка архива задана)
+        self.participant_directory = None
+        if hasattr(parent, "get_participant_directory"):
+            self.participant_directory = parent.get_participant_directory()
+        self.plan_task = None  # идущий расчёт взноса
         self.init_ui()
 
     def init_ui(self):
@@ -43,11 +79,32 @@ class AddExpeditionWidget(QWidget):
         
         # Настройка поля количества участников
         self.participant_count = QSpinBox()
+        self.participant_count.setRange(1, MAX_PARTICIPANTS)
         self.participant_count.setValue(1)
         self.participant_count.valueChanged.connect(self.update_participant_fields)
+        import_btn = QPushButton("Загрузить список...")
+        import_btn.clicked.connect(self.import_roster)
+        count_layout = QHBoxLayout()
+        count_layout.addWidget(self.participant_count)
+        count_layout.addWidget(import_btn)
         
-        # Создание контейнера для полей участников
-        self.participant_fields = QVBoxLayout()
+        # Создание контейнера для полей участников.
+        # Строки не пересоздаются: при изменении количества добавляются или скрываются
+        # только строки разницы, скрытые строки переиспользуются.
+        self.participant_rows = []
+        roster_widget = QWidget()
+        self.participant_fields = QVBoxLayout(roster_widget)
+        self.participant_fields.setContentsMargins(0, 0, 0, 0)
+        self.participant_fields.addStretch()
+        self.roster_area = QScrollArea()
+        self.roster_area.setWidgetResizable(True)
+        self.roster_area.setWidget(roster_widget)
+        self.roster_area.setMinimumHeight(120)
+        # Один список подсказок на все строки: он переключается на поле, в котором печатают
+        self.name_model = QStringListModel(self)
+        self.name_completer = QCompleter(self.name_model, self)
+        self.name_completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.name_completer.activated[str].connect(self.on_name_completed)
         self.update_participant_fields()
         
         # Настройка полей дат и длительности
@@ -56,6 +113,11 @@ class AddExpeditionWidget(QWidget):
         self.track_days = QSpinBox()
         self.track_days.setValue(self.treks[self.hike_name.currentText()])
         self.track_days.valueChanged.connect(self.update_end_date)
+        self.plan_btn = QPushButton("Рассчитать взнос...")
+        self.plan_btn.clicked.connect(self.plan_deposit)
+        days_layout = QHBoxLayout()
+        days_layout.addWidget(self.track_days)
+        days_layout.addWidget(self.plan_btn)
         
         # Установка начальных дат
         default_date = QDate(2025, 3, 20)
@@ -80,82 +142,207 @@ class AddExpeditionWidget(QWidget):
 
         # Добавление всех элементов в форму
         layout.addRow("Название похода:", self.hike_name)
-        layout.addRow("Количество участников:", self.participant_count)
-        layout.addRow("Имена участников:", self.participant_fields)
+        layout.addRow("Количество участников:", count_layout)
+        layout.addRow("Имена участников:", self.roster_area)
         layout.addRow("Дата начала:", self.start_date)
-        layout.addRow("Длительность похода (дней):", self.track_days)
+        layout.addRow("Длительность похода (дней):", days_layout)
         layout.addRow("Дата окончания:", self.end_date)
         layout.addRow(buttons_layout)  # Add buttons layout instead of single button
 
     def update_participant_fields(self):
         """
-        Обновляет поля для ввода информации об участниках.
-        Сохраняет введённые ранее данные, очищает старые поля и создаёт новые в соответствии с количеством участников.
-        Каждое поле состоит из строки для имени, спинбокса для суммы платежа и метки валюты.
+        Приводит число видимых строк участников к значению participant_count.
+        Добавляются или скрываются только строки разницы; скрытая строка очищается
+        и переиспользуется при следующем увеличении, введённые данные остальных строк не трогаются.
+        Каждая строка состоит из поля имени, спинбокса суммы платежа и метки валюты.
         """
-        # Сохраняем текущие данные участников, если они были введены
-        current_data = []
-        for i in range(self.participant_fields.count()):
-            row_layout = self.participant_fields.itemAt(i)
-            if row_layout and row_layout.layout():
-                name_widget = row_layout.layout().itemAt(0).widget()
-                payment_widget = row_layout.layout().itemAt(1).widget()
-                if name_widget and payment_widget:
-                    current_data.append({
-                        "name": name_widget.text(),
-                        "payment": payment_widget.value()
-                    })
-                else:
-                    current_data.append(None)
-            else:
-                current_data.append(None)
-
-        # Очистка существующих полей
-        while self.participant_fields.count():
-            item = self.participant_fields.takeAt(0)
-            if item and item.widget():
-                item.widget().deleteLater()
-            elif item and item.layout():
-                # Очистка вложенных виджетов в layout
-                while item.layout().count():
-                    child = item.layout().takeAt(0)
-                    if child.widget():
-                        child.widget().deleteLater()
-                item.layout().deleteLater()
-
-        # Создание новых полей на основе значения participant_count
-        for i in range(self.participant_count.value()):
-            # Создаем горизонтальный layout для строки участника
-            participant_row = QHBoxLayout()
-
-            # Создаем поле ввода имени участника
-            participant_name = QLineEdit()
-            participant_name.setPlaceholderText(f"Участник {i + 1}")
-            participant_name.setMinimumWidth(200)
-
-            # Создаем спинбокс для ввода суммы платежа
-            participant_payment = QSpinBox()
-            participant_payment.setMinimum(0)
-            participant_payment.setMaximum(1000000)
-            participant_payment.setSingleStep(1000)  # Шаг изменения значения — 1000
-
-            # Создаем метку валюты
-            currency_label = QLabel("рупий")
-
-            # Восстанавливаем данные, если они уже были введены
-            if i < len(current_data) and current_data[i]:
-                participant_name.setText(current_data[i]["name"])
-                participant_payment.setValue(current_data[i]["payment"])
+        count = self.participant_count.value()
+        visible = sum(1 for row in self.participant_rows if not row.isHidden())
+        for i in range(visible, count):
+            if i < len(self.participant_rows):
+                self.participant_rows[i].show()
             else:
-                participant_payment.setValue(20000)  # Значение по умолчанию
+                self.participant_rows.append(self._create_participant_row(i))
+        for i in range(count, visible):
+            row = self.participant_rows[i]
+            row.hide()
+            # Данные скрытой строки сбрасываются, как у новой
+            row.name_edit.clear()
+            row.name_edit.setToolTip("")
+            row.payment_spin.setValue(DEFAULT_PAYMENT)
+            row.carried = 0
+            row.carry_label.setText("")
+            row.team_edit.clear()
+
+    def _create_participant_row(self, i):
+        # Строка участника - отдельный виджет, чтобы её можно было скрыть целиком
+        participant_row = QWidget()
+        row_layout = QHBoxLayout(participant_row)
+        row_layout.setContentsMargins(0, 0, 0, 0)
+
+        # Создаем поле ввода имени участника
+        participant_row.name_edit = QLineEdit()
+        participant_row.name_edit.setPlaceholderText(f"Участник {i + 1}")
+        participant_row.name_edit.setMinimumWidth(200)
+        participant_row.name_edit.textEdited.connect(
+            lambda text, edit=participant_row.name_edit: self.suggest_names(edit, text))
+        participant_row.name_edit.editingFinished.connect(
+            lambda row=participant_row: self.apply_carry_over(row))
+
+        # Создаем спинбокс для ввода суммы платежа
+        participant_row.payment_spin = QSpinBox()
+        participant_row.payment_spin.setMinimum(0)
+        participant_row.payment_spin.setMaximum(1000000)
+        participant_row.payment_spin.setSingleStep(1000)  # Шаг изменения значения — 1000
+        participant_row.payment_spin.setValue(DEFAULT_PAYMENT)
+
+        # Связка участника: у каждой связки будет свой фонд внутри общака
+        participant_row.team_edit = QLineEdit()
+        participant_row.team_edit.setPlaceholderText("Связка")
+        participant_row.team_edit.setMaximumWidth(100)
+
+        # Остаток прошлых походов, уже включённый во взнос
+        participant_row.carried = 0
+        participant_row.carry_label = QLabel("")
+
+        row_layout.addWidget(participant_row.name_edit)
+        row_layout.addWidget(participant_row.payment_spin)
+        row_layout.addWidget(QLabel("рупий"))
+        row_layout.addWidget(participant_row.team_edit)
+        row_layout.addWidget(participant_row.carry_label)
+
+        # Строки идут перед растяжкой в конце списка
+        self.participant_fields.insertWidget(i, participant_row)
+        return participant_row
+
+    def suggest_names(self, edit, text):
+        """
+        Показывает подсказку имён из справочника участников по введённому началу.
+        """
+        if self.participant_directory is None:
+            return
+        names = self.participant_directory.complete(text) if text.strip() else []
+        self.name_model.setStringList(names)
+        if names:
+            self.name_completer.setWidget(edit)
+            self.name_completer.complete()
+        else:
+            self.name_completer.popup().hide()
+
+    def on_name_completed(self, name):
+        edit = self.name_completer.widget()
+        if edit is None:
+            return
+        edit.setText(name)
+        person = self.participant_directory.person(name)
+        if person is not None:
+            edit.setToolTip(f"Походов: {person['hikes']}, взносы: {round(person['paid'])}, "
+                            f"расходы: {round(person['spend'])}, остаток: {round(person['balance'])} рупий")
+        row = next((row for row in self.participant_rows if row.name_edit is edit), None)
+        if row is not None:
+            self.apply_carry_over(row)
+
+    def apply_carry_over(self, row):
+        """
+        Добавляет ко взносу участника остаток, оставленный им в прошлых походах.
+        Повторный вызов заменяет прежний перенос, а не добавляет его ещё раз.
+        """
+        if self.participant_directory is None:
+            return
+        carried = max(0, round(self.participant_directory.balance(row.name_edit.text())))
+        if carried == row.carried:
+            return
+        row.payment_spin.setValue(row.payment_spin.value() - row.carried + carried)
+        row.carried = carried
+        row.carry_label.setText(f"в т.ч. перенос {carried}" if carried else "")
 
-            # Добавляем виджеты в строку
-            participant_row.addWidget(participant_name)
-            participant_row.addWidget(participant_payment)
-            participant_row.addWidget(currency_label)
+    def get_participants(self):
+        """
+        Возвращает участников из видимых строк (без общака): [{"name", "payment"}],
+        у участников связок есть поле team.
+        """
+        participants = []
+        for i, row in enumerate(self.participant_rows[:self.participant_count.value()]):
+            participant = {"name": row.name_edit.text() or f"Участник {i + 1}", "payment": row.payment_spin.value()}
+            if row.carried:
+                # Перенесённое не считается остатком этого похода в справочнике участников
+                participant["carried_in"] = min(row.carried, participant["payment"])
+            if row.team_edit.text().strip():
+                participant["team"] = row.team_edit.text().strip()
+            participants.append(participant)
+        return participants
 
-            # Добавляем строку в основной layout для участников
-            self.participant_fields.addLayout(participant_row)
+    def set_participants(self, participants):
+        """
+        Заполняет список участников целиком (строки добавляются один раз, без пересборки).
+        """
+        self.participant_count.setValue(len(participants))
+        for row, participant in zip(self.participant_rows, participants):
+            row.name_edit.setText(participant["name"])
+            row.payment_spin.setValue(participant["payment"])
+            row.team_edit.setText(participant.get("team", ""))
+            row.carried = 0
+            self.apply_carry_over(row)
+
+    def import_roster(self):
+        """
+        Загружает список участников из файла CSV, TXT или JSON.
+        """
+        filename, _ = QFileDialog.getOpenFileName(self, "Список участников", "",
+                                                  "Списки участников (*.csv *.txt *.json)")
+        if not filename:
+            return
+        try:
+            participants = read_roster(filename)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить список: {str(e)}")
+            return
+        if not participants:
+            QMessageBox.warning(self, "Список участников", "В файле нет участников")
+            return
+        self.set_participants(participants)
+
+    def plan_deposit(self):
+        """
+        Рассчитывает взнос на человека по расходам прошлых походов этого трека
+        и по выбору ставит его всем участникам (перенос прошлых остатков сохраняется).
+        Распределения берутся из архива здесь, симуляция идёт в фоновом потоке.
+        """
+        planner = self.parent.get_budget_planner() if hasattr(self.parent, "get_budget_planner") else None
+        if planner is None:
+            QMessageBox.information(self, "Расчёт взноса", "Выберите папку архива походов в окне поиска")
+            return
+        if self.plan_task is not None:
+            return
+        self.plan_task = DepositPlanTask(planner.fit(self.hike_name.currentText()), self.track_days.value())
+        self.plan_task.signals.finished.connect(self._on_deposit_plan)
+        self.plan_task.signals.failed.connect(self._on_deposit_plan_failed)
+        self.plan_btn.setEnabled(False)
+        self.plan_btn.setText("Расчёт взноса...")
+        QThreadPool.globalInstance().start(self.plan_task)
+
+    def _finish_deposit_plan(self):
+        self.plan_task = None
+        self.plan_btn.setEnabled(True)
+        self.plan_btn.setText("Рассчитать взнос...")
+
+    def _on_deposit_plan_failed(self, message):
+        self._finish_deposit_plan()
+        QMessageBox.warning(self, "Расчёт взноса", message)
+
+    def _on_deposit_plan(self, plan):
+        """
+        Показывает рассчитанный взнос и по выбору ставит его всем участникам.
+        """
+        self._finish_deposit_plan()
+        items = [f"{level:.0%}: {deposit} рупий" for level, deposit in plan["levels"]]
+        item, ok = QInputDialog.getItem(self, "Расчёт взноса", format_plan(plan) + "\n\nПоставить всем взнос:",
+                                        items, len(items) - 1, False)
+        if not ok:
+            return
+        deposit = plan["levels"][items.index(item)][1]
+        for row in self.participant_rows[:self.participant_count.value()]:
+            row.payment_spin.setValue(deposit + row.carried)
 
     def update_end_date(self):
         """
@@ -201,38 +388,17 @@ class AddExpeditionWidget(QWidget):
         Формирует структуру данных и массив расходов.
         """
         hike_name = self.hike_name.currentText()
-        participants = []
         
-        # Получение базовых параметров
-        num_participants = self.participant_fields.count()
+        # Получение базовых параметров: участники, фонды связок и общак в конце
+        participants = build_pools(self.get_participants())
         num_days = self.track_days.value()
         
-        # Создание массива расходов с учётом общака
+        # Создание массива расходов с учётом фондов
         expenses_data = []
         for day in range(num_days):
-            day_expenses = ["0"] * (num_participants + 1)  # +1 для общака
+            day_expenses = ["0"] * len(participants)
             expenses_data.append(day_expenses)
         
-        # Сбор информации об участниках
-        for i in range(num_participants):
-            row_layout = self.participant_fields.itemAt(i)
-            name_widget = row_layout.layout().itemAt(0).widget()
-            payment_widget = row_layout.layout().itemAt(1).widget()
-            
-            name = name_widget.text() or f"Участник {i + 1}"
-            payment = payment_widget.value()
-            
-            participants.append({
-                "name": name,
-                "payment": payment
-            })
-        
-        # Добавление общака в список участников
-        participants.append({
-            "name": "Общак",
-            "payment": 0
-        })
-        
         # Формирование итоговой структуры данных
         hike_data = {
             "hike_name": hike_name,
@@ -261,6 +427,10 @@ class AddExpeditionWidget(QWidget):
         """
         Отменяет создание похода и возвращает в главное окно.
         """
+        # Возвращаем открытые вкладки походов, если они есть
+        if hasattr(self.parent, "restore_workspace") and self.parent.restore_workspace():
+            return
+
         # Create new central widget and layout
         central_widget = QWidget()
         self.parent.setCentralWidget(central_widget)
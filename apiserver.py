@@ -0,0 +1,489 @@
+import os, sys, json, time, shutil, asyncio, hashlib, argparse, tempfile, configparser
+from urllib.parse import urlsplit
+from hikemodel import HikeModel
+from hikefile import read_hike, write_hike
+from migrate import repair_hike
+from ingest import IngestQueue, DUPLICATE, REJECTED
+from sync import new_device_id
+from topups import TopupPlanner
+
+# Задержка перед записью изменений на диск: записи нескольких запросов объединяются (с)
+DEFAULT_FLUSH_INTERVAL = 0.5
+# Ограничение размера тела запроса (байт)
+MAX_BODY_SIZE = 4 * 1024 * 1024
+# Очередь событий одного подписчика; медленный подписчик отключается при переполнении
+EVENT_QUEUE_SIZE = 10000
+# Интервал комментария-пинга в потоке событий (с)
+EVENT_PING_INTERVAL = 15
+# Файл настроек программы; у API в разделе Sync свой идентификатор устройства
+SETTINGS_FILE = "init.ini"
+
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    """
+    Ошибка запроса к API с HTTP-статусом.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def hike_path_id(path):
+    """
+    Идентификатор открытого похода в API: по пути к файлу, поэтому две копии
+    одного похода открываются как разные походы.
+    """
+    path = os.path.normcase(os.path.abspath(path))
+    return hashlib.sha1(path.encode("utf-8")).hexdigest()[:16]
+
+
+def load_hike(path):
+    """
+    Читает файл похода и приводит его к текущей схеме (как миграция архива).
+    Возвращает (данные похода, список исправлений).
+    """
+    hike_data = read_hike(path)
+    return hike_data, repair_hike(hike_data)
+
+
+def default_device_id(settings_path=SETTINGS_FILE):
+    """
+    Идентификатор устройства API: хранится в настройках (Sync/api_device_id) и создаётся
+    при первом запуске. Отдельный от окна программы, чтобы их записи не получали одни номера.
+    """
+    settings = configparser.ConfigParser()
+    try:
+        settings.read(settings_path, encoding='utf-8')
+    except configparser.Error:
+        return new_device_id()
+    if 'Sync' not in settings:
+        settings['Sync'] = {}
+    if not settings['Sync'].get('api_device_id'):
+        settings['Sync']['api_device_id'] = new_device_id()
+        try:
+            with open(settings_path, 'w', encoding='utf-8') as file:
+                settings.write(file)
+        except OSError:
+            pass
+    return settings['Sync']['api_device_id']
+
+
+class OpenHike:
+    """
+    Открытый через API поход: модель, блокировка и отложенная запись на диск.
+    """
+
+    def __init__(self, hike_id, path, model):
+        self.hike_id = hike_id
+        self.path = path
+        self.model = model
+        self.lock = asyncio.Lock()
+        self.write_lock = asyncio.Lock()  # записи на диск идут строго по очереди
+        self.dirty = False
+        self.flush_task = None
+
+
+class HikeApi:
+    """
+    Обработчик запросов локального API калькулятора.
+
+    POST /hikes                    {"path": "..."}            - открыть поход
+    GET  /hikes                                               - открытые походы с состоянием бюджетов
+    POST /hikes/<id>/entries       {"day", "participant", "category", "amount", "key"} или список
+    GET  /hikes/<id>/totals | /statistics | /settlements | /forecast | /topups | /budgets
+    GET  /hikes/<id>/events                                   - поток изменений (Server-Sent Events)
+    POST /hikes/<id>/flush                                    - записать изменения сейчас
+
+    Запросы к одному походу выполняются под его asyncio.Lock; изменения
+    записываются в файл пакетно, не чаще одного раза за flush_interval.
+    """
+
+    def __init__(self, device_id=None, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.device_id = device_id or new_device_id()
+        self.flush_interval = flush_interval
+        self.hikes = {}
+        self.open_lock = asyncio.Lock()
+
+    async def handle(self, method, path, body):
+        """
+        Выполняет запрос и возвращает (статус, объект для JSON-ответа).
+        """
+        parts = [part for part in urlsplit(path).path.split("/") if part]
+        if not parts or parts[0] != "hikes":
+            raise ApiError(404, "Неизвестный адрес")
+        if len(parts) == 1:
+            if method == "GET":
+                return 200, [{"id": hike.hike_id, "path": hike.path,
+                              "hike_name": hike.model.hike_data['hike_name'],
+                              "budgets": hike.model.budgets.statuses()}
+                             for hike in self.hikes.values()]
+            if method == "POST":
+                return 201, await self.open_hike(body)
+            raise ApiError(405, "Метод не поддерживается")
+
+        hike = self.hikes.get(parts[1])
+        if hike is None:
+            raise ApiError(404, "Поход не открыт")
+        action = parts[2] if len(parts) > 2 else "totals"
+        if method == "POST" and action == "entries":
+            return 201, await self.add_entries(hike, body)
+        if method == "POST" and action == "flush":
+            await self.flush(hike)
+            return 200, {"saved": True}
+        if method != "GET":
+            raise ApiError(405, "Метод не поддерживается")
+        async with hike.lock:
+            if action == "totals":
+                return 200, self.totals(hike)
+            if action == "statistics":
+                return 200, hike.model.statistics()
+            if action == "settlements":
+                return 200, hike.model.settlements()
+            if action == "forecast":
+                return 200, [dict(row, name=hike.model.participants[row["participant"]]['name'])
+                             for row in hike.model.forecast.forecasts()]
+            if action == "budgets":
+                return 200, hike.model.budgets.statuses()
+            if action == "topups":
+                return 200, [dict(plan, name=hike.model.participants[plan["participant"]]['name'])
+                             for plan in TopupPlanner(hike.model).plans()]
+        raise ApiError(404, "Неизвестный адрес")
+
+    async def open_hike(self, body):
+        path = body.get("path") if isinstance(body, dict) else None
+        if not path:
+            raise ApiError(400, "Не указан путь к файлу")
+        path = os.path.abspath(path)
+        hike_id = hike_path_id(path)
+        async with self.open_lock:
+            hike = self.hikes.get(hike_id)
+            if hike is None:
+                loop = asyncio.get_running_loop()
+                try:
+                    hike_data, issues = await loop.run_in_executor(None, load_hike, path)
+                except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                    raise ApiError(400, f"Не удалось открыть файл: {e}")
+                hike = OpenHike(hike_id, path, HikeModel(hike_data, self.device_id))
+                self.hikes[hike_id] = hike
+                if issues:
+                    # Исправленные при открытии данные сохраняются с ближайшей записью
+                    self.schedule_flush(hike)
+        return {"id": hike.hike_id, "hike_name": hike.model.hike_data['hike_name'],
+                "participants": [p['name'] for p in hike.model.participants],
+                "track_days": hike.model.days}
+
+    async def add_entries(self, hike, body):
+        """
+        Добавляет пакет записей одной операцией журнала.
+        Записи с полем "key" повторно не добавляются (безопасный повтор запроса).
+        """
+        items = body if isinstance(body, list) else [body]
+        async with hike.lock:
+            results = []
+            for result in IngestQueue(hike.model).ingest(items, auto_keys=False):
+                if result["status"] == REJECTED:
+                    results.append({"ok": False, "error": result["error"]})
+                else:
+                    results.append({"ok": True, "id": result["id"],
+                                    "duplicate": result["status"] == DUPLICATE})
+            if any(result["ok"] and not result["duplicate"] for result in results):
+                self.schedule_flush(hike)
+            totals = self.totals(hike)
+        return {"results": results, "totals": totals}
+
+    def subscribe_events(self, hike_id):
+        """
+        Подписывается на события модели похода. Возвращает (очередь, функция отписки).
+        Первым в очередь кладётся снимок остатков, дальше идут только изменения.
+        """
+        hike = self.hikes.get(hike_id)
+        if hike is None:
+            raise ApiError(404, "Поход не открыт")
+        queue = asyncio.Queue(EVENT_QUEUE_SIZE)
+        queue.put_nowait({"type": "snapshot", "totals": self.totals(hike)})
+
+        def on_event(event):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                unsubscribe()
+                queue.get_nowait()
+                queue.put_nowait(None)  # признак отключения подписчика
+        unsubscribe = hike.model.subscribe(on_event)
+        return queue, unsubscribe
+
+    def totals(self, hike):
+        return [{"name": p['name'], "total": total}
+                for p, total in zip(hike.model.participants, hike.model.totals())]
+
+    def schedule_flush(self, hike):
+        """
+        Отмечает поход изменённым и планирует одну отложенную запись на диск.
+        """
+        hike.dirty = True
+        if hike.flush_task is None or hike.flush_task.done():
+            hike.flush_task = asyncio.get_running_loop().create_task(self._delayed_flush(hike))
+
+    async def _delayed_flush(self, hike):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush(hike)
+
+    async def flush(self, hike):
+        """
+        Записывает поход на диск, если есть несохранённые изменения.
+        Снимок данных делается под блокировкой, запись идёт в пуле потоков.
+        """
+        async with hike.write_lock:
+            async with hike.lock:
+                if not hike.dirty:
+                    return
+                snapshot = json.loads(json.dumps(hike.model.hike_data))
+                hike.dirty = False
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, write_hike, hike.path, snapshot)
+
+    async def flush_all(self):
+        for hike in list(self.hikes.values()):
+            await self.flush(hike)
+
+
+class ApiServer:
+    """
+    Минимальный HTTP/1.1 сервер на asyncio с поддержкой keep-alive.
+    """
+
+    def __init__(self, api, host="127.0.0.1", port=8765):
+        self.api = api
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.api.flush_all()
+
+    async def _serve_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Неверный запрос"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close" and
+                              version == "HTTP/1.1")
+                length = int(headers.get("content-length", 0) or 0)
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, 413, {"error": "Слишком большой запрос"}, False)
+                    break
+                raw = await reader.readexactly(length) if length else b""
+                if method == "GET" and urlsplit(target).path.rstrip("/").endswith("/events"):
+                    await self._stream_events(writer, target)
+                    break
+                try:
+                    body = json.loads(raw) if raw else {}
+                    status, payload = await self.api.handle(method, target, body)
+                except ApiError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except ValueError as e:
+                    status, payload = 400, {"error": f"Некорректный JSON: {e}"}
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _stream_events(self, writer, target):
+        """
+        Отдаёт события похода в формате Server-Sent Events до отключения клиента.
+        """
+        parts = [part for part in urlsplit(target).path.split("/") if part]
+        try:
+            if len(parts) != 3 or parts[0] != "hikes":
+                raise ApiError(404, "Неизвестный адрес")
+            queue, unsubscribe = self.api.subscribe_events(parts[1])
+        except ApiError as e:
+            await self._respond(writer, e.status, {"error": str(e)}, False)
+            return
+        try:
+            writer.write(("HTTP/1.1 200 OK\r\n"
+                          "Content-Type: text/event-stream; charset=utf-8\r\n"
+                          "Cache-Control: no-cache\r\n"
+                          "Access-Control-Allow-Origin: *\r\n"
+                          "Connection: close\r\n\r\n").encode("latin-1"))
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), EVENT_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+                    await writer.drain()
+                    continue
+                if event is None:
+                    break
+                data = json.dumps(event, ensure_ascii=False)
+                writer.write(f"event: {event['type']}\ndata: {data}\n\n".encode("utf-8"))
+                await writer.drain()
+        finally:
+            unsubscribe()
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+
+async def request(reader, writer, method, path, body=None):
+    """
+    Выполняет запрос к API по открытому соединению keep-alive. Возвращает (статус, JSON).
+    """
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                  f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n")
+                 .encode("latin-1") + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def watch_events(host, port, hike_id, output=sys.stdout):
+    """
+    Подписывается на поток событий похода и печатает каждое событие одной строкой JSON.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write((f"GET /hikes/{hike_id}/events HTTP/1.1\r\nHost: {host}\r\n"
+                  f"Accept: text/event-stream\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    if status != 200:
+        raise ApiError(status, (await reader.read()).decode("utf-8"))
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            line = line.decode("utf-8").rstrip("\n")
+            if line.startswith("data: "):
+                print(line[len("data: "):], file=output, flush=True)
+    finally:
+        writer.close()
+
+
+async def run_benchmark(num_requests, num_clients, hike_path):
+    """
+    Запускает сервер на localhost и замеряет число запросов добавления записей в секунду.
+    Работает с временной копией файла похода.
+    """
+    hike_path = shutil.copy(hike_path, tempfile.mkdtemp())
+    server = await ApiServer(HikeApi("bench"), port=0).start()
+    connections = [await asyncio.open_connection("127.0.0.1", server.port) for _ in range(num_clients)]
+    reader, writer = connections[0]
+    status, hike = await request(reader, writer, "POST", "/hikes", {"path": hike_path})
+    if status != 201:
+        raise RuntimeError(hike)
+    participants = len(hike["participants"])
+
+    async def client(index, reader, writer):
+        for n in range(index, num_requests, num_clients):
+            await request(reader, writer, "POST", f"/hikes/{hike['id']}/entries",
+                          {"day": n % hike["track_days"], "participant": n % participants,
+                           "category": "Обед", "amount": 100})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i, r, w) for i, (r, w) in enumerate(connections)))
+    elapsed = time.perf_counter() - started
+    for _, writer in connections:
+        writer.close()
+    await server.stop()
+    return num_requests / elapsed
+
+
+def main(argv=None):
+    """
+    Запуск API: python apiserver.py [--host H] [--port P] [--device ID]
+    Бенчмарк: python apiserver.py --bench поход.json [--requests N] [--clients K]
+    Наблюдение за изменениями: python apiserver.py --watch ID_ПОХОДА [--host H] [--port P]
+    """
+    parser = argparse.ArgumentParser(description="Локальный HTTP API калькулятора экспедиции")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--device", help="идентификатор устройства для журнала "
+                                          "(по умолчанию - сохранённый в init.ini)")
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL)
+    parser.add_argument("--bench", metavar="HIKE_FILE", help="замерить производительность на копии похода")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--watch", metavar="HIKE_ID", help="печатать события изменений похода")
+    args = parser.parse_args(argv)
+
+    if args.watch:
+        try:
+            asyncio.run(watch_events(args.host, args.port, args.watch))
+        except ApiError as e:
+            print(f"Ошибка {e.status}: {e}", file=sys.stderr)
+            return 1
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.bench:
+        rate = asyncio.run(run_benchmark(args.requests, args.clients, args.bench))
+        print(f"{rate:.0f} запросов/с")
+        return 0
+
+    async def serve():
+        device_id = args.device or default_device_id()
+        server = await ApiServer(HikeApi(device_id, args.flush_interval), args.host, args.port).start()
+        print(f"API запущен на http://{server.host}:{server.port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import os, shutil, hashlib, tempfile
+
+# Размер стороны миниатюры чека (пикселей)
+THUMBNAIL_SIZE = 96
+# Размер блока при чтении файла для хэша
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def attachments_dir(hike_filename):
+    """
+    Возвращает папку вложений похода: рядом с файлом, "<имя файла>.files".
+    """
+    return os.path.abspath(hike_filename) + ".files"
+
+
+def file_digest(path):
+    """
+    Возвращает SHA-256 содержимого файла (читается блоками, без загрузки целиком).
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def entry_receipts(entries):
+    """
+    Возвращает хэши чеков, прикреплённых к записям, без повторов и в порядке записей.
+    """
+    receipts = []
+    for entry in entries:
+        for digest in entry.get("receipts", []):
+            if digest not in receipts:
+                receipts.append(digest)
+    return receipts
+
+
+def make_thumbnail(source, target, size=THUMBNAIL_SIZE):
+    """
+    Создаёт миниатюру изображения в формате PNG. Выполняется в отдельном процессе,
+    поэтому Qt импортируется здесь, а не при загрузке модуля.
+    Возвращает путь к миниатюре или None, если файл не является изображением.
+    """
+    from PyQt6.QtGui import QImage
+    from PyQt6.QtCore import Qt
+    image = QImage(source)
+    if image.isNull():
+        return None
+    thumbnail = image.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio,
+                             Qt.TransformationMode.SmoothTransformation)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    if not thumbnail.save(tmp_path, "PNG"):
+        return None
+    os.replace(tmp_path, target)
+    return target
+
+
+class AttachmentStore:
+    """
+    Хранилище чеков похода с адресацией по содержимому.
+
+    Файл хранится один раз под своим SHA-256 (blobs/ab/abcdef...), записи журнала
+    ссылаются на него хэшем в поле "receipts". Одинаковые фотографии не дублируются,
+    а файл похода остаётся маленьким.
+    """
+
+    def __init__(self, hike_filename):
+        self.directory = attachments_dir(hike_filename)
+        self.blobs_dir = os.path.join(self.directory, "blobs")
+        self.thumbs_dir = os.path.join(self.directory, "thumbs")
+
+    def blob_path(self, digest):
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def thumbnail_path(self, digest, size=THUMBNAIL_SIZE):
+        return os.path.join(self.thumbs_dir, f"{digest}_{size}.png")
+
+    def has(self, digest):
+        return os.path.exists(self.blob_path(digest))
+
+    def add(self, path):
+        """
+        Добавляет файл в хранилище и возвращает его хэш.
+        Если такой файл уже есть, повторно не копируется.
+        """
+        digest = file_digest(path)
+        target = self.blob_path(digest)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+            os.close(fd)
+            try:
+                shutil.copyfile(path, tmp_path)
+                os.replace(tmp_path, target)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return digest
+
+    def copy_to(self, other, digests):
+        """
+        Копирует указанные чеки в другое хранилище (при сохранении похода под новым именем).
+        Возвращает количество скопированных файлов.
+        """
+        copied = 0
+        for digest in digests:
+            if self.has(digest) and not other.has(digest):
+                other.add(self.blob_path(digest))
+                copied += 1
+        return copied
+
+    def unused(self, digests):
+        """
+        Возвращает хэши файлов хранилища, на которые не ссылается ни одна запись.
+        """
+        digests = set(digests)
+        if not os.path.isdir(self.blobs_dir):
+            return []
+        return sorted(name for prefix in os.listdir(self.blobs_dir)
+                      for name in os.listdir(os.path.join(self.blobs_dir, prefix))
+                      if not name.endswith(".tmp") and name not in digests)
@@ -0,0 +1,329 @@
+import os, sys, json, time, hashlib, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from journal import BASE_DEVICE, TOMBSTONES_FIELD, entry_content
+from filecache import DEFAULT_CACHE_DIR
+
+# Через сколько записей аудита закрывается сегмент с контрольной точкой Меркла
+AUDIT_SEGMENT = 256
+# Хэш, с которого начинается цепочка
+GENESIS_HASH = "0" * 64
+# Файл с результатами последних проверок (в папке кэша)
+VERIFIED_FILE = "audit_verified.json"
+# Сумма хэшей живых записей берётся по этому модулю
+STATE_MODULUS = 2 ** 256
+
+OP_ADD = "add"
+OP_REMOVE = "remove"
+
+
+def content_digest(entry):
+    """
+    Возвращает хэш содержимого записи (без служебных полей журнала).
+    """
+    raw = json.dumps(entry_content(entry), ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def record_hash(prev_hash, record):
+    """
+    Хэш звена цепочки: предыдущий хэш + содержимое записи аудита.
+    """
+    raw = json.dumps([record["seq"], record["op"], record["id"], record["content"], record["time"]],
+                     ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(f"{prev_hash}|{raw}".encode("utf-8")).hexdigest()
+
+
+def merkle_root(hashes):
+    """
+    Корень дерева Меркла над хэшами записей сегмента (нечётный узел дублируется).
+    """
+    level = [bytes.fromhex(h) for h in hashes] or [bytes(32)]
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
+def _state_term(entry_id, digest):
+    return int(hashlib.sha256(f"{entry_id}|{digest}".encode("utf-8")).hexdigest(), 16)
+
+
+def journal_state(entries):
+    """
+    Отпечаток набора записей журнала: сумма хэшей (id, содержимое) по модулю 2^256.
+    Не зависит от порядка и обновляется одним сложением при добавлении или удалении записи.
+    """
+    state = 0
+    for entry in entries:
+        state += _state_term(entry["id"], content_digest(entry))
+    return state % STATE_MODULUS
+
+
+def _apply(state, record):
+    term = _state_term(record["id"], record["content"])
+    return (state + term if record["op"] == OP_ADD else state - term) % STATE_MODULUS
+
+
+def _checkpoint_matches(checkpoint, verified):
+    return all(checkpoint.get(key) == verified.get(key) for key in ("seq", "chain", "root", "state"))
+
+
+class AuditLog:
+    """
+    Журнал аудита похода: каждое добавление и удаление записи журнала расходов
+    дописывается в цепочку хэшей (hike_data['audit']).
+
+    Каждые AUDIT_SEGMENT записей закрывается сегмент: контрольная точка хранит
+    корень Меркла сегмента, хэш цепочки и отпечаток набора живых записей.
+    Изменение прошлых записей расходов или аудита ломает цепочку или отпечаток.
+    Если у файла с уже ведущимся журналом (записи устройств или надгробия) аудита нет,
+    цепочка начинается заново с отметкой restarted, и проверка сообщает об этом.
+    """
+
+    def __init__(self, hike_data):
+        self.hike_data = hike_data
+        data = hike_data.get('audit')
+        if not isinstance(data, dict) or not isinstance(data.get('records'), list):
+            data = hike_data['audit'] = {"segment": AUDIT_SEGMENT, "records": [], "checkpoints": []}
+            self.records, self.checkpoints = data['records'], data['checkpoints']
+            self.state = 0
+            journal = hike_data.get('journal', [])
+            if hike_data.get(TOMBSTONES_FIELD) or any(entry["device"] != BASE_DEVICE for entry in journal):
+                data["restarted"] = len(journal)
+            # Файл без аудита: текущие записи становятся началом цепочки
+            self.on_journal_changed(journal, ())
+        else:
+            data.setdefault('checkpoints', [])
+            self.records, self.checkpoints = data['records'], data['checkpoints']
+            # Отпечаток восстанавливается от последней контрольной точки, а не по всей цепочке
+            start = len(self.checkpoints) * self.segment
+            self.state = int(self.checkpoints[-1]["state"], 16) if self.checkpoints else 0
+            for record in self.records[start:]:
+                self.state = _apply(self.state, record)
+        self.data = data
+
+    @property
+    def segment(self):
+        return self.hike_data['audit'].get('segment', AUDIT_SEGMENT)
+
+    @property
+    def head(self):
+        return self.records[-1]["hash"] if self.records else GENESIS_HASH
+
+    def append(self, op, entry):
+        record = {"seq": len(self.records), "op": op, "id": entry["id"],
+                  "content": content_digest(entry), "time": int(time.time())}
+        record["hash"] = record_hash(self.head, record)
+        self.records.append(record)
+        self.state = _apply(self.state, record)
+        if len(self.records) % self.segment == 0:
+            segment = self.records[-self.segment:]
+            self.checkpoints.append({"seq": record["seq"], "chain": record["hash"],
+                                     "root": merkle_root([r["hash"] for r in segment]),
+                                     "state": f"{self.state:064x}"})
+        return record
+
+    def on_journal_changed(self, added, removed):
+        """
+        Слушатель журнала расходов: дописывает изменения в цепочку.
+        """
+        for entry in removed:
+            self.append(OP_REMOVE, entry)
+        for entry in added:
+            self.append(OP_ADD, entry)
+
+
+def verify_hike(hike_data, verified=None, full=False):
+    """
+    Проверяет цепочку аудита и её соответствие журналу расходов.
+
+    verified - результат предыдущей успешной проверки этого файла: если его контрольная
+    точка не изменилась, сегменты до неё не пересчитываются, проверяются только новые.
+    Цепочка только дописывается, поэтому пропавшая или другая проверенная часть
+    (контрольная точка или последняя проверенная запись) - это переписанная история.
+    full=True пересчитывает всю цепочку.
+    Возвращает (список проблем, новый verified или None, число проверенных записей).
+    """
+    data = hike_data.get('audit')
+    if not isinstance(data, dict) or not isinstance(data.get('records'), list):
+        return ["нет журнала аудита"], None, 0
+    records, checkpoints = data['records'], data.get('checkpoints', [])
+    segment = data.get('segment', AUDIT_SEGMENT)
+    problems = []
+    if data.get("restarted") is not None:
+        problems.append(f"журнал аудита удалён и начат заново (записей в журнале было {data['restarted']})")
+    if len(checkpoints) != len(records) // segment:
+        problems.append(f"контрольных точек {len(checkpoints)}, ожидалось {len(records) // segment}")
+
+    done, prev, state = 0, GENESIS_HASH, 0
+    if verified:
+        count, known = verified.get("checkpoint", 0), verified.get("records", 0)
+        if (count > len(checkpoints) or (count and not _checkpoint_matches(checkpoints[count - 1], verified))
+                or known > len(records) or (known and records[known - 1].get("hash") != verified.get("head"))):
+            problems.append("проверенная история переписана")
+        elif count and not full:
+            done = count
+            prev = verified["chain"]
+            state = int(verified["state"], 16)
+
+    start = done * segment
+    hashes = []
+    for seq in range(start, len(records)):
+        record = records[seq]
+        if record.get("seq") != seq or record_hash(prev, record) != record.get("hash"):
+            problems.append(f"запись аудита {seq} изменена или удалена")
+            break
+        prev = record["hash"]
+        state = _apply(state, record)
+        hashes.append(prev)
+        if len(hashes) == segment:
+            index = seq // segment
+            checkpoint = checkpoints[index] if index < len(checkpoints) else {}
+            expected = {"seq": seq, "chain": prev, "root": merkle_root(hashes), "state": f"{state:064x}"}
+            if not _checkpoint_matches(checkpoint, expected):
+                problems.append(f"контрольная точка {index + 1} не совпадает с цепочкой")
+                break
+            done, hashes = index + 1, []
+
+    if not problems and state != journal_state(hike_data.get('journal', [])):
+        problems.append("записи журнала расходов не совпадают с журналом аудита")
+    if problems:
+        return problems, None, len(records) - start
+    result = {"checkpoint": done, "records": len(records), "head": records[-1]["hash"] if records else GENESIS_HASH}
+    if done:
+        result.update(checkpoints[done - 1])
+    return problems, result, len(records) - start
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def verify_file(path, verified=None, full=False):
+    """
+    Проверяет один файл похода (выполняется в отдельном процессе).
+    Возвращает отчёт {"path", "problems", "verified", "checked"}.
+    """
+    try:
+        signature = _signature(path)
+        with open(path, "r", encoding="utf-8") as file:
+            hike_data = json.load(file)
+        problems, result, checked = verify_hike(hike_data, verified, full)
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        return {"path": path, "problems": [f"файл не прочитан: {e}"], "verified": None, "checked": 0}
+    if result is not None:
+        result["signature"] = signature
+    return {"path": path, "problems": problems, "verified": result, "checked": checked}
+
+
+def verified_path(cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.join(cache_dir, VERIFIED_FILE)
+
+
+def load_verified(path):
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_verified(path, verified):
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(verified, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Без сохранённых результатов следующая проверка просто будет полной
+        pass
+
+
+def remember_verified(hike_path, hike_data, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Проверяет только что сохранённый поход от последней проверенной точки
+    и запоминает результат. Возвращает список проблем (пустой, если всё в порядке).
+    """
+    path = verified_path(cache_dir)
+    verified = load_verified(path)
+    hike_path = os.path.abspath(hike_path)
+    problems, result, _ = verify_hike(hike_data, verified.get(hike_path))
+    if result is not None:
+        try:
+            result["signature"] = _signature(hike_path)
+        except OSError:
+            return problems
+        verified[hike_path] = result
+        save_verified(path, verified)
+    return problems
+
+
+def verify_directory(directory, workers=None, full=False, cache_dir=DEFAULT_CACHE_DIR, on_report=None):
+    """
+    Проверяет все файлы походов в дереве папок в пуле процессов.
+    Файлы, не менявшиеся с последней успешной проверки, пропускаются;
+    у изменённых пересчитываются только сегменты после проверенной контрольной точки.
+    Возвращает список отчётов по проверенным файлам.
+    """
+    from migrate import find_hike_files
+    path = verified_path(cache_dir)
+    verified = load_verified(path)
+    pending = []
+    for hike_path in find_hike_files(os.path.abspath(directory)):
+        known = verified.get(hike_path)
+        try:
+            unchanged = known is not None and known.get("signature") == _signature(hike_path)
+        except OSError:
+            continue
+        if unchanged and not full:
+            continue
+        pending.append((hike_path, known))
+
+    reports = []
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(verify_file, hike_path, known, full) for hike_path, known in pending]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            # При проблемах прежний результат остаётся: переписанная цепочка не должна стать проверенной
+            if report["verified"] is not None:
+                verified[report["path"]] = report["verified"]
+            if on_report is not None:
+                on_report(report)
+    save_verified(path, verified)
+    return reports
+
+
+def format_report(report, directory):
+    name = os.path.relpath(report["path"], directory)
+    if not report["problems"]:
+        return f"{name}: OK (проверено записей аудита: {report['checked']})"
+    return "\n".join([f"{name}: НАРУШЕНА ЦЕЛОСТНОСТЬ"] + [f"    - {problem}" for problem in report["problems"]])
+
+
+def main(argv=None):
+    """
+    Проверка целостности архива: python audit.py папка [--full] [--workers N]
+    """
+    parser = argparse.ArgumentParser(description="Проверка журнала аудита файлов походов")
+    parser.add_argument("folder")
+    parser.add_argument("--full", action="store_true", help="пересчитать цепочки целиком")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию - все ядра)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    directory = os.path.abspath(args.folder)
+    started = time.perf_counter()
+    reports = verify_directory(directory, args.workers, args.full, args.cache_dir,
+                               on_report=lambda report: print(format_report(report, directory), flush=True))
+    broken = sum(1 for report in reports if report["problems"])
+    print(f"Проверено файлов: {len(reports)}, с нарушениями: {broken}, "
+          f"за {time.perf_counter() - started:.1f} с")
+    return 1 if broken else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
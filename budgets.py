@@ -0,0 +1,177 @@
+import sys, json, time, argparse
+
+# Бюджеты похода: поле budgets = [{"name": "Питание", "categories": ["Завтрак", "Ланч", "Обед"],
+# "amount": 150000}]. Категория входит не больше чем в одну строку бюджета.
+BUDGETS_FIELD = "budgets"
+# Доля бюджета, после которой выдаётся предупреждение
+BUDGET_WARNING = 0.8
+# Уровни бюджета
+BUDGET_OK = "ok"
+BUDGET_WARN = "warning"
+BUDGET_OVER = "over"
+
+
+def budget_level(spent, amount):
+    if spent > amount:
+        return BUDGET_OVER
+    if amount > 0 and spent >= BUDGET_WARNING * amount:
+        return BUDGET_WARN
+    return BUDGET_OK
+
+
+def parse_budgets(text):
+    """
+    Разбирает бюджеты по строкам "название: категории через запятую = сумма".
+    Без названия строкой бюджета называются её категории ("Пермиты = 80000").
+    Бросает ValueError при неверной строке или повторе категории.
+    """
+    budgets, seen = [], set()
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        head, equals, amount = line.rpartition("=")
+        try:
+            amount = float(amount.replace(" ", "").replace(",", "."))
+        except ValueError:
+            raise ValueError(f"строка {number}: ожидается \"название: категории = сумма\"")
+        if not equals or amount <= 0:
+            raise ValueError(f"строка {number}: ожидается положительная сумма бюджета")
+        name, colon, categories = head.partition(":")
+        if not colon:
+            categories = name
+        categories = [category.strip() for category in categories.split(",") if category.strip()]
+        if not categories:
+            raise ValueError(f"строка {number}: не указаны категории")
+        for category in categories:
+            if category in seen:
+                raise ValueError(f"строка {number}: категория {category} уже в другом бюджете")
+            seen.add(category)
+        budgets.append({"name": name.strip() if colon and name.strip() else ", ".join(categories),
+                        "categories": categories, "amount": amount})
+    return budgets
+
+
+def format_budgets(budgets):
+    """
+    Бюджеты текстом для правки (обратное к parse_budgets).
+    """
+    lines = []
+    for budget in budgets:
+        categories = ", ".join(budget["categories"])
+        head = categories if budget["name"] == categories else f"{budget['name']}: {categories}"
+        lines.append(f"{head} = {budget['amount']:.0f}")
+    return "\n".join(lines)
+
+
+class CategoryBudgets:
+    """
+    Бюджеты похода по категориям с остатком, который ведётся по уведомлениям журнала:
+    запись меняет израсходованное своей строки бюджета за O(1), таблица не перечитывается.
+    Состояние всех строк отдаётся за O(числа бюджетов).
+
+    Изменения публикуются событием модели
+    {"type": "budget_changed", "budget", "name", "spent", "remaining", "level", "level_changed"}.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.rebuild()
+        model.journal.listeners.append(self._on_journal_changed)
+
+    def rebuild(self):
+        """
+        Пересчитывает израсходованное по всем записям (после изменения бюджетов).
+        """
+        self.budgets = [dict(budget) for budget in self.model.hike_data.get(BUDGETS_FIELD, [])]
+        self.lines = {}  # категория -> номер строки бюджета
+        for index, budget in enumerate(self.budgets):
+            for category in budget["categories"]:
+                self.lines.setdefault(category, index)
+        self.spent = [0.0] * len(self.budgets)
+        self._on_journal_changed(self.model.journal.entries, (), publish=False)
+
+    def set_budgets(self, budgets):
+        """
+        Задаёт бюджеты похода (пустой список - без бюджетов).
+        """
+        if budgets:
+            self.model.hike_data[BUDGETS_FIELD] = [dict(budget) for budget in budgets]
+        else:
+            self.model.hike_data.pop(BUDGETS_FIELD, None)
+        self.rebuild()
+        for index in range(len(self.budgets)):
+            self._publish(index, None)
+
+    def _on_journal_changed(self, added, removed, publish=True):
+        if not self.lines:
+            return
+        touched = {}
+        for sign, entries in ((-1, removed), (1, added)):
+            for entry in entries:
+                index = self.lines.get(entry.get("category"))
+                # Пополнения и возвраты бюджет не расходуют
+                if index is None or entry["amount"] >= 0:
+                    continue
+                if index not in touched:
+                    touched[index] = self.level(index)
+                self.spent[index] -= sign * entry["amount"]
+        if publish:
+            for index, level in touched.items():
+                self._publish(index, level)
+
+    def _publish(self, index, old_level):
+        status = self.status(index)
+        self.model.publish({"type": "budget_changed", "budget": index, "name": status["name"],
+                            "spent": status["spent"], "remaining": status["remaining"],
+                            "level": status["level"], "level_changed": status["level"] != old_level})
+
+    def level(self, index):
+        return budget_level(self.spent[index], self.budgets[index]["amount"])
+
+    def status(self, index):
+        """
+        Состояние строки бюджета: {"name", "categories", "amount", "spent", "remaining", "fraction", "level"}.
+        """
+        budget, spent = self.budgets[index], self.spent[index]
+        amount = budget["amount"]
+        return {"name": budget["name"], "categories": list(budget["categories"]), "amount": amount,
+                "spent": spent, "remaining": amount - spent, "fraction": spent / amount if amount else 0.0,
+                "level": self.level(index)}
+
+    def statuses(self):
+        return [self.status(index) for index in range(len(self.budgets))]
+
+
+def budget_text(status):
+    """
+    Краткий текст состояния бюджета для предупреждений.
+    """
+    if status["level"] == BUDGET_OVER:
+        return f"Бюджет {status['name']}: превышен на {-status['remaining']:.0f}"
+    return f"Бюджет {status['name']}: израсходовано {status['fraction']:.0%}, осталось {status['remaining']:.0f}"
+
+
+def main(argv=None):
+    """
+    Состояние бюджетов по файлу похода: python budgets.py поход.json
+    """
+    from hikemodel import HikeModel
+    parser = argparse.ArgumentParser(description="Бюджеты похода по категориям")
+    parser.add_argument("hike")
+    args = parser.parse_args(argv)
+    with open(args.hike, "r", encoding="utf-8") as file:
+        hike_data = json.load(file)
+    model = HikeModel(hike_data)
+    started = time.perf_counter()
+    statuses = model.budgets.statuses()
+    elapsed = (time.perf_counter() - started) * 1000
+    if not statuses:
+        print("Бюджеты не заданы")
+    for status in statuses:
+        print(f"{budget_text(status)} (бюджет {status['amount']:.0f})")
+    print(f"За {elapsed:.2f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import re, sys, time, argparse
+from functools import lru_cache
+from hikeutil import make_synthetic_hike
+
+# Сколько разных текстов ячеек держать в кэше разбора
+PARSE_CACHE_SIZE = 65536
+
+# Грамматика текста ячейки старых файлов:
+#   ячейка  := запись (";" запись)*
+#   запись  := [категория] сумма
+#   сумма   := [+-] цифры с разделителями тысяч (пробел, неразрывный пробел) [, или . дробная часть]
+# Категория может состоять из нескольких слов и заканчиваться цифрой ("Ночёвка 2 -500").
+AMOUNT_PATTERN = r"[+-]?\s?(?:\d{1,3}(?:[ \u00a0\u202f]\d{3})+|\d+)(?:[.,]\d+)?"
+AMOUNT_RE = re.compile(rf"^\s*(?P<amount>{AMOUNT_PATTERN})\s*$")
+# Сумма ищется как самый левый хвост записи, целиком являющийся суммой
+ENTRY_AMOUNT_RE = re.compile(rf"(?P<amount>{AMOUNT_PATTERN})\s*$")
+SPACES_RE = re.compile(r"[\s\u00a0\u202f]")
+
+
+def parse_amount(text):
+    """
+    Разбирает сумму с разделителями тысяч и запятой или точкой ("-1 200,50").
+    Бросает ValueError, если текст не является суммой.
+    """
+    match = AMOUNT_RE.match(str(text))
+    if match is None:
+        raise ValueError(f"Неверная сумма: {text}")
+    return _to_float(match.group("amount"))
+
+
+def _to_float(amount):
+    if not amount.isdigit():
+        amount = SPACES_RE.sub("", amount).replace(",", ".")
+    return float(amount)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_cell(text):
+    """
+    Разбирает текст ячейки ("Завтрак -500; Обед +1 200") и возвращает кортеж записей
+    (категория, сумма, исходный текст записи). Для нераспознанной записи сумма None.
+    Результат кэшируется по тексту ячейки: в архиве много одинаковых ячеек.
+    """
+    text = str(text).strip()
+    if not text or text == "0":
+        return ()
+    entries = []
+    for part in text.split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        # Частый случай "Категория -500": знак отделяет сумму, регулярное выражение не нужно
+        head, _, last = part.rpartition(" ")
+        if len(last) > 1 and last[0] in "+-" and last[1:].isdigit():
+            entries.append((head.rstrip(), float(last), part))
+            continue
+        match = ENTRY_AMOUNT_RE.search(part)
+        if match is None:
+            entries.append((part, None, part))
+            continue
+        entries.append((part[:match.start()].rstrip(), _to_float(match.group("amount")), part))
+    return tuple(entries)
+
+
+def cell_total(text):
+    """
+    Возвращает сумму записей ячейки (нераспознанные записи не учитываются).
+    """
+    return sum(amount for _, amount, _ in parse_cell(text) if amount is not None)
+
+
+def format_entry(category, amount):
+    """
+    Возвращает запись в каноническом виде: "Категория -1200" (без пробелов в числе).
+    """
+    sign = "+" if amount >= 0 else "-"
+    number = f"{abs(amount):.2f}".rstrip("0").rstrip(".")
+    return f"{category} {sign}{number}" if category else f"{sign}{number}"
+
+
+def normalize_cell(text):
+    """
+    Переписывает текст ячейки в каноническом виде; нераспознанные записи остаются как есть.
+    """
+    entries = parse_cell(text)
+    if not entries:
+        return "0"
+    return "; ".join(format_entry(category, amount) if amount is not None else part
+                     for category, amount, part in entries)
+
+
+def split_cell_total(text):
+    """
+    Прежний разбор ячейки ручным разбиением (только записи ровно из двух слов).
+    Оставлен для сравнения в бенчмарке.
+    """
+    total = 0.0
+    text = text.strip()
+    if text != "0" and text:
+        for entry in [e.strip() for e in text.split(";") if e.strip()]:
+            parts = entry.split()
+            if len(parts) == 2:
+                try:
+                    total += float(parts[1])
+                except ValueError:
+                    pass
+    return total
+
+
+def run_benchmark(num_hikes, num_participants=12, num_days=21, entries_per_cell=3):
+    """
+    Сравнивает разбор архива ручным разбиением и грамматикой (без кэша и с кэшем).
+    Возвращает {название: секунды}.
+    """
+    cells = []
+    for n in range(num_hikes):
+        hike = make_synthetic_hike(num_participants, num_days, entries_per_cell)
+        for day_expenses in hike['expenses_data']:
+            # Суммы с разделителями тысяч, как в ячейках, набранных вручную
+            cells.extend(text.replace("-1", f"-{n % 9 + 1} 1") for text in day_expenses)
+
+    results = {}
+    started = time.perf_counter()
+    for text in cells:
+        split_cell_total(text)
+    results["split"] = time.perf_counter() - started
+
+    parse_cell.cache_clear()
+    started = time.perf_counter()
+    for text in cells:
+        parse_cell.__wrapped__(text)
+    results["grammar"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for text in cells:
+        cell_total(text)
+    results["grammar_cached"] = time.perf_counter() - started
+    results["cells"] = len(cells)
+    return results
+
+
+def main(argv=None):
+    """
+    Бенчмарк разбора ячеек: python cellparser.py [--hikes N]
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора текста ячеек")
+    parser.add_argument("--hikes", type=int, default=500)
+    args = parser.parse_args(argv)
+    results = run_benchmark(args.hikes)
+    print(f"Ячеек: {results['cells']}")
+    for name in ("split", "grammar", "grammar_cached"):
+        print(f"{name}: {results[name] * 1000:.1f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
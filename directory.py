@@ -0,0 +1,218 @@
+import os, re, sys, json, time, pickle, argparse
+from filecache import DEFAULT_CACHE_DIR
+from search import InvertedIndex, WORD_RE, normalize
+from hikemodel import POOL_NAME, HikeModel, is_pool
+from migrate import find_hike_files
+
+# Версия формата сохранённого справочника
+DIRECTORY_VERSION = 2
+# Имя файла справочника в папке кэша
+DIRECTORY_FILE = "participants.idx"
+# Сколько вариантов показывать в подсказке
+COMPLETE_LIMIT = 20
+# Имена, которые программа подставляет сама, - это не люди
+GENERATED_NAME_RE = re.compile(r"^(Участник|Без имени) \d+$")
+
+
+def person_key(name):
+    """
+    Ключ человека: слова имени в нормализованной форме (регистр, ё/е, латиница/кириллица).
+    "Иван  Петров" и "иван петров" - один человек. Для пустых и сгенерированных имён None.
+    """
+    name = " ".join(str(name or "").split())
+    if not name or name == POOL_NAME or GENERATED_NAME_RE.match(name):
+        return None
+    words = [normalize(word) for word in WORD_RE.findall(name)]
+    return " ".join(word for word in words if word) or None
+
+
+def hike_people(hike_data):
+    """
+    Возвращает участников похода по ключам: {ключ: {"name", "payment", "spend", "balance"}}.
+    spend - расходы участника в походе (сумма его записей с обратным знаком).
+    balance - сколько участник оставил после похода сверх перенесённого из прошлых
+    (остаток модели похода, с долями общих расходов, минус перенесённое в поход carried_in).
+    """
+    # Модель строится на копии: файл архива не получает журнал и аудит
+    model = HikeModel(dict(hike_data))
+    participants = model.participants
+    people = {}
+    for index, participant in enumerate(participants):
+        key = None if is_pool(participant) else person_key(participant.get('name'))
+        if key is None:
+            continue
+        name = " ".join(participant['name'].split())
+        person = people.setdefault(key, {"name": name, "payment": 0, "spend": 0.0, "balance": 0.0})
+        person["payment"] += participant.get('payment', 0)
+        person["spend"] -= model.sums[index]
+        person["balance"] += model.total(index) - participant.get('carried_in', 0)
+    return people
+
+
+class ParticipantDirectory:
+    """
+    Справочник участников всех походов папки архива: варианты написания имени,
+    число походов, сумма взносов и расходов за всё время и переходящий остаток.
+
+    Для подсказок при вводе имена лежат в инвертированном индексе с поиском по префиксу
+    (отсортированный словарь и bisect). Итоги по людям хранятся готовыми: при сохранении
+    похода вычитается прежний вклад файла и добавляется новый, остальные файлы не читаются.
+    """
+
+    def __init__(self, directory, cache_dir=DEFAULT_CACHE_DIR):
+        self.directory = os.path.abspath(directory)
+        self.cache_path = os.path.join(cache_dir, DIRECTORY_FILE)
+        self.files = {}  # путь -> (подпись файла, участники похода)
+        self.people = {}  # ключ -> {"names": {написание: число походов}, "hikes", "paid", "spend", "balance"}
+        self.index = InvertedIndex()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "rb") as file:
+                state = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return
+        if state.get("version") == DIRECTORY_VERSION and state.get("directory") == self.directory:
+            self.files, self.people, self.index = state["files"], state["people"], state["index"]
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "wb") as file:
+                pickle.dump({"version": DIRECTORY_VERSION, "directory": self.directory, "files": self.files,
+                             "people": self.people, "index": self.index},
+                            file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # Справочник необязателен: при ошибке записи он будет построен заново
+            pass
+
+    def _apply(self, people, sign):
+        for key, person in people.items():
+            total = self.people.setdefault(key, {"names": {}, "hikes": 0, "paid": 0.0, "spend": 0.0,
+                                                 "balance": 0.0})
+            total["hikes"] += sign
+            total["paid"] += sign * person["payment"]
+            total["spend"] += sign * person["spend"]
+            total["balance"] += sign * person["balance"]
+            names = total["names"]
+            names[person["name"]] = names.get(person["name"], 0) + sign
+            if names[person["name"]] <= 0:
+                del names[person["name"]]
+            if total["hikes"] <= 0:
+                del self.people[key]
+                self.index.remove(key)
+            else:
+                # Все написания человека ищутся одинаково
+                self.index.add(key, " ".join(names))
+
+    def refresh(self):
+        """
+        Перечитывает новые и изменённые файлы, убирает пропавшие.
+        Возвращает количество обновлённых файлов.
+        """
+        seen = set()
+        updated = 0
+        for path in find_hike_files(self.directory):
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if path in self.files and self.files[path][0] == signature:
+                continue
+            self.update_file(path, signature)
+            updated += 1
+        for path in set(self.files) - seen:
+            self._apply(self.files.pop(path)[1], -1)
+            updated += 1
+        if updated:
+            self.save()
+        return updated
+
+    def update_file(self, path, signature=None, hike_data=None):
+        """
+        Заменяет вклад одного файла (например, сразу после сохранения похода).
+        """
+        if path in self.files:
+            self._apply(self.files.pop(path)[1], -1)
+        try:
+            if hike_data is None:
+                with open(path, "r", encoding="utf-8") as file:
+                    hike_data = json.load(file)
+            people = hike_people(hike_data)
+            if signature is None:
+                stat = os.stat(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return
+        self.files[path] = (signature, people)
+        self._apply(people, 1)
+
+    def display_name(self, key):
+        """
+        Самое частое написание имени человека.
+        """
+        names = self.people[key]["names"]
+        return max(names, key=lambda name: (names[name], name))
+
+    def person(self, name):
+        """
+        Возвращает итоги человека по имени в любом написании или None:
+        {"name", "hikes", "paid", "spend", "balance"}.
+        """
+        key = person_key(name)
+        total = self.people.get(key) if key else None
+        if total is None:
+            return None
+        return {"name": self.display_name(key), "hikes": total["hikes"], "paid": total["paid"],
+                "spend": total["spend"], "balance": total["balance"]}
+
+    def balance(self, name):
+        """
+        Переходящий остаток человека после всех походов архива (0, если его нет в справочнике).
+        Берётся из готовых итогов, без чтения файлов.
+        """
+        key = person_key(name)
+        total = self.people.get(key) if key else None
+        return round(total["balance"], 2) if total else 0
+
+    def complete(self, text, limit=COMPLETE_LIMIT):
+        """
+        Возвращает имена для подсказки: каждое слово ввода - начало слова имени
+        ("пет ив" находит "Иван Петров"). Чаще ходившие в походы идут первыми.
+        """
+        keys = self.index.search(text)
+        ranked = sorted(keys, key=lambda key: (-self.people[key]["hikes"], key))
+        return [self.display_name(key) for key in ranked[:limit]]
+
+
+def main(argv=None):
+    """
+    Справочник участников архива: python directory.py папка [начало имени]
+    """
+    parser = argparse.ArgumentParser(description="Справочник участников архива походов")
+    parser.add_argument("folder")
+    parser.add_argument("prefix", nargs="?", default="")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    people = ParticipantDirectory(args.folder, args.cache_dir)
+    people.refresh()
+    started = time.perf_counter()
+    names = people.complete(args.prefix, limit=None) if args.prefix else \
+        sorted(people.display_name(key) for key in people.people)
+    elapsed = (time.perf_counter() - started) * 1000
+    for name in names:
+        person = people.person(name)
+        print(f"{name}: походов {person['hikes']}, взносы {person['paid']:.0f}, расходы {person['spend']:.0f}, "
+              f"остаток {person['balance']:.0f}")
+    print(f"Найдено: {len(names)} за {elapsed:.1f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import os, pickle, hashlib
+
+# Версия формата разобранных данных похода. Увеличивается при изменении
+# проверки или структуры hike_data, чтобы старые записи кэша не использовались.
+SCHEMA_VERSION = 1
+
+# Параметры кэша по умолчанию (раздел Cache в init.ini)
+DEFAULT_CACHE_DIR = ".hike_cache"
+DEFAULT_CACHE_MAX_MB = 32
+
+
+class ParsedFileCache:
+    """
+    Дисковый кэш разобранных и проверенных файлов походов.
+
+    Запись ищется по ключу (путь, mtime, размер, версия схемы), поэтому изменённый
+    файл автоматически даёт промах. Данные хранятся в pickle, общий размер кэша
+    ограничен: при превышении удаляются давно не использованные записи.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _entry_prefix(self, filename):
+        path = os.path.abspath(filename)
+        return hashlib.sha1(path.encode("utf-8")).hexdigest()[:16]
+
+    def _entry_path(self, filename):
+        """
+        Возвращает путь к записи кэша для текущего состояния файла
+        или None, если файл недоступен.
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        key = f"{os.path.abspath(filename)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{SCHEMA_VERSION}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{self._entry_prefix(filename)}-{digest}.pickle")
+
+    def get(self, filename):
+        """
+        Возвращает данные похода из кэша или None при промахе.
+        Повреждённая запись удаляется и считается промахом.
+        """
+        entry_path = self._entry_path(filename)
+        if entry_path is None or not os.path.exists(entry_path):
+            return None
+        try:
+            with open(entry_path, "rb") as file:
+                hike_data = pickle.load(file)
+            os.utime(entry_path)  # отмечаем использование для вытеснения
+            return hike_data
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            self._remove(entry_path)
+            return None
+
+    def put(self, filename, hike_data):
+        """
+        Сохраняет данные похода для текущего состояния файла.
+        Старые записи этого же файла удаляются, затем применяется ограничение размера.
+        """
+        entry_path = self._entry_path(filename)
+        if entry_path is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            prefix = self._entry_prefix(filename) + "-"
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix):
+                    self._remove(os.path.join(self.directory, name))
+            tmp_path = entry_path + ".tmp"
+            with open(tmp_path, "wb") as file:
+                pickle.dump(hike_data, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+            self.evict()
+        except OSError:
+            # Кэш необязателен: ошибки записи не мешают работе с походом
+            pass
+
+    def evict(self):
+        """
+        Удаляет давно не использованные записи, пока общий размер превышает max_bytes.
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.directory)
+                       if entry.is_file() and entry.name.endswith(".pickle")]
+        except OSError:
+            return
+        stats = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries]
+        total = sum(size for _, size, _ in stats)
+        for _, size, path in sorted(stats):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """
+        Удаляет все записи кэша.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle") or name.endswith(".tmp"):
+                self._remove(os.path.join(self.directory, name))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,234 @@
+import os, json, time, socket, getpass
+from PyQt6.QtCore import QObject, QFileSystemWatcher, QTimer
+
+# Задержка перед обработкой изменения файла: сохранение часто идёт несколькими записями (мс)
+WATCH_DEBOUNCE_MS = 300
+
+
+def file_signature(filename):
+    """
+    Возвращает (mtime_ns, размер) файла или None, если файл недоступен.
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def same_structure(first, second):
+    """
+    Проверяет, что у двух версий похода совпадают участники и даты,
+    то есть изменения можно применить по ячейкам без перестройки таблицы.
+    """
+    fields = ['participants', 'start_date', 'end_date', 'track_days']
+    return all(first.get(field) == second.get(field) for field in fields)
+
+
+def merge_expenses(base, local, remote):
+    """
+    Трёхстороннее слияние расходов по ячейкам.
+
+    :param base: Расходы на момент последней загрузки/сохранения файла.
+    :param local: Текущие расходы в программе.
+    :param remote: Расходы в изменённом на диске файле.
+    :return: (changes, conflicts) - ячейки (день, участник, текст), которые нужно
+             обновить локально, и ячейки, изменённые с обеих сторон по-разному
+             (в них остаётся локальный текст).
+    """
+    changes = []
+    conflicts = []
+    for row, remote_day in enumerate(remote):
+        for idx, remote_text in enumerate(remote_day):
+            base_text = _cell(base, row, idx)
+            if remote_text == base_text:
+                continue
+            local_text = _cell(local, row, idx)
+            if local_text == remote_text:
+                continue
+            if local_text == base_text:
+                changes.append((row, idx, remote_text))
+            else:
+                conflicts.append((row, idx, remote_text))
+    return changes, conflicts
+
+
+def _cell(expenses_data, row, idx):
+    if row < len(expenses_data) and idx < len(expenses_data[row]):
+        return expenses_data[row][idx]
+    return "0"
+
+
+class HikeFileLock:
+    """
+    Рекомендательная блокировка файла похода через файл <имя>.lock рядом с ним.
+
+    Работает на общих сетевых папках, где flock ненадёжен: файл блокировки создаётся
+    атомарно (O_EXCL) и содержит пользователя, компьютер и PID владельца.
+    Блокировка не запрещает запись, а позволяет предупредить второго гида.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock_path = f"{filename}.lock"
+        self.owner_info = {
+            "user": getpass.getuser(),
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+        }
+        self.acquired = False
+
+    def acquire(self):
+        """
+        Пытается захватить блокировку.
+        Возвращает None при успехе или сведения о чужом владельце.
+        Блокировка завершившегося процесса на этом же компьютере считается устаревшей и перехватывается.
+        """
+        for _ in range(2):
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                owner = self.owner()
+                if owner is None or self._is_ours(owner):
+                    self.acquired = True
+                    return None
+                if not self._is_stale(owner):
+                    return owner
+                self._remove()
+                continue
+            except OSError:
+                # Нет прав на запись в папку - работаем без блокировки
+                return None
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(dict(self.owner_info, time=time.time()), file, ensure_ascii=False)
+            self.acquired = True
+            return None
+        return self.owner()
+
+    def owner(self):
+        """
+        Возвращает сведения о владельце блокировки или None, если блокировки нет.
+        """
+        try:
+            with open(self.lock_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def held_by_other(self):
+        """
+        Возвращает сведения о чужом владельце блокировки или None.
+        """
+        owner = self.owner()
+        if owner is None or self._is_ours(owner) or self._is_stale(owner):
+            return None
+        return owner
+
+    def release(self):
+        """
+        Снимает блокировку, если она принадлежит этому процессу.
+        """
+        owner = self.owner()
+        if self.acquired and owner is not None and self._is_ours(owner):
+            self._remove()
+        self.acquired = False
+
+    def _is_ours(self, owner):
+        return (owner.get("host") == self.owner_info["host"] and
+                owner.get("pid") == self.owner_info["pid"])
+
+    def _is_stale(self, owner):
+        if owner.get("host") != self.owner_info["host"]:
+            return False
+        try:
+            os.kill(int(owner.get("pid", 0)), 0)
+        except ProcessLookupError:
+            return True
+        except (OSError, ValueError, TypeError):
+            return False
+        return False
+
+    def _remove(self):
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+
+
+def format_lock_owner(owner):
+    """
+    Форматирует сведения о владельце блокировки для сообщений.
+    """
+    since = time.strftime("%d.%m.%Y %H:%M", time.localtime(owner.get("time", 0)))
+    return f"{owner.get('user', '?')}@{owner.get('host', '?')} (с {since})"
+
+
+class HikeFileWatcher(QObject):
+    """
+    Следит за файлами открытых походов через QFileSystemWatcher.
+    Собственные сохранения не считаются внешними изменениями: после записи
+    запоминается сигнатура файла (mtime, размер).
+    """
+
+    def __init__(self, callback, parent=None):
+        """
+        :param callback: Функция filename -> None, вызывается при внешнем изменении файла.
+        """
+        super().__init__(parent)
+        self.callback = callback
+        self.signatures = {}
+        self.pending = set()
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._on_file_changed)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(WATCH_DEBOUNCE_MS)
+        self.timer.timeout.connect(self._flush)
+
+    def watch(self, filename):
+        path = os.path.abspath(filename)
+        self.signatures[path] = file_signature(path)
+        if path not in self.watcher.files() and os.path.exists(path):
+            self.watcher.addPath(path)
+
+    def unwatch(self, filename):
+        path = os.path.abspath(filename)
+        self.signatures.pop(path, None)
+        self.pending.discard(path)
+        if path in self.watcher.files():
+            self.watcher.removePath(path)
+
+    def expect_write(self, filename):
+        """
+        Запоминает состояние файла после собственного сохранения.
+        """
+        self.watch(filename)
+
+    def is_changed(self, filename):
+        """
+        Проверяет, изменился ли файл с момента последней загрузки или сохранения.
+        """
+        path = os.path.abspath(filename)
+        return path in self.signatures and file_signature(path) != self.signatures[path]
+
+    def mark_seen(self, filename):
+        """
+        Отмечает текущее состояние файла как уже обработанное.
+        """
+        path = os.path.abspath(filename)
+        if path in self.signatures:
+            self.signatures[path] = file_signature(path)
+
+    def _on_file_changed(self, path):
+        # При атомарной замене файла QFileSystemWatcher перестаёт за ним следить
+        if path not in self.watcher.files() and os.path.exists(path):
+            self.watcher.addPath(path)
+        self.pending.add(path)
+        self.timer.start()
+
+    def _flush(self):
+        pending, self.pending = self.pending, set()
+        for path in pending:
+            if path in self.signatures and self.is_changed(path):
+                self.mark_seen(path)
+                self.callback(path)
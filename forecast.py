@@ -0,0 +1,191 @@
+import sys, json, math, time, argparse
+from presence import count_days
+
+# Сглаживание дневного расхода: вес последнего дня в экспоненциальном среднем
+EWMA_ALPHA = 0.3
+# Ниже этого остатка участник считается "на нуле" (как красная подсветка в таблице)
+DRY_BALANCE = 0
+
+
+class BurnForecast:
+    """
+    Прогноз расхода: экспоненциально сглаженный расход каждого столбца в день (EWMA),
+    день, когда остаток уйдёт в минус, и пополнение, которого хватит до конца похода.
+
+    Для столбца хранится только взвешенная сумма расходов S, приведённая к своему
+    последнему дню L: запись дня d добавляет alpha * x * beta^(L - d) (или сдвигает L вперёд),
+    поэтому запись обходится в O(1) на столбец и O(глубины) с фондами.
+    Средний расход в день - S, приведённая к текущему дню похода и нормированная
+    на сумму весов с первого дня участника.
+
+    Изменившиеся прогнозы публикуются событием модели
+    {"type": "forecast_changed", "participant", "rate", "dry_day", "topup"}.
+    Прогноз модели (deferred=True) подписывается на журнал раньше неё, а свои события
+    модель публикует после остатков (publish_pending): подписчики total_changed
+    видят уже новый расход.
+    """
+
+    def __init__(self, model, alpha=EWMA_ALPHA, deferred=False):
+        self.model = model
+        self.alpha = alpha
+        self.beta = 1.0 - alpha
+        self.deferred = deferred
+        size = len(model.participants)
+        self.weighted = [0.0] * size  # S столбца
+        self.last_day = [0] * size  # L столбца
+        self.current_day = -1  # последний день похода с расходами
+        self.day_counts = {}  # день -> число записей расходов
+        self.published = {}  # столбец -> (день, пополнение) последнего события
+        self.pending = set()  # столбцы, прогноз которых изменился после последней публикации
+        self._on_journal_changed(model.journal.entries, (), publish=False)
+        model.journal.listeners.append(self._on_journal_changed)
+        model.subscribe(self._on_model_event)
+
+    def _add(self, node, day, spend):
+        last = self.last_day[node]
+        if day > last:
+            self.weighted[node] = self.weighted[node] * self.beta ** (day - last) + self.alpha * spend
+            self.last_day[node] = day
+        else:
+            self.weighted[node] += self.alpha * spend * self.beta ** (last - day)
+
+    def _on_journal_changed(self, added, removed, publish=True):
+        touched = set()
+        current_day = self.current_day
+        size = len(self.weighted)
+        for sign, entries in ((-1, removed), (1, added)):
+            for entry in entries:
+                participant, day = entry["participant"], entry["day"]
+                # Пополнения остаток увеличивают, но расходом не считаются
+                if not 0 <= participant < size or entry["amount"] >= 0 or day < 0:
+                    continue
+                self.day_counts[day] = self.day_counts.get(day, 0) + sign
+                if not self.day_counts[day]:
+                    del self.day_counts[day]
+                spend = -sign * entry["amount"]
+                node = participant
+                while node is not None:
+                    self._add(node, day, spend)
+                    touched.add(node)
+                    node = self.model.parents[node]
+        # Пополнение меняет остаток и, значит, прогноз своего столбца и фондов над ним
+        for entry in list(added) + list(removed):
+            node = entry["participant"] if 0 <= entry["participant"] < size else None
+            while node is not None and node not in touched:
+                touched.add(node)
+                node = self.model.parents[node]
+        # Текущий день - последний день с расходами; удаление его записей возвращает назад.
+        # S хранится приведённой к L столбца, поэтому прогноз верен и при дне раньше L
+        self.current_day = max(self.day_counts, default=-1)
+        if not publish:
+            return
+        # Смена дня сдвигает прогноз всех столбцов, а запись с делением - остатки всех
+        shared = any(entry.get("split") for entry in list(added) + list(removed))
+        self.pending.update(range(size) if shared or self.current_day != current_day else touched)
+        if not self.deferred:
+            self.publish_pending()
+
+    def publish_pending(self):
+        """
+        Публикует прогнозы столбцов, изменившиеся с прошлой публикации.
+        """
+        pending, self.pending = self.pending, set()
+        self._publish(sorted(pending))
+
+    def _on_model_event(self, event):
+        if event["type"] == "presence_changed":
+            self._publish([event["participant"]])
+
+    def _publish(self, participants):
+        for participant in participants:
+            forecast = self.forecast(participant)
+            key = (forecast["dry_day"], forecast["topup"])
+            if self.published.get(participant, (None, 0)) != key:
+                self.published[participant] = key
+                self.model.publish({"type": "forecast_changed", "participant": participant,
+                                    "rate": forecast["rate"], "dry_day": forecast["dry_day"],
+                                    "topup": forecast["topup"]})
+
+    def first_day(self, participant):
+        intervals = self.model.presence.get(participant)
+        return intervals[0][0] if intervals else 0
+
+    def rate(self, participant):
+        """
+        Сглаженный расход столбца в день на текущий день похода.
+        """
+        day = self.current_day
+        first = self.first_day(participant)
+        if day < first:
+            return 0.0
+        decayed = self.weighted[participant] * self.beta ** (day - self.last_day[participant])
+        return max(decayed / (1.0 - self.beta ** (day - first + 1)), 0.0)
+
+    def remaining_days(self, participant):
+        """
+        Дни после текущего, в которые столбец ещё будет тратить (с учётом присутствия).
+        """
+        days, day = self.model.days, self.current_day
+        intervals = self.model.presence.get(participant)
+        if intervals is None:
+            return max(days - 1 - day, 0)
+        return count_days([[max(first, day + 1), last] for first, last in intervals if last > day], days)
+
+    def forecast(self, participant):
+        """
+        Прогноз столбца: {"participant", "rate", "balance", "dry_day", "topup"}.
+        dry_day - номер дня (с нуля), когда остаток уйдёт ниже нуля, или None, если денег хватит;
+        topup - сколько внести, чтобы дойти до конца похода.
+        """
+        rate = self.rate(participant)
+        balance = self.model.total(participant)
+        remaining = self.remaining_days(participant)
+        dry_day = None
+        if balance < DRY_BALANCE:
+            dry_day = max(self.current_day, 0)
+        elif rate > 0 and rate * remaining > balance - DRY_BALANCE:
+            dry_day = self.current_day + int((balance - DRY_BALANCE) // rate) + 1
+        topup = max(math.ceil(rate * remaining - (balance - DRY_BALANCE)), 0)
+        return {"participant": participant, "rate": rate, "balance": balance,
+                "dry_day": dry_day, "topup": topup}
+
+    def forecasts(self):
+        """
+        Прогнозы всех участников без фондов.
+        """
+        return [self.forecast(i) for i in range(len(self.model.participants)) if not self.model.is_pool(i)]
+
+
+def forecast_text(forecast):
+    """
+    Краткий текст прогноза для подсказок и предупреждений.
+    """
+    if forecast["dry_day"] is None:
+        return f"Расход в день ~{forecast['rate']:.0f}, денег хватит до конца похода"
+    return (f"Расход в день ~{forecast['rate']:.0f}, деньги кончатся на {forecast['dry_day'] + 1}-й день, "
+            f"до конца похода пополнить на {forecast['topup']}")
+
+
+def main(argv=None):
+    """
+    Прогноз расхода по файлу похода: python forecast.py поход.json [--alpha A]
+    """
+    from hikemodel import HikeModel
+    parser = argparse.ArgumentParser(description="Прогноз расхода участников похода")
+    parser.add_argument("hike")
+    parser.add_argument("--alpha", type=float, default=EWMA_ALPHA)
+    args = parser.parse_args(argv)
+    with open(args.hike, "r", encoding="utf-8") as file:
+        hike_data = json.load(file)
+    model = HikeModel(hike_data)
+    forecast = model.forecast if args.alpha == EWMA_ALPHA else BurnForecast(model, args.alpha)
+    for row in forecast.forecasts():
+        print(f"{model.participants[row['participant']]['name']}: остаток {row['balance']:.0f}. {forecast_text(row)}")
+    started = time.perf_counter()
+    model.add_entry(max(forecast.current_day, 0), 0, "Обед", -100)
+    print(f"Запись с пересчётом прогноза: {(time.perf_counter() - started) * 1000:.2f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
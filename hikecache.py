@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from hikeutil import deep_sizeof
+
+# Бюджет памяти кэша неактивных походов по умолчанию (МБ)
+DEFAULT_CACHE_BUDGET_MB = 64
+
+
+class HikeCache:
+    """
+    LRU-кэш данных неактивных походов с ограничением по памяти.
+    Записи с несохранёнными изменениями закреплены и не вытесняются,
+    остальные вытесняются начиная с самых давно использованных.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()  # key -> (hike_data, size, pinned)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, key, hike_data, pinned=False):
+        """
+        Помещает данные похода в кэш и вытесняет старые записи сверх бюджета.
+        Возвращает список вытесненных ключей.
+        """
+        self.pop(key)
+        size = deep_sizeof(hike_data)
+        self._items[key] = (hike_data, size, pinned)
+        self.total_bytes += size
+        return self._evict()
+
+    def pop(self, key):
+        """
+        Извлекает данные похода из кэша. Возвращает None, если записи нет.
+        """
+        entry = self._items.pop(key, None)
+        if entry is None:
+            return None
+        self.total_bytes -= entry[1]
+        return entry[0]
+
+    def peek(self, key):
+        """
+        Возвращает данные похода без извлечения из кэша и без обновления порядка LRU.
+        """
+        entry = self._items.get(key)
+        return entry[0] if entry else None
+
+    def set_budget(self, budget_bytes):
+        """
+        Изменяет бюджет памяти и сразу применяет его.
+        """
+        self.budget_bytes = budget_bytes
+        return self._evict()
+
+    def _evict(self):
+        evicted = []
+        for key in list(self._items):
+            if self.total_bytes <= self.budget_bytes:
+                break
+            if not self._items[key][2]:
+                self.pop(key)
+                evicted.append(key)
+        return evicted
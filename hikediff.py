@@ -0,0 +1,257 @@
+import sys, copy, json, time, argparse
+from journal import ExpenseJournal, TOMBSTONES_FIELD, entry_content
+from migrate import repair_hike
+from audit import AuditLog
+from hikeutil import make_synthetic_hike
+
+# Поля заголовка похода, сравниваемые как значения
+HEADER_FIELDS = ['hike_name', 'start_date', 'end_date', 'track_days']
+
+
+def _copy_entry(entry):
+    entry = dict(entry)
+    if "receipts" in entry:
+        entry["receipts"] = list(entry["receipts"])
+    return entry
+
+
+def hike_entries(hike_data):
+    """
+    Возвращает {id: запись} журнала похода. Для файлов без журнала записи
+    строятся из ячеек с идентификаторами по содержимому, как при открытии файла.
+    """
+    if 'journal' in hike_data:
+        entries = hike_data['journal']
+    else:
+        entries = ExpenseJournal(dict(hike_data)).entries
+    return {entry['id']: entry for entry in entries}
+
+
+def diff_hikes(old, new):
+    """
+    Сравнивает два варианта похода по записям журнала (O(n) по числу записей).
+    Возвращает {"header": [(поле, было, стало)], "participants": [(индекс, было, стало)],
+    "added": [...], "removed": [...], "changed": [(было, стало)]}.
+    """
+    result = {"header": [], "participants": [], "added": [], "removed": [], "changed": []}
+    for field in HEADER_FIELDS:
+        if old.get(field) != new.get(field):
+            result["header"].append((field, old.get(field), new.get(field)))
+    old_participants, new_participants = old.get('participants', []), new.get('participants', [])
+    for index in range(max(len(old_participants), len(new_participants))):
+        before = old_participants[index] if index < len(old_participants) else None
+        after = new_participants[index] if index < len(new_participants) else None
+        if before != after:
+            result["participants"].append((index, before, after))
+
+    old_entries, new_entries = hike_entries(old), hike_entries(new)
+    for entry_id, entry in new_entries.items():
+        before = old_entries.get(entry_id)
+        if before is None:
+            result["added"].append(entry)
+        elif entry_content(before) != entry_content(entry):
+            result["changed"].append((before, entry))
+    result["removed"] = [entry for entry_id, entry in old_entries.items() if entry_id not in new_entries]
+    return result
+
+
+def _merge_value(base, ours, theirs):
+    """
+    Трёхстороннее слияние значения. Возвращает (значение, есть ли конфликт).
+    """
+    if ours == theirs or theirs == base:
+        return ours, False
+    if ours == base:
+        return theirs, False
+    return ours, True
+
+
+def merge_hikes(base, ours, theirs):
+    """
+    Трёхстороннее слияние вариантов похода относительно общего предка.
+
+    Записи сопоставляются по идентификатору: добавления с обеих сторон объединяются,
+    удаление или изменение с одной стороны применяется, если другая сторона запись не трогала.
+    При расхождении остаётся "наш" вариант, а в списке конфликтов указываются все три.
+    Возвращает (объединённые данные похода, конфликты).
+    """
+    # Журнал собирается отдельно, остальные поля копируются целиком
+    merged = {key: copy.deepcopy(value) for key, value in ours.items() if key != 'journal'}
+    conflicts = []
+    for field in HEADER_FIELDS:
+        value, conflict = _merge_value(base.get(field), ours.get(field), theirs.get(field))
+        merged[field] = value
+        if conflict:
+            conflicts.append({"kind": "field", "key": field, "base": base.get(field),
+                              "ours": ours.get(field), "theirs": theirs.get(field)})
+
+    base_participants = base.get('participants', [])
+    ours_participants = ours.get('participants', [])
+    theirs_participants = theirs.get('participants', [])
+    if len(ours_participants) == len(theirs_participants):
+        # Состав тот же: участники сливаются по позиции (имя и взнос)
+        merged_participants = []
+        for index, (mine, other) in enumerate(zip(ours_participants, theirs_participants)):
+            original = base_participants[index] if index < len(base_participants) else None
+            value, conflict = _merge_value(original, mine, other)
+            merged_participants.append(value)
+            if conflict:
+                conflicts.append({"kind": "participant", "key": index, "base": original,
+                                  "ours": mine, "theirs": other})
+    else:
+        merged_participants, conflict = _merge_value(base_participants, ours_participants, theirs_participants)
+        if conflict:
+            conflicts.append({"kind": "participants", "key": "participants", "base": base_participants,
+                              "ours": ours_participants, "theirs": theirs_participants})
+    merged['participants'] = copy.deepcopy(merged_participants)
+
+    base_entries, ours_entries, theirs_entries = hike_entries(base), hike_entries(ours), hike_entries(theirs)
+    journal = []
+    for entry_id in list(ours_entries) + [entry_id for entry_id in theirs_entries if entry_id not in ours_entries] \
+            + [entry_id for entry_id in base_entries
+               if entry_id not in ours_entries and entry_id not in theirs_entries]:
+        original = base_entries.get(entry_id)
+        mine = ours_entries.get(entry_id)
+        other = theirs_entries.get(entry_id)
+        mine_content = entry_content(mine)
+        value, conflict = _merge_value(entry_content(original), mine_content, entry_content(other))
+        if conflict:
+            conflicts.append({"kind": "entry", "key": entry_id, "base": original, "ours": mine, "theirs": other})
+            # Удаление против изменения: изменённая запись сохраняется
+            kept = mine if mine is not None else other
+        elif value is None:
+            kept = None
+        else:
+            kept = mine if mine is not None and mine_content == value else other
+        if kept is not None:
+            journal.append(_copy_entry(kept))
+    # Надгробия обеих сторон: удалённые записи не должны вернуться при синхронизации
+    tombstones = {tombstone['id']: tombstone for side in (ours, theirs)
+                  for tombstone in side.get(TOMBSTONES_FIELD, [])}
+    if tombstones:
+        merged[TOMBSTONES_FIELD] = [dict(tombstone) for tombstone in tombstones.values()]
+        deleted = {tombstone['tombstone'] for tombstone in tombstones.values()}
+        journal = [entry for entry in journal if entry['id'] not in deleted]
+    # Цепочка аудита продолжает нашу: изменения относительно нашего журнала дописываются в неё
+    merged['journal'] = [_copy_entry(entry) for entry in ours_entries.values()]
+    audit = AuditLog(merged)
+    merged_entries = {entry['id']: entry for entry in journal}
+    audit.on_journal_changed(
+        [entry for entry in journal if entry_content(ours_entries.get(entry['id'])) != entry_content(entry)],
+        [entry for entry_id, entry in ours_entries.items()
+         if entry_content(merged_entries.get(entry_id)) != entry_content(entry)])
+    merged['journal'] = journal
+    # Текст ячеек и размеры таблицы строятся заново из объединённого журнала
+    repair_hike(merged)
+    return merged, conflicts
+
+
+def _describe_entry(entry, participants):
+    index = entry.get('participant', 0)
+    name = participants[index]['name'] if 0 <= index < len(participants) else f"участник {index + 1}"
+    note = f" ({entry['note']})" if entry.get('note') else ""
+    return f"день {entry['day'] + 1}, {name}: {entry.get('category', '')} {entry.get('amount', 0):+g}{note}"
+
+
+def format_diff(diff, participants):
+    """
+    Возвращает текстовый отчёт о различиях (строки с +, - и ~).
+    """
+    lines = [f"~ {field}: {before} -> {after}" for field, before, after in diff["header"]]
+    for index, before, after in diff["participants"]:
+        if before is None:
+            lines.append(f"+ участник {after['name']} ({after['payment']})")
+        elif after is None:
+            lines.append(f"- участник {before['name']}")
+        else:
+            lines.append(f"~ участник {index + 1}: {before['name']} ({before['payment']}) -> "
+                         f"{after['name']} ({after['payment']})")
+    lines.extend(f"+ {_describe_entry(entry, participants)}" for entry in diff["added"])
+    lines.extend(f"- {_describe_entry(entry, participants)}" for entry in diff["removed"])
+    lines.extend(f"~ {_describe_entry(before, participants)} -> {_describe_entry(after, participants)}"
+                 for before, after in diff["changed"])
+    return "\n".join(lines) if lines else "Различий нет"
+
+
+def format_conflicts(conflicts, participants):
+    """
+    Возвращает текстовое описание конфликтов слияния.
+    """
+    lines = []
+    for conflict in conflicts:
+        if conflict["kind"] == "entry":
+            sides = []
+            for side, title in (("base", "было"), ("ours", "наше"), ("theirs", "их")):
+                entry = conflict[side]
+                sides.append(f"{title}: {_describe_entry(entry, participants) if entry else 'удалена'}")
+            lines.append(f"! запись {conflict['key']}: " + "; ".join(sides))
+        else:
+            lines.append(f"! {conflict['key']}: было {conflict['base']}, наше {conflict['ours']}, "
+                         f"их {conflict['theirs']}")
+    return "\n".join(lines)
+
+
+def run_benchmark(num_entries):
+    """
+    Замеряет слияние двух вариантов похода по num_entries записей от общего предка.
+    Возвращает время слияния в секундах и число конфликтов.
+    """
+    base = make_synthetic_hike(10, 30, 0)
+    journal = ExpenseJournal(base, "base-device")
+    journal.record_batch([(n % 30, n % 10, "Обед", -100.0 - n % 50, {}) for n in range(num_entries)])
+    ours, theirs = copy.deepcopy(base), copy.deepcopy(base)
+    ExpenseJournal(ours, "ours").record_batch([(n % 30, n % 10, "Ланч", -200.0, {}) for n in range(num_entries // 10)])
+    ExpenseJournal(theirs, "theirs").record_batch([(n % 30, n % 10, "Завтрак", -50.0, {})
+                                                   for n in range(num_entries // 10)])
+    for entry in theirs['journal'][:num_entries // 20]:
+        entry['note'] = "исправлено"
+    started = time.perf_counter()
+    _, conflicts = merge_hikes(base, ours, theirs)
+    return time.perf_counter() - started, len(conflicts)
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def main(argv=None):
+    """
+    Сравнение: python hikediff.py diff старый.json новый.json
+    Слияние:   python hikediff.py merge предок.json наш.json их.json -o результат.json
+    Бенчмарк:  python hikediff.py bench [--entries N]
+    """
+    parser = argparse.ArgumentParser(description="Сравнение и слияние файлов походов")
+    commands = parser.add_subparsers(dest="command", required=True)
+    diff_parser = commands.add_parser("diff")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    merge_parser = commands.add_parser("merge")
+    merge_parser.add_argument("base")
+    merge_parser.add_argument("ours")
+    merge_parser.add_argument("theirs")
+    merge_parser.add_argument("-o", "--output", required=True)
+    bench_parser = commands.add_parser("bench")
+    bench_parser.add_argument("--entries", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    if args.command == "diff":
+        new = _load(args.new)
+        diff = diff_hikes(_load(args.old), new)
+        print(format_diff(diff, new.get('participants', [])))
+        return 0
+    if args.command == "merge":
+        merged, conflicts = merge_hikes(_load(args.base), _load(args.ours), _load(args.theirs))
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(merged, file, ensure_ascii=False, indent=4)
+        if conflicts:
+            print(format_conflicts(conflicts, merged['participants']))
+        print(f"Конфликтов: {len(conflicts)}")
+        return 1 if conflicts else 0
+    elapsed, conflicts = run_benchmark(args.entries)
+    print(f"Слияние {args.entries} записей: {elapsed * 1000:.0f} мс, конфликтов: {conflicts}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import os, json, tempfile
+
+# Поля, без которых файл не считается файлом похода
+REQUIRED_FIELDS = ['hike_name', 'participants', 'start_date', 'end_date', 'track_days', 'expenses_data']
+
+
+def read_hike(path):
+    """
+    Читает и проверяет файл похода (как при открытии в программе).
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        hike_data = json.load(file)
+    if not isinstance(hike_data, dict) or not all(field in hike_data for field in REQUIRED_FIELDS):
+        raise ValueError("Неверная структура файла")
+    return hike_data
+
+
+def write_hike(path, hike_data):
+    """
+    Атомарно записывает файл похода: сначала во временный файл, затем замена.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(hike_data, file, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
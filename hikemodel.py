@@ -0,0 +1,379 @@
+from journal import ExpenseJournal, LOCAL_DEVICE
+from audit import AuditLog
+from splits import SplitEngine
+from presence import normalize_intervals, contains, count_days
+from forecast import BurnForecast
+from budgets import CategoryBudgets
+
+# Пороги подсветки остатка участника (как в таблице расходов)
+LOW_BALANCE_THRESHOLD = 1000
+NEGATIVE_BALANCE_THRESHOLD = 0
+
+# Категория пополнения общака; остальные категории - расходы
+TOPUP_CATEGORY = "Пополнение"
+# Имя столбца общего фонда
+POOL_NAME = "Общак"
+# Значение поля kind у столбцов-фондов (общак и фонды связок)
+POOL_KIND = "pool"
+
+
+def signed_amount(category, amount):
+    """
+    Возвращает сумму со знаком: пополнение положительное, расходы отрицательные.
+    """
+    return abs(amount) if category == TOPUP_CATEGORY else -abs(amount)
+
+
+def is_pool(participant):
+    """
+    Столбец-фонд: общак или фонд связки. Остаток фонда - сумма остатков его участников.
+    """
+    return participant.get('kind') == POOL_KIND or participant.get('name') == POOL_NAME
+
+
+def pool_parents(participants, root):
+    """
+    Возвращает родительский фонд каждого столбца (для корневого общака None).
+    Поле parent участника или фонда - индекс фонда; неверные ссылки и циклы ведут в корень.
+    """
+    parents = []
+    for index, participant in enumerate(participants):
+        parent = participant.get('parent')
+        if not (isinstance(parent, int) and 0 <= parent < len(participants) and parent != index
+                and is_pool(participants[parent])):
+            parent = root
+        parents.append(None if index == root else parent)
+    for index in range(len(participants)):
+        # Цикл среди фондов: разрываем, подвешивая фонд к корню
+        seen, node = set(), index
+        while node is not None and node not in seen:
+            seen.add(node)
+            node = parents[node]
+        if node is not None:
+            parents[index] = root if index != root else None
+    return parents
+
+
+def balance_level(total):
+    """
+    Возвращает уровень остатка: "negative" (меньше нуля), "low" (меньше порога) или "ok".
+    """
+    if total < NEGATIVE_BALANCE_THRESHOLD:
+        return "negative"
+    if total < LOW_BALANCE_THRESHOLD:
+        return "low"
+    return "ok"
+
+
+class HikeModel:
+    """
+    Модель похода без интерфейса: участники, журнал записей и расчёт итогов.
+    Используется окном программы и локальным HTTP API.
+
+    Остатки участников пересчитываются инкрементально при каждой новой записи,
+    а подписчики получают компактные события изменений:
+    {"type": "entry_added", "id", "day", "participant", "category", "amount"}
+    {"type": "entry_removed", "id", "day", "participant"}
+    {"type": "total_changed", "participant", "total"}
+    {"type": "threshold_crossed", "participant", "level", "total"}
+    {"type": "presence_changed", "participant"}
+    {"type": "forecast_changed", "participant", "rate", "dry_day", "topup"}
+    {"type": "budget_changed", "budget", "name", "spent", "remaining", "level", "level_changed"}
+
+    Фонды образуют дерево (общак -> фонды связок -> участники). Для каждого узла
+    хранится сумма по поддереву, поэтому запись обновляет только путь до корня (O(глубины)).
+    """
+
+    def __init__(self, hike_data, device_id=LOCAL_DEVICE):
+        self.hike_data = hike_data
+        self.journal = ExpenseJournal(hike_data, device_id)
+        # Каждая правка журнала попадает в цепочку аудита
+        self.audit = AuditLog(hike_data)
+        self.journal.listeners.append(self.audit.on_journal_changed)
+        self.subscribers = []
+        self.pools = {i for i, p in enumerate(self.participants) if is_pool(p)}
+        # Корневой фонд - общак
+        self.pool_index = next((i for i, p in enumerate(self.participants) if p['name'] == POOL_NAME),
+                               min(self.pools) if self.pools else None)
+        self.parents = pool_parents(self.participants, self.pool_index)
+        self.sums = [0.0] * len(self.participants)
+        for entry in self.journal.entries:
+            if 0 <= entry["participant"] < len(self.sums):
+                self.sums[entry["participant"]] += entry["amount"]
+        self.payments_total = sum(p['payment'] for p in self.participants)
+        self.sums_total = sum(self.sums)
+        self.subtree = [0.0] * len(self.participants)
+        for index, participant in enumerate(self.participants):
+            own = participant['payment'] + self.sums[index]
+            node = index
+            while node is not None:
+                self.subtree[node] += own
+                node = self.parents[node]
+        # Присутствие по дням: отрезки дней у тех, кто был в группе не весь поход
+        self.presence = {}
+        for index, participant in enumerate(self.participants):
+            intervals = normalize_intervals(participant.get('presence'), self.days)
+            if intervals is not None and index not in self.pools:
+                self.presence[index] = intervals
+        self._present_days = {}  # день -> присутствовавшие участники
+        # Доли общих расходов и расход в день обновляются раньше остатков:
+        # подписчики total_changed видят уже новые балансы и прогноз
+        self.splits = SplitEngine(self)
+        self.forecast = BurnForecast(self, deferred=True)
+        self.journal.listeners.append(self._on_journal_changed)
+        # Остатки бюджетов по категориям
+        self.budgets = CategoryBudgets(self)
+        # Последние опубликованные остатки: с ними сравниваются новые
+        self.published_totals = self.totals()
+
+    @property
+    def participants(self):
+        return self.hike_data['participants']
+
+    @property
+    def days(self):
+        return self.hike_data['track_days']
+
+    def subscribe(self, callback):
+        """
+        Подписывает callback(event) на события модели. Возвращает функцию отписки.
+        """
+        self.subscribers.append(callback)
+
+        def unsubscribe(*args):
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+        return unsubscribe
+
+    def publish(self, event):
+        for callback in list(self.subscribers):
+            callback(event)
+
+    def check_cell(self, day, participant):
+        """
+        Проверяет номер дня и участника. Бросает ValueError при выходе за пределы похода.
+        """
+        if not 0 <= day < self.days:
+            raise ValueError(f"Неверный день: {day}")
+        if not 0 <= participant < len(self.participants):
+            raise ValueError(f"Неверный участник: {participant}")
+
+    def add_entry(self, day, participant, category, amount, **fields):
+        """
+        Добавляет запись в журнал. Текст ячейки и остатки обновляются через события журнала.
+        Возвращает запись.
+
+        :param amount: Сумма со знаком (расход отрицательный).
+        """
+        self.check_cell(day, participant)
+        return self.journal.record(day, participant, category, amount, **fields)
+
+    def replace_cell_text(self, day, participant, text):
+        """
+        Заменяет содержимое ячейки текстом (правки файлов без журнала).
+        """
+        self.check_cell(day, participant)
+        self.journal.replace_cell(day, participant, text)
+
+    def _on_journal_changed(self, added, removed):
+        touched = set()
+        for sign, entries in ((-1, removed), (1, added)):
+            for entry in entries:
+                participant = entry["participant"]
+                if not 0 <= participant < len(self.sums):
+                    continue
+                delta = sign * entry["amount"]
+                node = participant
+                while node is not None:
+                    touched.add(node)
+                    self.subtree[node] += delta
+                    node = self.parents[node]
+                self.sums[participant] += delta
+                self.sums_total += delta
+
+        expenses_data = self.hike_data['expenses_data']
+        for day, participant in {(entry["day"], entry["participant"]) for entry in list(added) + list(removed)}:
+            if day < len(expenses_data) and participant < len(expenses_data[day]):
+                expenses_data[day][participant] = self.journal.cell_text(day, participant)
+
+        for entry in removed:
+            event = {"type": "entry_removed", "id": entry["id"],
+                     "day": entry["day"], "participant": entry["participant"]}
+            if entry.get("split"):
+                event["split"] = entry["split"]
+            self.publish(event)
+        for entry in added:
+            event = {"type": "entry_added", "id": entry["id"], "day": entry["day"],
+                     "participant": entry["participant"], "category": entry["category"],
+                     "amount": entry["amount"]}
+            if entry.get("receipts"):
+                event["receipts"] = entry["receipts"]
+            if entry.get("split"):
+                event["split"] = entry["split"]
+            self.publish(event)
+        # Запись с делением меняет доли, а с ними остатки всех участников
+        if any(entry.get("split") for entry in list(added) + list(removed)):
+            touched = range(len(self.participants))
+        # Прогнозы - после остатков
+        self._publish_totals(touched)
+        self.forecast.publish_pending()
+
+    def _publish_totals(self, participants):
+        # Сначала участники, затем фонды
+        for participant in sorted(participants, key=lambda index: (index in self.pools, index)):
+            self._publish_total(participant, self.published_totals[participant], self.total(participant))
+
+    def _publish_total(self, participant, old_total, new_total):
+        if new_total == old_total:
+            return
+        self.published_totals[participant] = new_total
+        self.publish({"type": "total_changed", "participant": participant, "total": new_total})
+        if participant not in self.pools and balance_level(old_total) != balance_level(new_total):
+            self.publish({"type": "threshold_crossed", "participant": participant,
+                          "level": balance_level(new_total), "total": new_total})
+
+    def expenses_by_participant(self):
+        """
+        Возвращает сумму записей (со знаком) по каждому участнику.
+        """
+        return list(self.sums)
+
+    def total(self, participant):
+        """
+        Возвращает остаток участника: начальный взнос плюс сумма его записей
+        с поправкой на его долю в записях с правилом деления.
+        Для фонда - его собственные записи плюс остатки всех вложенных участников и фондов.
+        Этот остаток показывают таблица, статистика, прогноз, планы пополнений и справочник.
+        """
+        if participant in self.pools:
+            own = self.subtree[participant]
+        else:
+            own = self.participants[participant]['payment'] + self.sums[participant]
+        return own + self.splits.credit(participant)
+
+    def split_engine(self):
+        """
+        Возвращает распределение общих расходов по правилам деления записей.
+        """
+        return self.splits
+
+    def is_present(self, participant, day):
+        """
+        Был ли участник в группе в этот день. Фонды присутствуют всегда.
+        """
+        return contains(self.presence.get(participant), day)
+
+    def present(self, day):
+        """
+        Возвращает участников без фондов, бывших в группе в этот день,
+        или None, если все участники были в походе целиком.
+        """
+        if not self.presence:
+            return None
+        if day not in self._present_days:
+            self._present_days[day] = [i for i in range(len(self.participants))
+                                       if i not in self.pools and self.is_present(i, day)]
+        return self._present_days[day]
+
+    def present_days(self, participant):
+        return count_days(self.presence.get(participant), self.days)
+
+    def set_presence(self, participant, intervals):
+        """
+        Задаёт отрезки присутствия участника (None - весь поход).
+        Доли общих расходов по присутствию пересчитываются.
+        """
+        if participant in self.pools:
+            raise ValueError("Для фонда присутствие не задаётся")
+        intervals = normalize_intervals(intervals, self.days)
+        if intervals is None:
+            self.presence.pop(participant, None)
+            self.participants[participant].pop('presence', None)
+        else:
+            self.presence[participant] = intervals
+            self.participants[participant]['presence'] = [list(interval) for interval in intervals]
+        self._present_days = {}
+        self.splits.rebuild()
+        if self.splits.shared:
+            # Доли по присутствию меняют остатки всех участников
+            self._publish_totals(range(len(self.participants)))
+        self.publish({"type": "presence_changed", "participant": participant})
+
+    def pool_total(self):
+        if self.pool_index is None:
+            return self.payments_total + self.sums_total
+        return self.subtree[self.pool_index]
+
+    def is_pool(self, participant):
+        return participant in self.pools
+
+    def children(self, pool):
+        """
+        Возвращает столбцы, непосредственно входящие в фонд.
+        """
+        return [index for index, parent in enumerate(self.parents) if parent == pool]
+
+    def descendants(self, pool):
+        """
+        Возвращает все столбцы поддерева фонда (без самого фонда).
+        """
+        result, stack = [], self.children(pool)
+        while stack:
+            index = stack.pop()
+            result.append(index)
+            stack.extend(self.children(index))
+        return sorted(result)
+
+    def totals(self):
+        """
+        Возвращает остатки всех участников (последний элемент - общак).
+        """
+        return [self.total(i) for i in range(len(self.participants))]
+
+    def participant_statistics(self, index):
+        """
+        Возвращает статистику участника в том же виде, что и окно статистики:
+        взнос, общие расходы, расход в день и итоговый баланс.
+        Расход в день считается по дням присутствия участника.
+        Если есть записи с правилом деления, баланс учитывает долю участника
+        в общих расходах, а в статистику добавляется эта доля ("share").
+        """
+        participant = self.participants[index]
+        amount = self.sums[index]
+        total_expenses = abs(amount)
+        days = self.present_days(index)
+        stats = {
+            "index": index,
+            "name": participant['name'],
+            "payment": participant['payment'],
+            "expenses": total_expenses,
+            "daily_average": total_expenses / days if days > 0 else 0,
+            "present_days": days,
+            "balance": self.total(index),
+        }
+        if self.splits.shared:
+            stats["share"] = self.splits.burdens()[index]
+        return stats
+
+    def statistics(self):
+        """
+        Возвращает статистику по всем участникам, кроме фондов.
+        """
+        return [self.participant_statistics(i) for i in range(len(self.participants))
+                if i not in self.pools]
+
+    def settlements(self):
+        """
+        Возвращает расчёт по завершении похода: кому вернуть деньги и кто должен досдать в общак.
+        """
+        result = []
+        for row in self.statistics():
+            balance = row["balance"]
+            if balance > 0:
+                action = "return"
+            elif balance < 0:
+                action = "pay"
+            else:
+                action = "none"
+            result.append({"name": row["name"], "action": action, "amount": abs(balance)})
+        return result
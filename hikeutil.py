@@ -0,0 +1,53 @@
+import sys, datetime
+
+# Вспомогательные функции без зависимостей от Qt и модели:
+# оценка размера объектов и синтетические походы для бенчмарков и тестов.
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Рекурсивно оценивает размер объекта Python в байтах.
+    Учитывает вложенные словари, списки, кортежи и множества; общие объекты считаются один раз.
+    Используется там, где запускать tracemalloc слишком дорого (например, в кэше походов).
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    return size
+
+
+def make_synthetic_hike(num_participants, num_days, entries_per_cell):
+    """
+    Создаёт синтетический поход заданного размера в формате файла похода.
+    Ячейки заполняются текстом вида "Завтрак -500; Обед -1200".
+    """
+    categories = ["Завтрак", "Ланч", "Обед"]
+    start = datetime.date(2025, 3, 20)
+    participants = [{"name": f"Участник {i + 1}", "payment": 20000} for i in range(num_participants)]
+    participants.append({"name": "Общак", "payment": 0})
+    expenses_data = []
+    for day in range(num_days):
+        day_expenses = []
+        for idx in range(num_participants + 1):
+            entries = [f"{categories[(day + idx + k) % 3]} -{100 * (k + 1) + idx}"
+                       for k in range(entries_per_cell)]
+            day_expenses.append("; ".join(entries))
+        expenses_data.append(day_expenses)
+    return {
+        "hike_name": "Бенчмарк",
+        "participants": participants,
+        "start_date": start.isoformat(),
+        # Длина таблицы MainWorksWidget берётся из дат, поэтому конец - последний день похода
+        "end_date": (start + datetime.timedelta(days=max(num_days - 1, 0))).isoformat(),
+        "track_days": num_days,
+        "expenses_data": expenses_data,
+    }
@@ -0,0 +1,245 @@
+import os, sys, csv, json, time, hashlib, argparse
+from hikemodel import HikeModel, signed_amount
+from hikeutil import make_synthetic_hike
+from cellparser import parse_amount
+from hikefile import write_hike
+
+# Статусы результата обработки записи
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+REJECTED = "rejected"
+
+# Столбцы CSV-файла записей (разделитель ";", как в ячейках таблицы)
+CSV_FIELDS = ["day", "participant", "category", "amount", "key", "note"]
+
+
+def item_content(item):
+    """
+    Содержимое записи без ключа, по которому узнаются повторы: день, участник, категория,
+    сумма, знак и заметка (заметка - только если задана, чтобы ключи старых импортов не менялись).
+    """
+    raw = "|".join(str(item.get(field, "")) for field in ("day", "participant", "category", "amount", "sign"))
+    if item.get("note"):
+        raw += f"|{item['note']}"
+    return raw
+
+
+def item_key(item, occurrence=0):
+    """
+    Возвращает ключ идемпотентности записи.
+    Если ключ не задан, он строится по содержимому записи и номеру её повтора в пакете,
+    поэтому повторный импорт того же файла не создаёт дублей.
+    """
+    if item.get("key"):
+        return str(item["key"])
+    return "auto:" + hashlib.sha1(f"{item_content(item)}|{occurrence}".encode("utf-8")).hexdigest()[:16]
+
+
+def parse_item(model, item):
+    """
+    Проверяет запись пакета и возвращает (день, участник, категория, сумма со знаком).
+    Участник задаётся номером или именем. Бросает ValueError для неверной записи.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Запись должна быть объектом")
+    try:
+        category = str(item["category"]).strip()
+        amount = parse_amount(item["amount"])
+        day = int(item["day"])
+        participant = item["participant"]
+    except KeyError as e:
+        raise ValueError(f"Не указано поле {e}")
+    except (TypeError, ValueError):
+        raise ValueError("Неверный день или сумма")
+    if not category:
+        raise ValueError("Не указана категория")
+    if isinstance(participant, str) and not participant.strip().isdigit():
+        names = [p['name'] for p in model.participants]
+        if participant.strip() not in names:
+            raise ValueError(f"Неизвестный участник: {participant}")
+        participant = names.index(participant.strip())
+    try:
+        participant = int(participant)
+    except (TypeError, ValueError):
+        raise ValueError(f"Неверный участник: {participant}")
+    if "sign" in item:
+        amount = abs(amount) if item["sign"] == "+" else -abs(amount)
+    else:
+        amount = signed_amount(category, amount)
+    model.check_cell(day, participant)
+    return day, participant, category, amount
+
+
+class IngestQueue:
+    """
+    Очередь записей, накопленных без программы (бумажные заметки, телефон).
+
+    Пакет проверяется целиком, повторы отбрасываются по ключу идемпотентности,
+    а принятые записи добавляются в журнал одной операцией - итоги и таблица
+    обновляются один раз на пакет, а не на каждую запись.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.pending = []
+
+    def submit(self, items):
+        """
+        Ставит записи в очередь. Возвращает размер очереди.
+        """
+        self.pending.extend(items)
+        return len(self.pending)
+
+    def commit(self, auto_keys=True):
+        """
+        Добавляет все записи очереди в журнал и очищает очередь.
+        Возвращает результаты в порядке записей:
+        {"key", "status": accepted | duplicate | rejected, "id" или "error"}.
+        """
+        items, self.pending = self.pending, []
+        return self.ingest(items, auto_keys)
+
+    def ingest(self, items, auto_keys=True):
+        """
+        Проверяет и добавляет пакет записей одной операцией журнала.
+
+        :param auto_keys: Строить ключ по содержимому для записей без ключа.
+                          Если False, такие записи принимаются без проверки повторов.
+        """
+        journal = self.model.journal
+        results = []
+        records = []
+        batch_keys = {}
+        occurrences = {}
+        repeats = []  # (повтор, результат записи этого пакета, которую он повторяет)
+        for item in items:
+            key = None
+            if isinstance(item, dict) and item.get("key"):
+                key = item_key(item)
+            elif isinstance(item, dict) and auto_keys:
+                raw = item_content(item)
+                occurrences[raw] = occurrences.get(raw, -1) + 1
+                key = item_key(item, occurrences[raw])
+            if key is not None and key in journal.keys:
+                results.append({"key": key, "status": DUPLICATE, "id": journal.keys[key]["id"]})
+                continue
+            if key is not None and key in batch_keys:
+                # id повторяемой записи известен только после добавления пакета
+                result = {"key": key, "status": DUPLICATE, "id": None}
+                repeats.append((result, batch_keys[key]))
+                results.append(result)
+                continue
+            try:
+                day, participant, category, amount = parse_item(self.model, item)
+            except ValueError as e:
+                results.append({"key": key, "status": REJECTED, "error": str(e)})
+                continue
+            result = {"key": key, "status": ACCEPTED}
+            if key is not None:
+                batch_keys[key] = result
+            results.append(result)
+            fields = {"key": key} if key else {}
+            if item.get("note"):
+                fields["note"] = str(item["note"]).strip()
+            records.append((day, participant, category, amount, fields))
+
+        # Одна операция журнала: одно обновление итогов на весь пакет
+        entries = journal.record_batch(records)
+        accepted = (result for result in results if result["status"] == ACCEPTED)
+        for result, entry in zip(accepted, entries):
+            result["id"] = entry["id"]
+        for result, original in repeats:
+            result["id"] = original["id"]
+        return results
+
+
+def summarize(results):
+    """
+    Возвращает {статус: количество} для результатов пакета.
+    """
+    summary = {ACCEPTED: 0, DUPLICATE: 0, REJECTED: 0}
+    for result in results:
+        summary[result["status"]] += 1
+    return summary
+
+
+def read_items(path):
+    """
+    Читает записи из JSON (список объектов) или CSV (день;участник;категория;сумма[;ключ[;заметка]]).
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as file:
+        if os.path.splitext(path)[1].lower() == ".json":
+            items = json.load(file)
+            if not isinstance(items, list):
+                raise ValueError("Файл должен содержать список записей")
+            return items
+        items = []
+        for row in csv.reader(file, delimiter=";"):
+            if not row or not row[0].strip() or row[0].strip().lower() == "day":
+                continue
+            items.append({field: value.strip() for field, value in zip(CSV_FIELDS, row) if value.strip()})
+        return items
+
+
+def run_benchmark(num_entries, num_participants=10, num_days=30):
+    """
+    Замеряет скорость приёма пакета записей и повторной отправки того же пакета.
+    Возвращает (записей/с при приёме, записей/с при повторе).
+    """
+    model = HikeModel(make_synthetic_hike(num_participants, num_days, 0), "bench")
+    items = [{"key": f"bench-{n}", "day": n % num_days, "participant": n % num_participants,
+              "category": "Обед", "amount": 100 + n % 500} for n in range(num_entries)]
+    queue = IngestQueue(model)
+
+    queue.submit(items)
+    started = time.perf_counter()
+    results = queue.commit()
+    ingest_time = time.perf_counter() - started
+    assert summarize(results)[ACCEPTED] == num_entries
+
+    queue.submit(items)
+    started = time.perf_counter()
+    results = queue.commit()
+    retry_time = time.perf_counter() - started
+    assert summarize(results)[DUPLICATE] == num_entries
+    return num_entries / ingest_time, num_entries / retry_time
+
+
+def main(argv=None):
+    """
+    Импорт записей в файл похода: python ingest.py поход.json записи.csv [--device ID]
+    Бенчмарк: python ingest.py --bench [--entries N]
+    """
+    parser = argparse.ArgumentParser(description="Пакетный приём записей расходов")
+    parser.add_argument("hike_file", nargs="?")
+    parser.add_argument("items_file", nargs="?")
+    parser.add_argument("--device", default="ingest", help="идентификатор устройства для журнала")
+    parser.add_argument("--bench", action="store_true", help="замерить скорость приёма")
+    parser.add_argument("--entries", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        ingest_rate, retry_rate = run_benchmark(args.entries)
+        print(f"Приём: {ingest_rate:.0f} записей/с, повтор: {retry_rate:.0f} записей/с")
+        return 0
+    if not args.hike_file or not args.items_file:
+        parser.error("укажите файл похода и файл записей")
+
+    with open(args.hike_file, "r", encoding="utf-8") as file:
+        hike_data = json.load(file)
+    model = HikeModel(hike_data, args.device)
+    queue = IngestQueue(model)
+    queue.submit(read_items(args.items_file))
+    results = queue.commit()
+    for number, result in enumerate(results, start=1):
+        if result["status"] == REJECTED:
+            print(f"Запись {number}: {result['error']}", file=sys.stderr)
+    summary = summarize(results)
+    if summary[ACCEPTED]:
+        write_hike(args.hike_file, hike_data)
+    print(f"Принято: {summary[ACCEPTED]}, повторы: {summary[DUPLICATE]}, отклонено: {summary[REJECTED]}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
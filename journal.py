@@ -0,0 +1,281 @@
+import json, hashlib
+from cellparser import parse_cell
+
+# Устройство, к которому относятся записи, найденные в ячейках до появления журнала
+BASE_DEVICE = "base"
+# Устройство по умолчанию, если идентификатор устройства не задан
+LOCAL_DEVICE = "local"
+# Поля записи, составляющие её содержимое (идентификатор не входит)
+ENTRY_FIELDS = ('day', 'participant', 'category', 'amount', 'text', 'note', 'receipts', 'key')
+# Поля, добавленные позже: входят в содержимое, только если заданы (хэши старых записей не меняются)
+OPTIONAL_FIELDS = ('split',)
+# Поле файла похода с отметками об удалении записей (надгробиями): по ним удаление
+# доходит до других устройств, и удалённая запись не возвращается при обмене
+TOMBSTONES_FIELD = "tombstones"
+
+
+def entry_id(device, seq):
+    """
+    Возвращает глобальный идентификатор записи: устройство + порядковый номер.
+    """
+    return f"{device}:{seq}"
+
+
+def entry_text(entry):
+    """
+    Возвращает текст записи в формате ячейки таблицы ("Категория -500").
+    Записи, перенесённые из старых ячеек, сохраняют исходный текст.
+    """
+    if entry.get("text"):
+        return entry["text"]
+    sign = "+" if entry["amount"] >= 0 else "-"
+    return f"{entry['category']} {sign}{round(abs(entry['amount']))}"
+
+
+def entry_content(entry):
+    """
+    Возвращает хэшируемое содержимое записи: по нему видно, изменилась ли запись с тем же id.
+    """
+    if entry is None:
+        return None
+    content = tuple(tuple(value) if isinstance(value, list) else value
+                    for value in (entry.get(field) for field in ENTRY_FIELDS))
+    extra = tuple((field, json.dumps(entry[field], sort_keys=True)) for field in OPTIONAL_FIELDS if field in entry)
+    return content + extra if extra else content
+
+
+def sort_key(entry):
+    """
+    Детерминированный порядок записей в ячейке: логические часы, устройство, номер, позиция.
+    Одинаков на всех устройствах, поэтому после слияния ячейки совпадают.
+    """
+    return entry.get("clock", 0), entry["device"], entry["seq"], entry.get("pos", 0)
+
+
+class ExpenseJournal:
+    """
+    Журнал записей расходов похода (hike_data["journal"]).
+
+    Каждая запись имеет неизменяемый идентификатор (устройство, номер), поэтому журналы
+    разных ноутбуков объединяются простым объединением множеств и сходятся одинаково
+    независимо от порядка обмена. Текст ячеек таблицы строится из журнала.
+    """
+
+    def __init__(self, hike_data, device_id=LOCAL_DEVICE):
+        self.hike_data = hike_data
+        self.device_id = device_id
+        if "journal" not in hike_data:
+            hike_data["journal"] = self._seed_from_cells(hike_data.get("expenses_data", []))
+        self.entries = hike_data["journal"]
+        self.ids = {entry["id"] for entry in self.entries}
+        self.clock = max((entry.get("clock", 0) for entry in self.entries), default=0)
+        self.cells = {}  # (день, участник) -> записи ячейки
+        self.seqs = {}  # устройство -> максимальный номер записи
+        self.keys = {}  # ключ идемпотентности -> запись
+        for entry in self.entries:
+            self._index(entry)
+        self.tombstones = hike_data.get(TOMBSTONES_FIELD, [])
+        self.deleted = set()  # идентификаторы удалённых записей
+        for tombstone in self.tombstones:
+            self._index_tombstone(tombstone)
+        self.listeners = []  # функции (добавленные записи, удалённые записи)
+
+    def _seed_from_cells(self, expenses_data):
+        """
+        Переносит записи из текста ячеек старого файла в журнал.
+        Идентификатор строится по содержимому, поэтому одинаковые исходные файлы
+        на разных устройствах дают одинаковые записи.
+        """
+        entries = []
+        for day, day_expenses in enumerate(expenses_data):
+            for participant, text in enumerate(day_expenses):
+                text = str(text).strip()
+                if not text or text == "0":
+                    continue
+                for pos, (category, amount, part) in enumerate(parse_cell(text)):
+                    digest = hashlib.sha1(f"{day}|{participant}|{pos}|{part}".encode("utf-8")).hexdigest()[:12]
+                    if amount is None:
+                        # Нераспознанная запись сохраняет текст, но не влияет на итоги
+                        amount = 0.0
+                    entries.append({
+                        "id": entry_id(BASE_DEVICE, digest),
+                        "device": BASE_DEVICE,
+                        "seq": 0,
+                        "pos": pos,
+                        "clock": 0,
+                        "day": day,
+                        "participant": participant,
+                        "category": category,
+                        "amount": amount,
+                        "text": part,
+                    })
+        return entries
+
+    def record(self, day, participant, category, amount, **fields):
+        """
+        Добавляет новую запись от текущего устройства и возвращает её.
+
+        :param amount: Сумма со знаком (расход отрицательный, пополнение положительное).
+        """
+        return self.record_batch([(day, participant, category, amount, fields)])[0]
+
+    def record_batch(self, records):
+        """
+        Добавляет несколько записей одной операцией: слушатели получают одно уведомление.
+        Возвращает список записей.
+
+        :param records: Список (день, участник, категория, сумма, доп. поля).
+        """
+        added = []
+        for day, participant, category, amount, fields in records:
+            seq = self.seqs.get(self.device_id, 0) + 1
+            self.clock += 1
+            entry = dict(fields,
+                         id=entry_id(self.device_id, seq),
+                         device=self.device_id,
+                         seq=seq,
+                         clock=self.clock,
+                         day=day,
+                         participant=participant,
+                         category=category,
+                         amount=amount)
+            self._add(entry)
+            added.append(entry)
+        if added:
+            self._notify(added)
+        return added
+
+    def _add(self, entry):
+        self.entries.append(entry)
+        self._index(entry)
+
+    def _index(self, entry):
+        self.ids.add(entry["id"])
+        self.cells.setdefault((entry["day"], entry["participant"]), []).append(entry)
+        if entry["device"] != BASE_DEVICE and entry["seq"] > self.seqs.get(entry["device"], 0):
+            self.seqs[entry["device"]] = entry["seq"]
+        if entry.get("key"):
+            self.keys.setdefault(entry["key"], entry)
+
+    def _index_tombstone(self, tombstone):
+        self.ids.add(tombstone["id"])
+        self.deleted.add(tombstone["tombstone"])
+        if tombstone["seq"] > self.seqs.get(tombstone["device"], 0):
+            self.seqs[tombstone["device"]] = tombstone["seq"]
+
+    def _add_tombstone(self, tombstone):
+        if TOMBSTONES_FIELD not in self.hike_data:
+            self.hike_data[TOMBSTONES_FIELD] = self.tombstones
+        self.tombstones.append(tombstone)
+        self._index_tombstone(tombstone)
+
+    def _remove(self, removed_ids):
+        """
+        Убирает записи из журнала и индексов. Возвращает убранные записи.
+        """
+        removed = [entry for entry in self.entries if entry["id"] in removed_ids]
+        if not removed:
+            return []
+        self.entries[:] = [entry for entry in self.entries if entry["id"] not in removed_ids]
+        for entry in removed:
+            self.ids.discard(entry["id"])
+            cell = (entry["day"], entry["participant"])
+            self.cells[cell] = [other for other in self.cells[cell] if other is not entry]
+            if not self.cells[cell]:
+                del self.cells[cell]
+            if entry.get("key") and self.keys.get(entry["key"]) is entry:
+                del self.keys[entry["key"]]
+        return removed
+
+    def _notify(self, added, removed=()):
+        # Копия списка: слушатель может добавить нового слушателя во время уведомления
+        for listener in list(self.listeners):
+            listener(added, removed)
+
+    def version_vector(self):
+        """
+        Возвращает {устройство: максимальный номер записи}, известный этому журналу.
+        """
+        return dict(self.seqs)
+
+    def delta_since(self, vector):
+        """
+        Возвращает записи и надгробия, которых нет у журнала с указанным вектором версий.
+        Записи исходного файла (без номера) передаются только при первом обмене (пустой вектор):
+        все последующие записи, в том числе из правок ячеек, имеют номер своего устройства.
+        """
+        full = not vector
+        return [entry for entry in self.entries + self.tombstones
+                if (entry["device"] == BASE_DEVICE and full) or
+                   (entry["device"] != BASE_DEVICE and entry["seq"] > vector.get(entry["device"], 0))]
+
+    def merge(self, entries):
+        """
+        Добавляет в журнал неизвестные записи и применяет надгробия других устройств.
+        Возвращает список ячеек (день, участник), текст которых изменился.
+        """
+        buried = set()
+        for tombstone in entries:
+            if "tombstone" in tombstone and tombstone["id"] not in self.ids:
+                self._add_tombstone(dict(tombstone))
+                self.clock = max(self.clock, tombstone.get("clock", 0))
+                buried.add(tombstone["tombstone"])
+        removed = self._remove(buried)
+        added = []
+        for entry in entries:
+            if "tombstone" in entry or entry["id"] in self.ids or entry["id"] in self.deleted:
+                continue
+            entry = dict(entry)
+            self._add(entry)
+            self.clock = max(self.clock, entry.get("clock", 0))
+            added.append(entry)
+        if added or removed:
+            self._notify(added, removed)
+        return sorted({(entry["day"], entry["participant"]) for entry in added + removed})
+
+    def replace_cell(self, day, participant, text):
+        """
+        Заменяет записи ячейки записями, разобранными из текста.
+        Нужна только для файлов без журнала, изменённых старой версией программы:
+        у таких правок нет идентификаторов, и ячейка берётся целиком.
+        Записи, текст которых остался в ячейке, сохраняются; остальные удаляются
+        с надгробием, а новый текст становится записями текущего устройства
+        (с номером, чтобы правка дошла до других устройств при обмене).
+        """
+        grid = [[""] * (participant + 1) for _ in range(day + 1)]
+        grid[day][participant] = text
+        seeded = self._seed_from_cells(grid)
+        current = {}  # текст записи -> записи ячейки с этим текстом
+        for entry in self.cell_entries(day, participant):
+            current.setdefault(entry_text(entry), []).append(entry)
+        new_entries = []
+        for entry in seeded:
+            same = current.get(entry["text"])
+            if same:
+                same.pop(0)
+            else:
+                new_entries.append(entry)
+        removed = self._remove({entry["id"] for entries in current.values() for entry in entries})
+        for entry in removed:
+            seq = self.seqs.get(self.device_id, 0) + 1
+            self.clock += 1
+            self._add_tombstone({"id": entry_id(self.device_id, seq), "device": self.device_id, "seq": seq,
+                                 "clock": self.clock, "tombstone": entry["id"],
+                                 "day": day, "participant": participant})
+        for entry in new_entries:
+            seq = self.seqs.get(self.device_id, 0) + 1
+            self.clock += 1
+            entry.update(id=entry_id(self.device_id, seq), device=self.device_id, seq=seq, clock=self.clock)
+            self._add(entry)
+        if new_entries or removed:
+            self._notify(new_entries, removed)
+
+    def cell_entries(self, day, participant):
+        return sorted(self.cells.get((day, participant), []), key=sort_key)
+
+    def cell_text(self, day, participant):
+        """
+        Возвращает текст ячейки, построенный из записей журнала.
+        """
+        texts = [entry_text(entry) for entry in self.cell_entries(day, participant)]
+        return "; ".join(texts) if texts else "0"
@@ -1,25 +1,43 @@
 from PyQt6.QtWidgets import (QWidget, QTableWidget, QTableWidgetItem, QVBoxLayout, QHBoxLayout, QDialog, 
                              QFormLayout, QLineEdit, QLabel, QHeaderView, QRadioButton, QButtonGroup, 
-                             QGroupBox, QDialogButtonBox, QMessageBox, QPushButton)
-from PyQt6.QtCore import Qt, QDate
-from PyQt6.QtGui import QIcon
+                             QGroupBox, QDialogButtonBox, QMessageBox, QPushButton, QFileDialog, QComboBox,
+                             QMenu, QInputDialog, QProgressBar)
+from PyQt6.QtCore import Qt, QDate, QTimer
+from PyQt6.QtGui import QIcon, QColor
 # Add to imports in mainworks.py
 from statistic import StatisticWidget
+from journal import LOCAL_DEVICE, entry_text
+from hikemodel import HikeModel, LOW_BALANCE_THRESHOLD, NEGATIVE_BALANCE_THRESHOLD
+from attachments import AttachmentStore, entry_receipts
+from search import HikeSearchIndex
+from pivot import LedgerPivot
+from poolcolumns import PoolColumns
+from presence import parse_intervals, format_intervals
+from forecast import forecast_text
+from budgets import BUDGET_OK, BUDGET_OVER, parse_budgets, format_budgets, budget_text
+from topups import TopupPlanner, POINTS_FIELD, hike_points, parse_points, format_points, plan_text
+from splits import SPLIT_RULES, SPLIT_TITLES, SPLIT_WEIGHTS, make_split, parse_weights
+from cellparser import normalize_cell, parse_amount
+from migrate import repair_hike
 
 class ExpenseDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, allow_receipts=True, names=None):
         """
         Конструктор диалогового окна для ввода расходов или пополнения.
         Инициализирует окно и задаёт заголовок.
+        names - имена участников для деления записи по весам.
         """
         super().__init__(parent)
         self.setWindowTitle("Ввод расходов / пополнения")
+        self.allow_receipts = allow_receipts
+        self.names = names or []
+        self.receipt_files = []
         self.setup_ui()
 
     def setup_ui(self):
         """
         Настраивает пользовательский интерфейс диалогового окна.
-        Создаёт форму с радиокнопками для выбора категории расходов (Завтрак, Ланч, Обед, Пополнение),
+        Создаёт форму с радиокнопками для выбора категории расходов (Завтрак, Ланч, Обед, Пермиты, Пополнение),
         поле для ввода суммы и стандартные кнопки Ok/Cancel.
         """
         layout = QFormLayout(self)
@@ -30,15 +48,18 @@ class ExpenseDialog(QDialog):
         self.radio_breakfast = QRadioButton("Завтрак")
         self.radio_lunch = QRadioButton("Ланч")
         self.radio_dinner = QRadioButton("Обед")
+        self.radio_permits = QRadioButton("Пермиты")
         self.radio_topup = QRadioButton("Пополнение")
         self.button_group.addButton(self.radio_breakfast)
         self.button_group.addButton(self.radio_lunch)
         self.button_group.addButton(self.radio_dinner)
+        self.button_group.addButton(self.radio_permits)
         self.button_group.addButton(self.radio_topup)
         self.radio_breakfast.setChecked(True)
         radio_layout.addWidget(self.radio_breakfast)
         radio_layout.addWidget(self.radio_lunch)
         radio_layout.addWidget(self.radio_dinner)
+        radio_layout.addWidget(self.radio_permits)
         radio_layout.addWidget(self.radio_topup)
         layout.addRow(group_box)
         
@@ -47,6 +68,36 @@ class ExpenseDialog(QDialog):
         self.amount_edit.setPlaceholderText("Введите сумму")
         layout.addRow("Сумма:", self.amount_edit)
         
+        # Свободная заметка к записи ("чаевые носильщику, Тадапани")
+        self.note_edit = QLineEdit(self)
+        self.note_edit.setPlaceholderText("Необязательно")
+        layout.addRow("Заметка:", self.note_edit)
+        
+        # Фотографии чеков (хранятся рядом с файлом похода)
+        self.receipt_button = QPushButton("Прикрепить чек...", self)
+        self.receipt_button.clicked.connect(self.choose_receipts)
+        self.receipt_button.setEnabled(self.allow_receipts)
+        if not self.allow_receipts:
+            self.receipt_button.setToolTip("Сохраните поход, чтобы прикреплять чеки")
+        self.receipt_label = QLabel("", self)
+        receipt_layout = QHBoxLayout()
+        receipt_layout.addWidget(self.receipt_button)
+        receipt_layout.addWidget(self.receipt_label)
+        layout.addRow("Чеки:", receipt_layout)
+        
+        # Деление общей записи между участниками
+        self.split_combo = QComboBox(self)
+        self.split_combo.addItem("Не делить", None)
+        for rule in SPLIT_RULES:
+            self.split_combo.addItem(SPLIT_TITLES[rule], rule)
+        self.weights_edit = QLineEdit(self)
+        self.weights_edit.setPlaceholderText("Иван=2; Пётр=1")
+        self.weights_edit.setEnabled(False)
+        self.split_combo.currentIndexChanged.connect(
+            lambda *args: self.weights_edit.setEnabled(self.split_combo.currentData() == SPLIT_WEIGHTS))
+        layout.addRow("Разделить:", self.split_combo)
+        layout.addRow("Веса:", self.weights_edit)
+        
         # Диалоговые кнопки Ok и Cancel
         self.buttonBox = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | 
                                           QDialogButtonBox.StandardButton.Cancel, 
@@ -74,15 +125,52 @@ class ExpenseDialog(QDialog):
         elif self.radio_dinner.isChecked():
             category = "Обед"
             sign = "-"
+        elif self.radio_permits.isChecked():
+            category = "Пермиты"
+            sign = "-"
         else:
             category = ""
             sign = ""
         try:
-            amount_val = float(self.amount_edit.text().strip())
+            amount_val = abs(parse_amount(self.amount_edit.text()))
         except ValueError:
             amount_val = 0.0
         return category, amount_val, sign
 
+    def get_split(self):
+        """
+        Возвращает правило деления записи или None. Бросает ValueError при неверных весах.
+        """
+        rule = self.split_combo.currentData()
+        if rule is None:
+            return None
+        if rule == SPLIT_WEIGHTS:
+            members, weights = parse_weights(self.weights_edit.text(), self.names)
+            return make_split(rule, members, weights)
+        return make_split(rule)
+
+    def choose_receipts(self):
+        """
+        Выбирает файлы чеков для прикрепления к записи.
+        """
+        files, _ = QFileDialog.getOpenFileNames(self, "Чеки", "",
+                                                "Изображения (*.jpg *.jpeg *.png *.bmp);;Все файлы (*)")
+        if files:
+            self.receipt_files = files
+            self.receipt_label.setText(f"Выбрано файлов: {len(files)}")
+
+    def get_note(self):
+        """
+        Возвращает заметку к записи (пустая строка, если не задана).
+        """
+        return self.note_edit.text().strip()
+
+    def get_receipts(self):
+        """
+        Возвращает пути выбранных файлов чеков.
+        """
+        return list(self.receipt_files)
+
 class MainWorksWidget(QWidget):
     def __init__(self, hike_data, parent=None):
         """
@@ -94,21 +182,38 @@ class MainWorksWidget(QWidget):
         self.setWindowIcon(QIcon("icon.png"))
         self.has_unsaved_changes = False
         
-        # Initialize or validate expenses_data
-        num_participants = len(self.hike_data['participants'])
-        num_days = self.hike_data['track_days']
-        
-        # Create new expenses_data if not present or wrong size
-        if ('expenses_data' not in self.hike_data or 
-            len(self.hike_data['expenses_data']) != num_days or 
-            any(len(day) != num_participants for day in self.hike_data['expenses_data'])):
-            
-            self.hike_data['expenses_data'] = [
-                ["0" for _ in range(num_participants)] 
-                for _ in range(num_days)
-            ]
+        # Приводим данные к текущей схеме: неверная ширина или число дней
+        # в expenses_data исправляются без потери записей (раньше сбрасывались в нули)
+        if 'expenses_data' not in self.hike_data:
+            self.hike_data['expenses_data'] = []
+        repair_hike(self.hike_data)
+
+        # Модель похода: журнал записей и инкрементальные остатки.
+        # Таблица обновляется по событиям модели, без пересчёта всех ячеек.
+        window = parent.window() if parent is not None else None
+        self.model = HikeModel(self.hike_data, getattr(window, "device_id", LOCAL_DEVICE))
+        self.journal = self.model.journal
+        # Поисковый индекс записей обновляется вместе с журналом
+        self.search_index = HikeSearchIndex(self.journal)
+        # Кубы сводных таблиц строятся при первом открытии окна сводной таблицы
+        self.pivot = None
+        self._warnings_scheduled = False
+        # План пополнений по прогнозу расхода и местам пополнения на маршруте
+        self.topups = TopupPlanner(self.model)
+        self._forecast_columns = set()  # столбцы, чьи подсказки итога ждут нового прогноза
         
         self.init_ui()
+        self.destroyed.connect(self.model.subscribe(self._on_model_event))
+
+        # Миниатюры чеков загружаются лениво, только для видимых ячеек
+        self.thumbnails = getattr(window, "thumbnails", None)
+        self._thumbnail_cells = {}  # хэш чека -> ячейки (строка, столбец), ждущие миниатюру
+        self._thumbnails_scheduled = False
+        if self.thumbnails is not None:
+            self.thumbnails.ready.connect(self._on_thumbnail_ready)
+            self.table.verticalScrollBar().valueChanged.connect(self._schedule_thumbnails)
+            self.table.horizontalScrollBar().valueChanged.connect(self._schedule_thumbnails)
+            self._schedule_thumbnails()
 
     def init_ui(self):
         self.main_layout = QVBoxLayout(self)
@@ -117,7 +222,7 @@ class MainWorksWidget(QWidget):
         header_layout = QHBoxLayout()
         
         # Trek info label (name and dates) with participant count on new line
-        participant_count = len(self.hike_data.get('participants', [])) - 1  # Subtract 1 to exclude "Общак"
+        participant_count = len(self.model.statistics())  # Без общака и фондов связок
         info_text = (f"<h2>{self.hike_data.get('hike_name', 'Без названия')} | "
                     f"{QDate.fromString(self.hike_data.get('start_date', ''), Qt.DateFormat.ISODate).toString('dd.MM.yyyy')} - "
                     f"{QDate.fromString(self.hike_data.get('end_date', ''), Qt.DateFormat.ISODate).toString('dd.MM.yyyy')}</h2>"
@@ -126,12 +231,28 @@ class MainWorksWidget(QWidget):
         info_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
         header_layout.addWidget(info_label)
         
+        # Места пополнения наличных на маршруте
+        points_button = QPushButton("Места пополнения...")
+        points_button.clicked.connect(self.edit_topup_points)
+        header_layout.addWidget(points_button, alignment=Qt.AlignmentFlag.AlignRight)
+
+        # Бюджеты по категориям
+        budgets_button = QPushButton("Бюджеты...")
+        budgets_button.clicked.connect(self.edit_budgets)
+        header_layout.addWidget(budgets_button, alignment=Qt.AlignmentFlag.AlignRight)
+
         # Finish trek button
         finish_button = QPushButton("Завершить трек")
         finish_button.clicked.connect(self.finish_trek)
         header_layout.addWidget(finish_button, alignment=Qt.AlignmentFlag.AlignRight)
         
         self.main_layout.addLayout(header_layout)
+
+        # Полосы бюджетов: обновляются по событиям бюджетов модели
+        self.budget_layout = QHBoxLayout()
+        self.budget_bars = []
+        self.main_layout.addLayout(self.budget_layout)
+        self._build_budget_bars()
         
         # Remove bank info label initialization
         self.initial_payments = [p['payment'] for p in self.hike_data.get('participants', [])]
@@ -146,9 +267,13 @@ class MainWorksWidget(QWidget):
         # Количество столбцов: 1 (Дата) + количество участников
         num_participants = len(self.hike_data.get('participants', []))
         num_cols = num_participants + 1  # +1 for Date column
-        header_labels = ["Дата"] + [p['name'] for p in self.hike_data.get('participants', []) if p['name'] != "Общак"]
         self.table = QTableWidget(self.days + 1, num_cols)
-        self.table.setHorizontalHeaderLabels(header_labels)
+        self.table.setHorizontalHeaderItem(0, QTableWidgetItem("Дата"))
+        # Заголовки участников и сворачиваемых фондов
+        self.pool_columns = PoolColumns(self.table, self.model)
+        # Дни присутствия участника задаются из контекстного меню заголовка
+        self.table.horizontalHeader().setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.table.horizontalHeader().customContextMenuRequested.connect(self._header_menu)
         
         # Настройка размеров заголовков таблицы
         header = self.table.horizontalHeader()
@@ -156,15 +281,24 @@ class MainWorksWidget(QWidget):
         for i in range(1, num_cols):
             header.setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
         
-        # Заполнение ячеек таблицы
+        # Заполнение ячеек таблицы сохранёнными записями
+        expenses_data = self.hike_data['expenses_data']
         for row in range(self.days):
             date = self.start_date.addDays(row)
             self.table.setItem(row, 0, QTableWidgetItem(date.toString("dd.MM.yyyy")))
             # Заполнение ячеек для участников
             for col in range(1, num_cols):
-                item = QTableWidgetItem("0")
+                text = "0"
+                if row < len(expenses_data) and col - 1 < len(expenses_data[row]):
+                    text = str(expenses_data[row][col - 1]).strip() or "0"
+                item = QTableWidgetItem(text)
                 item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                present = self.model.is_present(col - 1, row)
+                if (row, col - 1) in self.journal.cells or not present:
+                    item.setToolTip(self._cell_tooltip(row, col - 1))
                 self.table.setItem(row, col, item)
+                if not present:
+                    self._mark_absent(item)
         
         # Заполнение строки "Итого"
         self.table.setItem(self.days, 0, QTableWidgetItem("Итого"))
@@ -191,6 +325,26 @@ class MainWorksWidget(QWidget):
                 font.setBold(True)
                 item.setFont(font)
 
+        self.recalculate_totals()
+
+    def get_expenses_data(self):
+        """
+        Возвращает расходы в формате файла похода: текст ячеек по дням и участникам.
+        Текст берётся из данных модели, а не из таблицы (её вид может быть переформатирован).
+        """
+        return [list(day_expenses) for day_expenses in self.hike_data['expenses_data']]
+
+    def apply_cell_changes(self, changes):
+        """
+        Применяет изменения отдельных ячеек (например, внешние правки файла) без перестройки таблицы.
+        Таблица и итоги обновляются по событиям модели.
+        
+        :param changes: Список (день, индекс участника, текст ячейки).
+        """
+        for row, participant_idx, text in changes:
+            if row < self.model.days and participant_idx < len(self.model.participants):
+                self.model.replace_cell_text(row, participant_idx, text)
+
     def format_money(self, value, integer=False):
         """
         Форматирует число для отображения денег.
@@ -211,97 +365,348 @@ class MainWorksWidget(QWidget):
         """
         Обрабатывает редактирование расходов при двойном клике по ячейке таблицы.
         """
-        if col == 0 or row >= self.days:
+        if col == 0 or row >= min(self.days, self.model.days):
             return
+        if not self.model.is_present(col - 1, row):
+            answer = QMessageBox.question(
+                self, "Участник не в группе",
+                f"{self.model.participants[col - 1]['name']} в этот день не в походе. Всё равно внести запись?")
+            if answer != QMessageBox.StandardButton.Yes:
+                return
                 
-        dialog = ExpenseDialog(self)
+        store = self.attachment_store()
+        dialog = ExpenseDialog(self, allow_receipts=store is not None,
+                               names=[p['name'] for p in self.model.participants])
         
         if dialog.exec() == QDialog.DialogCode.Accepted:
             category, amount, sign = dialog.get_values()
             actual_amount = amount if sign == "+" else -amount
             
-            # Update individual participant expense
-            participant_idx = col - 1
+            fields = {}
+            if dialog.get_note():
+                fields["note"] = dialog.get_note()
             try:
-                current_amount = float(self.hike_data['expenses_data'][row][participant_idx])
-                new_amount = current_amount + actual_amount
-                self.hike_data['expenses_data'][row][participant_idx] = str(new_amount)
-            except (ValueError, IndexError):
-                self.hike_data['expenses_data'][row][participant_idx] = str(actual_amount)
-            
-            # Update table cell
-            self._update_table_cell(row, col, category, amount, sign)
+                split = dialog.get_split()
+            except ValueError as e:
+                QMessageBox.critical(self, "Ошибка", str(e))
+                return
+            if split is not None:
+                fields["split"] = split
+            if dialog.get_receipts():
+                try:
+                    fields["receipts"] = [store.add(path) for path in dialog.get_receipts()]
+                except OSError as e:
+                    QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить чек: {str(e)}")
+                    return
             
-            self.recalculate_totals()
+            # Запись в журнал; ячейка и итоги обновятся по событиям модели
+            self.model.add_entry(row, col - 1, category, actual_amount, **fields)
             self.mark_as_modified()
 
-    def _update_table_cell(self, row, col, category, amount, sign):
+    def _header_menu(self, pos):
+        col = self.table.horizontalHeader().logicalIndexAt(pos)
+        if col < 1 or self.model.is_pool(col - 1):
+            return
+        menu = QMenu(self)
+        action = menu.addAction("Дни присутствия...")
+        if menu.exec(self.table.horizontalHeader().mapToGlobal(pos)) == action:
+            self.edit_presence(col - 1)
+
+    def edit_presence(self, participant_idx):
+        """
+        Задаёт дни, когда участник был в группе (например, присоединился в Покхаре).
+        """
+        intervals = self.model.presence.get(participant_idx)
+        text, ok = QInputDialog.getText(
+            self, "Дни присутствия",
+            f"Дни похода для {self.model.participants[participant_idx]['name']} "
+            f"(например, 1-5, 9; пусто - весь поход, всего {self.model.days}):",
+            text=format_intervals(intervals))
+        if not ok:
+            return
+        try:
+            intervals = parse_intervals(text, self.model.days)
+        except ValueError as e:
+            QMessageBox.critical(self, "Ошибка", str(e))
+            return
+        self.model.set_presence(participant_idx, intervals)
+        self.mark_as_modified()
+
+    def edit_topup_points(self):
+        """
+        Задаёт места маршрута, где можно пополнить наличные (день, место, лимит снятия).
+        План пополнений в подсказках строки "Итого" пересчитывается сразу.
+        """
+        text, ok = QInputDialog.getMultiLineText(
+            self, "Места пополнения",
+            "По строке на место: день; место; лимит снятия (необязательно)\nНапример: 5; Покхара; 35000",
+            format_points(hike_points(self.hike_data)))
+        if not ok:
+            return
+        try:
+            points = parse_points(text, self.model.days)
+        except ValueError as e:
+            QMessageBox.critical(self, "Ошибка", str(e))
+            return
+        if points:
+            self.hike_data[POINTS_FIELD] = points
+        else:
+            self.hike_data.pop(POINTS_FIELD, None)
+        self.topups.invalidate()
+        self.recalculate_totals()
+        self.mark_as_modified()
+
+    def edit_budgets(self):
+        """
+        Задаёт бюджеты похода по категориям ("Питание: Завтрак, Ланч, Обед = 150000").
+        """
+        text, ok = QInputDialog.getMultiLineText(
+            self, "Бюджеты",
+            "По строке на бюджет: название: категории через запятую = сумма\n"
+            "Например: Питание: Завтрак, Ланч, Обед = 150000",
+            format_budgets(self.model.budgets.budgets))
+        if not ok:
+            return
+        try:
+            budgets = parse_budgets(text)
+        except ValueError as e:
+            QMessageBox.critical(self, "Ошибка", str(e))
+            return
+        self.model.budgets.set_budgets(budgets)
+        self._build_budget_bars()
+        self._update_warnings()
+        self.mark_as_modified()
+
+    def _build_budget_bars(self):
+        for bar in self.budget_bars:
+            bar.deleteLater()
+        self.budget_bars = []
+        for index in range(len(self.model.budgets.budgets)):
+            bar = QProgressBar(self)
+            self.budget_layout.addWidget(bar)
+            self.budget_bars.append(bar)
+            self._set_budget_bar(index)
+
+    def _set_budget_bar(self, index):
+        """
+        Показывает израсходованную часть бюджета; превышенный бюджет - красным.
+        """
+        status = self.model.budgets.status(index)
+        bar = self.budget_bars[index]
+        bar.setRange(0, max(round(status["amount"]), 1))
+        bar.setValue(min(max(round(status["spent"]), 0), bar.maximum()))
+        bar.setFormat(f"{status['name']}: {status['spent']:.0f} из {status['amount']:.0f}")
+        bar.setToolTip(budget_text(status))
+        if status["level"] == BUDGET_OVER:
+            bar.setStyleSheet("QProgressBar::chunk { background-color: darkred; }")
+        elif status["level"] != BUDGET_OK:
+            bar.setStyleSheet("QProgressBar::chunk { background-color: orange; }")
+        else:
+            bar.setStyleSheet("")
+
+    def _mark_absent(self, item):
+        """
+        Серая ячейка дня, когда участника не было в группе.
+        """
+        item.setBackground(QColor("#D0D0D0"))
+        item.setForeground(Qt.GlobalColor.darkGray)
+
+    def pivot_engine(self):
+        """
+        Возвращает сводные таблицы похода; дальше они обновляются вместе с журналом.
+        """
+        if self.pivot is None:
+            self.pivot = LedgerPivot(self.model)
+        return self.pivot
+
+    def attachment_store(self):
+        """
+        Возвращает хранилище чеков рядом с файлом похода или None для несохранённого похода.
+        """
+        filename = getattr(self.parent(), "filename", None)
+        return AttachmentStore(filename) if filename else None
+
+    def _schedule_thumbnails(self, *args):
+        """
+        Откладывает обновление миниатюр до конца обработки событий (одно на пакет изменений).
+        """
+        if self.thumbnails is not None and not self._thumbnails_scheduled:
+            self._thumbnails_scheduled = True
+            QTimer.singleShot(0, self.load_visible_thumbnails)
+
+    def load_visible_thumbnails(self):
+        """
+        Запрашивает миниатюры чеков только для ячеек, видимых в таблице.
+        """
+        self._thumbnails_scheduled = False
+        store = self.attachment_store()
+        if self.thumbnails is None or store is None:
+            return
+        viewport = self.table.viewport()
+        top = max(self.table.rowAt(0), 0)
+        bottom = self.table.rowAt(viewport.height() - 1)
+        left = max(self.table.columnAt(0), 1)
+        right = self.table.columnAt(viewport.width() - 1)
+        bottom = min(self.days, self.model.days) - 1 if bottom < 0 else min(bottom, self.model.days - 1)
+        right = self.table.columnCount() - 1 if right < 0 else right
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                receipts = entry_receipts(self.journal.cell_entries(row, col - 1))
+                if not receipts:
+                    continue
+                pixmap = self.thumbnails.thumbnail(store, receipts[0])
+                if pixmap is None:
+                    self._thumbnail_cells.setdefault(receipts[0], set()).add((row, col))
+                else:
+                    self._set_cell_thumbnail(row, col, pixmap, len(receipts))
+
+    def _on_thumbnail_ready(self, digest):
+        store = self.attachment_store()
+        for row, col in self._thumbnail_cells.pop(digest, ()):
+            pixmap = self.thumbnails.thumbnail(store, digest) if store else None
+            if pixmap is not None:
+                receipts = entry_receipts(self.journal.cell_entries(row, col - 1))
+                self._set_cell_thumbnail(row, col, pixmap, len(receipts))
+
+    def _set_cell_thumbnail(self, row, col, pixmap, count):
+        item = self.table.item(row, col)
+        if item is not None:
+            item.setIcon(QIcon(pixmap))
+            item.setToolTip(self._cell_tooltip(row, col - 1))
+
+    def _cell_tooltip(self, row, participant_idx):
+        """
+        Возвращает подсказку ячейки: записи с заметками и число прикреплённых чеков.
+        """
+        entries = self.journal.cell_entries(row, participant_idx)
+        lines = [f"{entry_text(entry)}: {entry['note']}" for entry in entries if entry.get("note")]
+        if not self.model.is_present(participant_idx, row):
+            lines.insert(0, "Не в походе")
+        receipts = entry_receipts(entries)
+        if receipts:
+            lines.append(f"Чеков: {len(receipts)}")
+        return "\n".join(lines)
+
+    def _on_model_event(self, event):
+        """
+        Обновляет только затронутые ячейки таблицы по событию модели.
+        """
+        if event["type"] in ("entry_added", "entry_removed"):
+            row, participant_idx = event["day"], event["participant"]
+            text = self.hike_data['expenses_data'][row][participant_idx]
+            item = self.table.item(row, participant_idx + 1)
+            # В пакете много записей одной ячейки: текст уже итоговый, повторно не ставим
+            if row < self.days and (item is None or item.text() != text):
+                self._set_cell_text(row, participant_idx + 1, text)
+                self.table.item(row, participant_idx + 1).setToolTip(self._cell_tooltip(row, participant_idx))
+                self._schedule_thumbnails()
+            # Общая запись меняет балансы всех, между кем делится
+            if event.get("split") and not self._warnings_scheduled:
+                self._warnings_scheduled = True
+                QTimer.singleShot(0, self._update_warnings)
+        elif event["type"] == "total_changed":
+            self._set_total(event["participant"] + 1, event["total"])
+        elif event["type"] == "threshold_crossed":
+            self._update_warnings()
+        elif event["type"] == "forecast_changed":
+            # С началом нового дня меняются прогнозы всех участников:
+            # итоги с планами пополнений и предупреждения обновляются один раз
+            if not self._forecast_columns:
+                QTimer.singleShot(0, self._update_forecast_totals)
+            self._forecast_columns.add(event["participant"] + 1)
+            if not self._warnings_scheduled:
+                self._warnings_scheduled = True
+                QTimer.singleShot(0, self._update_warnings)
+        elif event["type"] == "budget_changed":
+            if event["budget"] < len(self.budget_bars):
+                self._set_budget_bar(event["budget"])
+            if event["level_changed"] and not self._warnings_scheduled:
+                self._warnings_scheduled = True
+                QTimer.singleShot(0, self._update_warnings)
+        elif event["type"] == "presence_changed":
+            participant_idx = event["participant"]
+            for row in range(min(self.days, self.model.days)):
+                self._set_cell_text(row, participant_idx + 1, self.hike_data['expenses_data'][row][participant_idx])
+                item = self.table.item(row, participant_idx + 1)
+                item.setToolTip(self._cell_tooltip(row, participant_idx))
+            self._schedule_thumbnails()
+            if self.model.splits.shared and not self._warnings_scheduled:
+                self._warnings_scheduled = True
+                QTimer.singleShot(0, self._update_warnings)
+
+    def _set_cell_text(self, row, col, text):
         """
         Вспомогательный метод для обновления ячейки таблицы.
         """
-        cell = self.table.item(row, col)
-        current_text = cell.text().strip() if cell and cell.text().strip() != "0" else ""
-        entries = [s.strip() for s in current_text.split(";")] if current_text else []
-        new_entry = f"{category} {sign}{round(amount)}"
-        entries.append(new_entry)
-        cell_item = QTableWidgetItem("; ".join(entries))
+        cell_item = QTableWidgetItem(text)
         cell_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
         self.table.setItem(row, col, cell_item)
+        if not self.model.is_present(col - 1, row):
+            self._mark_absent(cell_item)
 
-    def recalculate_totals(self):
-        num_cols = self.table.columnCount()
-        participant_totals = self.initial_payments.copy()
-        warning_messages = []
+    def _update_forecast_totals(self):
+        columns, self._forecast_columns = self._forecast_columns, set()
+        for col in sorted(columns):
+            if col < self.table.columnCount():
+                self._set_total(col, self.model.total(col - 1))
+
+    def _set_total(self, col, total):
+        """
+        Обновляет ячейку строки "Итого" с подсветкой остатка участника.
+        """
+        total_item = QTableWidgetItem(str(round(total)))
+        total_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        total_item.setData(Qt.ItemDataRole.UserRole, total)
+        total_item.setFlags(total_item.flags() & ~Qt.ItemFlag.ItemIsEditable)  # Make read-only
+        font = total_item.font()
+        font.setBold(True)
+        total_item.setFont(font)
+        
+        # Прогноз расхода - в подсказке итога
+        forecast = self.model.forecast.forecast(col - 1)
+        tooltip = forecast_text(forecast)
+        if not self.model.is_pool(col - 1):
+            tooltip += "\n" + plan_text(self.topups.plan(col - 1))
+        total_item.setToolTip(tooltip)
+        # Столбцы фондов не подсвечиваются
+        if not self.model.is_pool(col - 1):
+            if total < NEGATIVE_BALANCE_THRESHOLD:
+                total_item.setBackground(Qt.GlobalColor.darkRed)
+                total_item.setForeground(Qt.GlobalColor.white)  # White text for dark red background
+            elif total < LOW_BALANCE_THRESHOLD:
+                total_item.setBackground(Qt.GlobalColor.yellow)
+                total_item.setForeground(Qt.GlobalColor.black)  # Black text for yellow background
+            elif forecast["dry_day"] is not None:
+                # Пока хватает, но при нынешнем расходе деньги кончатся до конца похода
+                total_item.setBackground(QColor("#FFD8A8"))
+                total_item.setForeground(Qt.GlobalColor.black)
         
+        self.table.setItem(self.days, col, total_item)
+
+    def _update_warnings(self):
+        """
+        Перестраивает предупреждения об отрицательном остатке участников,
+        о деньгах, которых по прогнозу не хватит до конца похода, и о бюджетах на исходе.
+        """
+        self._warnings_scheduled = False
         # Remove any existing warning labels
         for i in reversed(range(self.main_layout.count())):
             widget = self.main_layout.itemAt(i).widget()
             if isinstance(widget, QLabel) and widget.property("warning"):
                 widget.deleteLater()
-        
-        for col in range(1, num_cols - 1):
-            for row in range(self.days):
-                cell_item = self.table.item(row, col)
-                if cell_item:
-                    text = cell_item.text().strip()
-                    if text != "0" and text:
-                        entries = [e.strip() for e in text.split(";") if e.strip()]
-                        for entry in entries:
-                            parts = entry.split()
-                            if len(parts) == 2:
-                                try:
-                                    value = float(parts[1])
-                                    participant_totals[col-1] += value
-                                except ValueError:
-                                    pass
-
-        # Update totals row with modified coloring scheme
-        for col in range(1, num_cols - 1):
-            total = participant_totals[col-1]
-            formatted_total = str(round(total))
-            total_item = QTableWidgetItem(formatted_total)
-            total_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-            total_item.setData(Qt.ItemDataRole.UserRole, total)
-            total_item.setFlags(total_item.flags() & ~Qt.ItemFlag.ItemIsEditable)  # Make read-only
-            
-            if total < 0:
-                total_item.setBackground(Qt.GlobalColor.darkRed)
-                total_item.setForeground(Qt.GlobalColor.white)  # White text for dark red background
-                participant_name = self.table.horizontalHeaderItem(col).text()
-                warning_messages.append(f"Участник {participant_name}: Внесите деньги!")
-            elif total < 1000:
-                total_item.setBackground(Qt.GlobalColor.yellow)
-                total_item.setForeground(Qt.GlobalColor.black)  # Black text for yellow background
-            
-            self.table.setItem(self.days, col, total_item)
 
-        # Make "Общак" total cell read-only too
-        common_total = sum(participant_totals)
-        common_total_item = QTableWidgetItem(str(round(common_total)))
-        common_total_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-        common_total_item.setData(Qt.ItemDataRole.UserRole, common_total)
-        common_total_item.setFlags(common_total_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-        self.table.setItem(self.days, num_cols - 1, common_total_item)
+        warning_messages = []
+        for row in self.model.statistics():
+            if row["balance"] < NEGATIVE_BALANCE_THRESHOLD:
+                warning_messages.append(f"Участник {row['name']}: Внесите деньги!")
+                continue
+            forecast = self.model.forecast.forecast(row["index"])
+            if forecast["dry_day"] is not None:
+                warning_messages.append(f"Участник {row['name']}: деньги кончатся на {forecast['dry_day'] + 1}-й день, "
+                                        f"пополните на {forecast['topup']}")
+        for status in self.model.budgets.statuses():
+            if status["level"] != BUDGET_OK:
+                warning_messages.append(budget_text(status))
 
         # Display warning messages if any
         if warning_messages:
@@ -311,6 +716,15 @@ class MainWorksWidget(QWidget):
             warning_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
             self.main_layout.addWidget(warning_label)
 
+    def recalculate_totals(self):
+        """
+        Заполняет строку "Итого" остатками из модели (без разбора текста ячеек).
+        """
+        for col, total in enumerate(self.model.totals(), start=1):
+            if col < self.table.columnCount():
+                self._set_total(col, total)
+        self._update_warnings()
+
     def mark_as_modified(self):
         """
         Помечает документ как измененный и обновляет заголовок окна.
@@ -318,25 +732,31 @@ class MainWorksWidget(QWidget):
         """
         if not self.has_unsaved_changes:
             self.has_unsaved_changes = True
-            current_title = self.parent().windowTitle()
+            window = self.window()
+            current_title = window.windowTitle()
             if not current_title.endswith('*'):
-                self.parent().setWindowTitle(f"{current_title}*")
+                window.setWindowTitle(f"{current_title}*")
             
             # Enable save actions in parent window
-            if hasattr(self.parent(), "save_action"):
-                self.parent().save_action.setEnabled(True)
-            if hasattr(self.parent(), "save_as_action"):
-                self.parent().save_as_action.setEnabled(True)
+            if hasattr(window, "save_action"):
+                window.save_action.setEnabled(True)
+            if hasattr(window, "save_as_action"):
+                window.save_as_action.setEnabled(True)
+            if hasattr(window, "on_hike_modified"):
+                window.on_hike_modified(self)
 
     def mark_as_saved(self):
         """
         Помечает документ как сохраненный и обновляет заголовок окна.
         """
         self.has_unsaved_changes = False
-        current_title = self.parent().windowTitle()
+        window = self.window()
+        current_title = window.windowTitle()
         if current_title.endswith('*'):
-            self.parent().setWindowTitle(current_title[:-1])
-            self.parent().save_action.setEnabled(False)
+            window.setWindowTitle(current_title[:-1])
+            window.save_action.setEnabled(False)
+        if hasattr(window, "on_hike_modified"):
+            window.on_hike_modified(self)
 
     def finish_trek(self):
         """
@@ -345,25 +765,14 @@ class MainWorksWidget(QWidget):
         """
         # Remove spaces from numbers before showing statistics
         num_cols = self.table.columnCount()
-        for row in range(self.days + 1):  # Include "Итого" row
+        for row in range(self.days):
             for col in range(1, num_cols):  # Skip date column
                 cell = self.table.item(row, col)
-                if cell:
-                    text = cell.text()
-                    if text != "0":
-                        # Process each entry in the cell
-                        entries = [e.strip() for e in text.split(";") if e.strip()]
-                        formatted_entries = []
-                        for entry in entries:
-                            parts = entry.split()
-                            if len(parts) >= 2:
-                                # Remove spaces from numbers
-                                number = parts[-1].replace(" ", "")
-                                formatted_entry = f"{' '.join(parts[:-1])} {number}"
-                                formatted_entries.append(formatted_entry)
-                        
-                        cell.setText("; ".join(formatted_entries))
-
-        from statistic import StatisticWidget
-        statistic_widget = StatisticWidget(self.hike_data, self.table, self)
-        self.parent().setCentralWidget(statistic_widget)
\ No newline at end of file
+                if cell and cell.text() != "0":
+                    cell.setText(normalize_cell(cell.text()))
+
+        statistic_widget = StatisticWidget(self.hike_data, self.table, self.parent(), self.model)
+        if hasattr(self.parent(), "set_view"):
+            self.parent().set_view(statistic_widget)
+        else:
+            self.window().setCentralWidget(statistic_widget)
\ No newline at end of file
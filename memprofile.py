@@ -0,0 +1,181 @@
+import sys, copy, json, argparse, tracemalloc
+from hikeutil import make_synthetic_hike
+
+# Примерный размер QTableWidgetItem в куче C++ без учёта текста (байт).
+# Память Qt не видна tracemalloc, поэтому для ячеек таблиц используется оценка.
+QT_ITEM_OVERHEAD = 96
+
+# Размеры синтетических походов для бенчмарка: (участники, дни, записей в ячейке)
+BENCHMARK_SIZES = [
+    (5, 10, 2),
+    (10, 20, 3),
+    (30, 30, 4),
+    (100, 30, 4),
+    (300, 30, 4),
+]
+
+
+def measure_allocation(factory):
+    """
+    Выполняет factory() под tracemalloc и возвращает (результат, прирост памяти, пик).
+    Если трассировка не была запущена, запускает её на время замера.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        result = factory()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+    return result, max(after - before, 0), max(peak - before, 0)
+
+
+def table_items_size(table):
+    """
+    Оценивает память, занятую ячейками QTableWidget.
+    Текст хранится в QString (UTF-16), к нему добавляется накладной расход на элемент.
+    """
+    if table is None:
+        return 0
+    size = 0
+    for row in range(table.rowCount()):
+        for col in range(table.columnCount()):
+            item = table.item(row, col)
+            if item:
+                size += QT_ITEM_OVERHEAD + 2 * len(item.text())
+    return size
+
+
+def profile_hike(works_widget, statistic_widget=None):
+    """
+    Возвращает словарь "подсистема -> байты" для открытого похода.
+
+    ledger - данные похода (hike_data), замер через tracemalloc по полной копии;
+    grid - ячейки таблицы MainWorksWidget (оценка);
+    stats - копия таблицы в StatisticWidget после finish_trek (оценка).
+    """
+    _, ledger_bytes, _ = measure_allocation(lambda: copy.deepcopy(works_widget.hike_data))
+
+    stats_table = getattr(statistic_widget, 'table', None) if statistic_widget else None
+    return {
+        "ledger": ledger_bytes,
+        "grid": table_items_size(getattr(works_widget, 'table', None)),
+        "stats": table_items_size(stats_table),
+    }
+
+
+def format_bytes(value):
+    """
+    Форматирует количество байт в удобочитаемый вид (Б, КБ, МБ).
+    """
+    if value < 1024:
+        return f"{value} Б"
+    if value < 1024 * 1024:
+        return f"{value / 1024:.1f} КБ"
+    return f"{value / (1024 * 1024):.2f} МБ"
+
+
+def format_report(report):
+    """
+    Формирует текстовый отчёт по подсистемам для окна диагностики.
+    Если tracemalloc запущен в режиме диагностики, добавляет текущую и пиковую память процесса.
+    """
+    titles = {
+        "ledger": "Данные похода",
+        "grid": "Ячейки таблицы (оценка)",
+        "stats": "Копия статистики (оценка)",
+        "cache": "Кэш неактивных походов",
+    }
+    lines = [f"{titles.get(key, key)}: {format_bytes(value)}" for key, value in report.items()]
+    lines.append(f"Всего: {format_bytes(sum(report.values()))}")
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        lines.append("")
+        lines.append(f"Python, текущая: {format_bytes(current)}")
+        lines.append(f"Python, пиковая: {format_bytes(peak)}")
+    return "\n".join(lines)
+
+
+def _create_offscreen_app():
+    """
+    Пытается создать QApplication без окна для замера виджетов.
+    Возвращает None, если PyQt6 недоступен.
+    """
+    try:
+        import os
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt6.QtWidgets import QApplication
+    except ImportError:
+        return None
+    return QApplication.instance() or QApplication(sys.argv[:1])
+
+
+def run_benchmark(sizes=BENCHMARK_SIZES, with_widgets=True):
+    """
+    Замеряет пиковую память в зависимости от размера похода.
+    Для каждого размера измеряет разбор JSON (как при открытии файла) и,
+    если доступен PyQt6, построение MainWorksWidget.
+    Возвращает список словарей с результатами.
+    """
+    app = _create_offscreen_app() if with_widgets else None
+    results = []
+    for num_participants, num_days, entries_per_cell in sizes:
+        raw = json.dumps(make_synthetic_hike(num_participants, num_days, entries_per_cell),
+                         ensure_ascii=False, indent=4)
+        hike_data, ledger_bytes, parse_peak = measure_allocation(lambda: json.loads(raw))
+        row = {
+            "participants": num_participants,
+            "days": num_days,
+            "entries": num_participants * num_days * entries_per_cell,
+            "file": len(raw.encode("utf-8")),
+            "ledger": ledger_bytes,
+            "parse_peak": parse_peak,
+            "widget_peak": None,
+            "grid": None,
+        }
+        if app is not None:
+            from mainworks import MainWorksWidget
+            widget, _, widget_peak = measure_allocation(lambda: MainWorksWidget(hike_data))
+            row["widget_peak"] = widget_peak
+            row["grid"] = table_items_size(widget.table)
+            widget.deleteLater()
+            app.processEvents()
+        results.append(row)
+    return results
+
+
+def main(argv=None):
+    """
+    Точка входа бенчмарка памяти: python memprofile.py [--budget-mb N] [--no-widgets].
+    Возвращает код 1, если пиковая память превысила бюджет.
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк памяти по размеру похода")
+    parser.add_argument("--budget-mb", type=float, default=None,
+                        help="бюджет пиковой памяти на один поход, МБ")
+    parser.add_argument("--no-widgets", action="store_true",
+                        help="не строить виджеты (только данные похода)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(with_widgets=not args.no_widgets)
+    print(f"{'участн.':>8} {'дней':>5} {'записей':>8} {'файл':>10} {'данные':>10} "
+          f"{'пик разбора':>12} {'пик виджета':>12} {'ячейки':>10}")
+    over_budget = False
+    for row in results:
+        widget_peak = format_bytes(row["widget_peak"]) if row["widget_peak"] is not None else "-"
+        grid = format_bytes(row["grid"]) if row["grid"] is not None else "-"
+        print(f"{row['participants']:>8} {row['days']:>5} {row['entries']:>8} "
+              f"{format_bytes(row['file']):>10} {format_bytes(row['ledger']):>10} "
+              f"{format_bytes(row['parse_peak']):>12} {widget_peak:>12} {grid:>10}")
+        peak = max(row["parse_peak"], row["widget_peak"] or 0)
+        if args.budget_mb is not None and peak > args.budget_mb * 1024 * 1024:
+            over_budget = True
+            print(f"  превышен бюджет {args.budget_mb} МБ")
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,308 @@
+import os, sys, json, time, shutil, argparse, datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from journal import ExpenseJournal
+from hikemodel import POOL_NAME
+from cellparser import parse_amount, parse_cell, normalize_cell
+from hikefile import REQUIRED_FIELDS, write_hike
+
+# Версия схемы файла похода, к которой приводит миграция:
+# 1 - файлы до появления журнала (версия не записана), 2 - журнал и согласованные ячейки
+HIKE_SCHEMA_VERSION = 2
+# Файл контрольной точки в корне обрабатываемой папки
+CHECKPOINT_FILE = ".migrate_checkpoint.json"
+# Как часто записывать контрольную точку (обработанных файлов)
+CHECKPOINT_EVERY = 20
+
+# Статусы обработки файла
+STATUS_OK = "ok"
+STATUS_REPAIRED = "repaired"
+STATUS_SKIPPED = "skipped"
+STATUS_ERROR = "error"
+
+
+def _is_empty(text):
+    text = str(text).strip()
+    return not text or text == "0"
+
+
+def _plain_number(text):
+    """
+    Возвращает число, если ячейка содержит только число ("-1500.0"), иначе None.
+    Такие ячейки писал старый edit_expense вместо текста записей.
+    """
+    entries = parse_cell(text)
+    if len(entries) == 1 and entries[0][0] == "" and entries[0][1] is not None:
+        return entries[0][1]
+    return None
+
+
+def _fix_participants(hike_data, issues):
+    for participant in hike_data['participants']:
+        if not isinstance(participant.get('payment'), (int, float)):
+            try:
+                participant['payment'] = parse_amount(participant.get('payment', 0))
+            except ValueError:
+                participant['payment'] = 0
+            issues.append(f"взнос участника {participant.get('name')} приведён к числу")
+
+
+def _fix_width(hike_data, issues):
+    """
+    Приводит ширину строк expenses_data к числу участников без потери записей.
+    Лишние столбцы с записями становятся участниками "Без имени N" перед общаком.
+    """
+    participants = hike_data['participants']
+    expenses_data = hike_data['expenses_data']
+    width = len(participants)
+    extra = max((len(row) for row in expenses_data), default=width) - width
+    if extra > 0:
+        used = [col for col in range(width, width + extra)
+                if any(col < len(row) and not _is_empty(row[col]) for row in expenses_data)]
+        if used:
+            keep = list(range(width, used[-1] + 1))
+            pool = width - 1 if participants and participants[-1]['name'] == POOL_NAME else None
+            order = [col for col in range(width) if col != pool] + keep + ([pool] if pool is not None else [])
+            names = [{"name": f"Без имени {n + 1}", "payment": 0} for n in range(len(keep))]
+            if pool is not None:
+                hike_data['participants'] = participants[:pool] + names + [participants[pool]]
+            else:
+                hike_data['participants'] = participants + names
+            for day, row in enumerate(expenses_data):
+                row += ["0"] * (len(order) - len(row))
+                expenses_data[day] = [row[col] for col in order]
+            remap = {old: new for new, old in enumerate(order)}
+            moved = [entry for entry in hike_data.get('journal', []) if remap.get(entry['participant']) not in
+                     (None, entry['participant'])]
+            before = [dict(entry) for entry in moved]
+            for entry in moved:
+                entry['participant'] = remap[entry['participant']]
+            if moved and 'audit' in hike_data:
+                # Перенос записей - тоже правка: отражаем её в журнале аудита
+                from audit import AuditLog
+                AuditLog(hike_data).on_journal_changed(moved, before)
+            issues.append(f"записи из {len(keep)} лишних столбцов перенесены участникам 'Без имени'")
+            width = len(hike_data['participants'])
+    for day, row in enumerate(expenses_data):
+        if len(row) != width:
+            expenses_data[day] = (row + ["0"] * width)[:width]
+            if len(row) < width:
+                issues.append(f"день {day + 1}: строка дополнена до {width} участников")
+            else:
+                issues.append(f"день {day + 1}: удалены пустые лишние столбцы")
+
+
+def _fix_days(hike_data, issues):
+    """
+    Приводит число строк expenses_data к track_days. Лишние дни с записями сохраняются:
+    продлевается track_days (и дата окончания, если она раньше).
+    """
+    expenses_data = hike_data['expenses_data']
+    width = len(hike_data['participants'])
+    days = hike_data['track_days']
+    trimmed = 0
+    while len(expenses_data) > days and all(_is_empty(text) for text in expenses_data[-1]):
+        expenses_data.pop()
+        trimmed += 1
+    if trimmed:
+        issues.append(f"удалено пустых лишних дней: {trimmed}")
+    if len(expenses_data) > days:
+        issues.append(f"track_days увеличен с {days} до {len(expenses_data)}: в лишних днях есть записи")
+        days = hike_data['track_days'] = len(expenses_data)
+        try:
+            start = datetime.date.fromisoformat(hike_data['start_date'])
+            end = datetime.date.fromisoformat(hike_data['end_date'])
+            # Дата окончания включительно: поход из days дней кончается на days - 1 день позже начала
+            if (end - start).days + 1 < days:
+                hike_data['end_date'] = (start + datetime.timedelta(days=days - 1)).isoformat()
+        except ValueError:
+            pass
+    if len(expenses_data) < days:
+        issues.append(f"добавлено пустых дней: {days - len(expenses_data)}")
+        expenses_data.extend(["0"] * width for _ in range(days - len(expenses_data)))
+
+
+def repair_hike(hike_data):
+    """
+    Проверяет и исправляет данные похода, приводя их к схеме HIKE_SCHEMA_VERSION.
+    Изменяет hike_data на месте и возвращает список описаний исправлений
+    (пустой, если данные уже согласованы). Записи не теряются.
+    """
+    issues = []
+    if not isinstance(hike_data.get('track_days'), int):
+        hike_data['track_days'] = int(hike_data.get('track_days') or 0)
+        issues.append("track_days приведён к целому числу")
+    if not isinstance(hike_data.get('expenses_data'), list):
+        hike_data['expenses_data'] = []
+    hike_data['expenses_data'] = [list(row) if isinstance(row, list) else [] for row in hike_data['expenses_data']]
+    _fix_participants(hike_data, issues)
+    _fix_width(hike_data, issues)
+    _fix_days(hike_data, issues)
+
+    expenses_data = hike_data['expenses_data']
+    if 'journal' not in hike_data:
+        # Ячейки-числа от старого edit_expense переводим в текст записей
+        converted = 0
+        for row in expenses_data:
+            for idx, text in enumerate(row):
+                if _plain_number(text) is not None:
+                    row[idx] = normalize_cell(text)
+                    converted += 1
+                elif not isinstance(text, str):
+                    row[idx] = str(text)
+        if converted:
+            issues.append(f"ячеек-чисел переведено в текст записей: {converted}")
+        issues.append("создан журнал записей")
+
+    journal = ExpenseJournal(hike_data)
+    outside = [entry for entry in journal.entries
+               if not (0 <= entry['day'] < hike_data['track_days'] and
+                       0 <= entry['participant'] < len(hike_data['participants']))]
+    if outside:
+        issues.append(f"записей вне дней или участников похода: {len(outside)} (оставлены в журнале)")
+    mismatched = 0
+    for day, row in enumerate(expenses_data):
+        for idx in range(len(row)):
+            text = journal.cell_text(day, idx)
+            if row[idx] != text:
+                row[idx] = text
+                mismatched += 1
+    if mismatched:
+        issues.append(f"текст ячеек восстановлен из журнала: {mismatched}")
+
+    if hike_data.get('schema_version') != HIKE_SCHEMA_VERSION:
+        issues.append(f"версия схемы: {hike_data.get('schema_version', 1)} -> {HIKE_SCHEMA_VERSION}")
+        hike_data['schema_version'] = HIKE_SCHEMA_VERSION
+    return issues
+
+
+def migrate_file(path, dry_run=False, backup=True):
+    """
+    Проверяет и при необходимости исправляет один файл похода.
+    Выполняется в процессе пула. Возвращает отчёт по файлу.
+    """
+    report = {"path": path, "issues": []}
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            hike_data = json.load(file)
+        if not isinstance(hike_data, dict) or not all(field in hike_data for field in REQUIRED_FIELDS):
+            report["status"] = STATUS_SKIPPED
+            report["issues"] = ["не файл похода"]
+            return report
+        report["issues"] = repair_hike(hike_data)
+        if report["issues"] and not dry_run:
+            if backup:
+                shutil.copy2(path, path + ".bak")
+            write_hike(path, hike_data)
+        report["status"] = STATUS_REPAIRED if report["issues"] else STATUS_OK
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        report["status"] = STATUS_ERROR
+        report["issues"] = [str(e)]
+    return report
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def find_hike_files(directory):
+    """
+    Возвращает файлы .json в дереве папок (служебные папки и вложения пропускаются).
+    """
+    result = []
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if not name.startswith(".") and not name.endswith(".files"))
+        result.extend(os.path.join(root, name) for name in sorted(names)
+                      if name.endswith(".json") and name != CHECKPOINT_FILE)
+    return result
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(checkpoint, file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def migrate_directory(directory, workers=None, dry_run=False, backup=True, checkpoint_path=None,
+                      on_report=None):
+    """
+    Обрабатывает все файлы походов в дереве папок в пуле процессов.
+
+    Прогресс сохраняется в контрольной точке: при повторном запуске файлы,
+    которые уже обработаны и с тех пор не менялись, пропускаются.
+    Возвращает список отчётов по файлам, обработанным в этом запуске.
+    """
+    directory = os.path.abspath(directory)
+    checkpoint_path = checkpoint_path or os.path.join(directory, CHECKPOINT_FILE)
+    checkpoint = {} if dry_run else load_checkpoint(checkpoint_path)
+    pending = []
+    for path in find_hike_files(directory):
+        done = checkpoint.get(path)
+        if done and done.get("signature") == _signature(path) and done.get("status") != STATUS_ERROR:
+            continue
+        pending.append(path)
+
+    reports = []
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(migrate_file, path, dry_run, backup) for path in pending]
+        for number, future in enumerate(as_completed(futures), start=1):
+            report = future.result()
+            reports.append(report)
+            if on_report is not None:
+                on_report(report)
+            if dry_run:
+                continue
+            try:
+                signature = _signature(report["path"])
+            except OSError:
+                continue
+            checkpoint[report["path"]] = {"status": report["status"], "signature": signature}
+            if number % CHECKPOINT_EVERY == 0:
+                save_checkpoint(checkpoint_path, checkpoint)
+    if not dry_run:
+        save_checkpoint(checkpoint_path, checkpoint)
+    return reports
+
+
+def format_report(report, directory):
+    titles = {STATUS_OK: "OK", STATUS_REPAIRED: "исправлен", STATUS_SKIPPED: "пропущен", STATUS_ERROR: "ОШИБКА"}
+    lines = [f"{os.path.relpath(report['path'], directory)}: {titles[report['status']]}"]
+    lines.extend(f"    - {issue}" for issue in report["issues"] if report["status"] != STATUS_SKIPPED)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """
+    Миграция архива походов: python migrate.py папка [--workers N] [--dry-run] [--no-backup]
+    """
+    parser = argparse.ArgumentParser(description="Проверка и исправление файлов походов")
+    parser.add_argument("folder")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию - все ядра)")
+    parser.add_argument("--dry-run", action="store_true", help="только отчёт, без записи файлов")
+    parser.add_argument("--no-backup", action="store_true", help="не сохранять копии .bak")
+    parser.add_argument("--checkpoint", help="файл контрольной точки")
+    args = parser.parse_args(argv)
+
+    directory = os.path.abspath(args.folder)
+    started = time.perf_counter()
+    reports = migrate_directory(directory, args.workers, args.dry_run, not args.no_backup, args.checkpoint,
+                                on_report=lambda report: print(format_report(report, directory), flush=True))
+    counts = {}
+    for report in reports:
+        counts[report["status"]] = counts.get(report["status"], 0) + 1
+    print(f"Файлов: {len(reports)}, исправлено: {counts.get(STATUS_REPAIRED, 0)}, "
+          f"ошибок: {counts.get(STATUS_ERROR, 0)}, за {time.perf_counter() - started:.1f} с")
+    return 1 if counts.get(STATUS_ERROR) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,33 @@
-import sys, os, json, configparser
+import sys, os, json, configparser, tracemalloc
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
                            QListWidget, QFileDialog, QMessageBox, QLabel, QMenuBar, QMenu)
 from PyQt6.QtGui import QIcon, QPixmap, QDesktopServices
 from PyQt6.QtCore import Qt, QUrl
 from addexpedition import AddExpeditionWidget
 from mainworks import MainWorksWidget
+from statistic import StatisticWidget
+from workspace import HikeWorkspace
+from hikecache import DEFAULT_CACHE_BUDGET_MB
+from filecache import ParsedFileCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB
+from filewatch import format_lock_owner
+from sync import FolderTransport, SYNC_ID_FIELD, new_device_id
+from journal import TOMBSTONES_FIELD
+from attachments import AttachmentStore, entry_receipts
+from thumbnails import ThumbnailLoader
+from search import ArchiveSearchIndex
+from migrate import HIKE_SCHEMA_VERSION
+from hikefile import write_hike
+from audit import remember_verified, verify_directory
+from hikediff import diff_hikes, merge_hikes, format_diff, format_conflicts
+from searchdialog import SearchDialog
+from pivot import ArchivePivot
+from directory import ParticipantDirectory
+from planner import BudgetPlanner
+from topups import POINTS_FIELD
+from budgets import BUDGETS_FIELD
+from pivotdialog import PivotDialog
+from ingest import IngestQueue, read_items, summarize, ACCEPTED, DUPLICATE, REJECTED
+import memprofile
 
 class IOExpedition:
     def __init__(self):
@@ -154,21 +177,16 @@ class IOExpedition:
                 "expenses_data": expenses_data
             }
         elif hasattr(self, 'create_hike_widget'):
-            num_participants = self.create_hike_widget.participant_fields.count()
+            participants = [{key: value for key, value in participant.items() if key != "team"}
+                            for participant in self.create_hike_widget.get_participants()]
             num_days = self.create_hike_widget.track_days.value()
             
             # Create initial expenses array filled with zeros
-            expenses_data = [["0"] * num_participants for _ in range(num_days)]
+            expenses_data = [["0"] * len(participants) for _ in range(num_days)]
             
             return {
                 "hike_name": self.create_hike_widget.hike_name.currentText(),
-                "participants": [
-                    {
-                        "name": self.create_hike_widget.participant_fields.itemAt(i).layout().itemAt(0).widget().text() or f"Участник {i + 1}",
-                        "payment": self.create_hike_widget.participant_fields.itemAt(i).layout().itemAt(1).widget().value()
-                    }
-                    for i in range(num_participants)
-                ],
+                "participants": participants,
                 "start_date": self.create_hike_widget.start_date.date().toString(Qt.DateFormat.ISODate),
                 "end_date": self.create_hike_widget.end_date.date().toString(Qt.DateFormat.ISODate),
                 "track_days": num_days,
@@ -259,8 +277,8 @@ class IOExpedition:
         try:
             hike_data = self.get_hike_data()
             if hike_data:
-                with open(self.current_file, 'w', encoding='utf-8') as file:
-                    json.dump(hike_data, file, ensure_ascii=False, indent=4)
+                # Атомарная запись: другие гиды не прочитают файл наполовину записанным
+                write_hike(self.current_file, hike_data)
                 
                 if hasattr(self, 'main_works_widget'):
                     self.main_works_widget.mark_as_saved()
@@ -321,8 +339,7 @@ class IOExpedition:
         """
         filename = self.get_unique_filename(hike_name + ".json")  # Добавляем расширение .json
 
-        with open(filename, 'w', encoding='utf-8') as file:
-            json.dump(hike_data, file, ensure_ascii=False, indent=4)
+        write_hike(filename, hike_data)
         self.current_file = filename
         self.save_action.setEnabled(True)
         self.save_as_action.setEnabled(True)
@@ -414,7 +431,7 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Калькулятор экспедиции")
         self.setGeometry(100, 100, 800, 600)
         self.setWindowIcon(QIcon("icon.png"))
-        self.current_file = None
+        self.workspace = None
         self.settings = configparser.ConfigParser()
         
         # Проверка наличия файла init.ini, если отсутствует, создаётся дефолтный
@@ -423,6 +440,20 @@ class MainWindow(QMainWindow):
         
         self.settings.read('init.ini', encoding='utf-8')
         self.recent_files = self.get_recent_files()
+        self.device_id = self.get_device_id()
+        self.sync_transports = {}
+        self.thumbnails = ThumbnailLoader(parent=self)
+        self.archive_index = None
+        self.search_dialog = None
+        self.archive_pivot = None
+        self.pivot_dialog = None
+        self.participant_directory = None
+        self.budget_planner = None
+        if 'Search' not in self.settings:
+            self.settings['Search'] = {}
+        self.file_cache = ParsedFileCache(
+            self.settings.get('Cache', 'dir', fallback=DEFAULT_CACHE_DIR),
+            int(self.settings.getfloat('Cache', 'max_mb', fallback=DEFAULT_CACHE_MAX_MB) * 1024 * 1024))
         self.init_ui()
 
     def create_default_ini(self):
@@ -462,6 +493,22 @@ class MainWindow(QMainWindow):
         self.save_as_action.triggered.connect(self.save_hike_as)
         self.save_as_action.setEnabled(False)
         
+        self.sync_action = file_menu.addAction('Синхронизация через папку...')
+        self.sync_action.triggered.connect(self.sync_hike_folder)
+        self.sync_action.setEnabled(False)
+        
+        self.import_entries_action = file_menu.addAction('Импорт записей...')
+        self.import_entries_action.triggered.connect(self.import_entries)
+        self.import_entries_action.setEnabled(False)
+        
+        self.compare_action = file_menu.addAction('Сравнить с файлом...')
+        self.compare_action.triggered.connect(self.compare_with_file)
+        self.compare_action.setEnabled(False)
+        
+        self.merge_action = file_menu.addAction('Объединить с файлом...')
+        self.merge_action.triggered.connect(self.merge_with_file)
+        self.merge_action.setEnabled(False)
+        
         self.close_action = file_menu.addAction('Закрыть')
         self.close_action.triggered.connect(self.close_hike)
         self.close_action.setEnabled(False)
@@ -489,6 +536,19 @@ class MainWindow(QMainWindow):
         self.stats_trek_action.triggered.connect(self.show_trek_stats)
         self.stats_trek_action.setEnabled(False)  # Initially disabled
 
+        self.memory_report_action = view_menu.addAction('Диагностика памяти')
+        self.memory_report_action.triggered.connect(self.show_memory_report)
+        self.memory_report_action.setEnabled(False)  # Initially disabled
+
+        search_action = view_menu.addAction('Поиск записей...')
+        search_action.triggered.connect(self.show_search_dialog)
+
+        pivot_action = view_menu.addAction('Сводная таблица...')
+        pivot_action.triggered.connect(self.show_pivot_dialog)
+
+        audit_action = view_menu.addAction('Проверка целостности архива...')
+        audit_action.triggered.connect(self.verify_archive)
+
         # Меню "Настройки"
         settings_menu = menubar.addMenu('Настройки')
         settings_action = settings_menu.addAction('Настройки')
@@ -577,9 +637,123 @@ class MainWindow(QMainWindow):
         Отображает экран создания нового похода.
         Создаёт виджет AddExpeditionWidget и устанавливает его как центральный для главного окна.
         """
+        # Сохраняем рабочую область с открытыми походами, чтобы Qt её не удалил
+        if self.workspace is not None and self.centralWidget() is self.workspace:
+            self.takeCentralWidget()
         self.create_hike_widget = AddExpeditionWidget(self)
         self.setCentralWidget(self.create_hike_widget)
 
+    @property
+    def current_file(self):
+        """
+        Путь к файлу активной вкладки или None.
+        """
+        tab = self.workspace.current_tab() if self.workspace else None
+        return tab.filename if tab else None
+
+    @current_file.setter
+    def current_file(self, filename):
+        tab = self.workspace.current_tab() if self.workspace else None
+        if tab:
+            self.workspace.set_tab_file(tab, filename)
+
+    def current_works_widget(self):
+        """
+        Возвращает MainWorksWidget активной вкладки или None.
+        """
+        return self.workspace.current_works_widget() if self.workspace else None
+
+    def show_workspace(self):
+        """
+        Делает рабочую область с вкладками походов центральным виджетом, создавая её при необходимости.
+        Бюджет кэша неактивных походов берётся из init.ini (раздел Workspace, cache_budget_mb).
+        """
+        if self.workspace is None:
+            budget_mb = self.settings.getfloat('Workspace', 'cache_budget_mb',
+                                               fallback=DEFAULT_CACHE_BUDGET_MB)
+            self.workspace = HikeWorkspace(self.load_hike_file, int(budget_mb * 1024 * 1024))
+        if self.centralWidget() is not self.workspace:
+            self.setCentralWidget(self.workspace)
+        return self.workspace
+
+    def restore_workspace(self):
+        """
+        Возвращает на экран открытые вкладки походов, если они есть.
+        Возвращает True, если рабочая область была восстановлена.
+        """
+        if self.workspace is None or self.workspace.count() == 0:
+            return False
+        self.show_workspace()
+        self.on_hike_tab_changed(self.workspace.current_tab())
+        return True
+
+    def on_hike_tab_changed(self, tab):
+        """
+        Обновляет заголовок окна и доступность действий при переключении вкладки похода.
+        """
+        has_tab = tab is not None
+        if has_tab:
+            self.setWindowTitle(f"Калькулятор экспедиции - {tab.title()}")
+        else:
+            self.setWindowTitle("Калькулятор экспедиции")
+        self.save_action.setEnabled(has_tab)
+        self.save_as_action.setEnabled(has_tab)
+        self.close_action.setEnabled(has_tab)
+        self.sync_action.setEnabled(has_tab)
+        self.import_entries_action.setEnabled(has_tab)
+        self.compare_action.setEnabled(has_tab)
+        self.merge_action.setEnabled(has_tab)
+        self.edit_trek_action.setEnabled(has_tab)
+        self.stats_trek_action.setEnabled(has_tab)
+        self.memory_report_action.setEnabled(has_tab)
+
+    def on_hike_modified(self, works_widget):
+        """
+        Переносит признак несохранённых изменений виджета во вкладку и обновляет её заголовок.
+        """
+        tab = works_widget.parent()
+        if self.workspace is not None and self.workspace.indexOf(tab) >= 0:
+            tab.modified = works_widget.has_unsaved_changes
+            self.workspace.update_tab_title(tab)
+
+    def on_external_changes(self, tab, hike_data, changes, conflicts):
+        """
+        Сообщает о применённых внешних изменениях файла похода.
+        Ячейки, изменённые и здесь, и в файле, сохраняют локальный текст; о них выводится предупреждение.
+        """
+        if changes:
+            self.statusBar().showMessage(
+                f"{tab.title()}: файл изменён извне, обновлено ячеек: {len(changes)}", 5000)
+        if conflicts:
+            names = [p['name'] for p in hike_data['participants']]
+            lines = [f"День {row + 1}, {names[idx] if idx < len(names) else idx + 1}: {text}"
+                     for row, idx, text in conflicts]
+            QMessageBox.warning(self, "Конфликт изменений",
+                                "Эти ячейки изменены и у вас, и в файле. Оставлены ваши значения, "
+                                "в файле было:\n" + "\n".join(lines))
+
+    def confirm_external_reload(self, tab):
+        """
+        Спрашивает, перезагрузить ли поход, у которого в файле изменились участники или даты.
+        """
+        answer = QMessageBox.question(
+            self, "Файл изменён",
+            f"В файле {tab.title()} изменились участники или даты.\n"
+            "Перезагрузить поход? Несохранённые изменения будут потеряны.")
+        return answer == QMessageBox.StandardButton.Yes
+
+    def on_workspace_empty(self):
+        """
+        Показывает пустое состояние после закрытия последней вкладки.
+        """
+        self.workspace = None
+        self.setCentralWidget(QWidget())
+        self.main_layout = QVBoxLayout(self.centralWidget())
+        self.saved_hikes_list = QListWidget()
+        self.main_layout.addWidget(self.saved_hikes_list)
+        self.show_empty_state()
+        self.on_hike_tab_changed(None)
+
     def load_saved_hikes(self):
         """
         Загружает список сохранённых походов из файла saved_hikes.json и отображает их в списке.
@@ -667,6 +841,150 @@ class MainWindow(QMainWindow):
         self.settings['Recent Files'] = {'files': json.dumps(self.recent_files)}
         self.save_ini_file()
 
+    def get_device_id(self):
+        """
+        Возвращает идентификатор этого устройства для журнала расходов.
+        При первом запуске создаёт его и сохраняет в init.ini (раздел Sync).
+        """
+        if 'Sync' not in self.settings:
+            self.settings['Sync'] = {}
+        if not self.settings['Sync'].get('device_id'):
+            self.settings['Sync']['device_id'] = new_device_id()
+            self.save_ini_file()
+        return self.settings['Sync']['device_id']
+
+    def sync_hike_folder(self):
+        """
+        Синхронизирует журнал расходов открытого похода с другими устройствами через общую папку.
+        Передаются только новые записи; изменившиеся ячейки обновляются без перестройки таблицы.
+        """
+        works_widget = self.current_works_widget()
+        if works_widget is None:
+            return
+        folder = QFileDialog.getExistingDirectory(self, "Папка синхронизации",
+                                                  self.settings['Sync'].get('folder', ''))
+        if not folder:
+            return
+        self.settings['Sync']['folder'] = folder
+        self.save_ini_file()
+
+        transport = self.sync_transports.setdefault(folder, FolderTransport(folder))
+        try:
+            changed = transport.sync(works_widget.journal)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось синхронизировать: {str(e)}")
+            return
+        # Ячейки и итоги обновляются по событиям модели
+        if changed:
+            works_widget.mark_as_modified()
+        self.statusBar().showMessage(f"Синхронизация завершена, обновлено ячеек: {len(changed)}", 5000)
+
+    def import_entries(self):
+        """
+        Импортирует пакет записей (заметки, сделанные без программы) из JSON или CSV.
+        Записи добавляются одной операцией; повторный импорт того же файла не создаёт дублей.
+        """
+        works_widget = self.current_works_widget()
+        if works_widget is None:
+            return
+        filename, _ = QFileDialog.getOpenFileName(self, "Импорт записей", "",
+                                                  "Записи (*.csv *.json);;Все файлы (*)")
+        if not filename:
+            return
+        try:
+            items = read_items(filename)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось прочитать файл:\n{str(e)}")
+            return
+
+        queue = IngestQueue(works_widget.model)
+        queue.submit(items)
+        results = queue.commit()
+        summary = summarize(results)
+        if summary[ACCEPTED]:
+            works_widget.mark_as_modified()
+        message = (f"Принято: {summary[ACCEPTED]}\n"
+                   f"Повторы: {summary[DUPLICATE]}\n"
+                   f"Отклонено: {summary[REJECTED]}")
+        errors = [f"Запись {number}: {result['error']}"
+                  for number, result in enumerate(results, start=1) if result["status"] == REJECTED]
+        if errors:
+            message += "\n\n" + "\n".join(errors[:10])
+            if len(errors) > 10:
+                message += f"\n... и ещё {len(errors) - 10}"
+            QMessageBox.warning(self, "Импорт записей", message)
+        else:
+            QMessageBox.information(self, "Импорт записей", message)
+
+    def _choose_hike_file(self, title):
+        """
+        Выбирает и загружает файл похода. Возвращает данные или None.
+        """
+        filename, _ = QFileDialog.getOpenFileName(self, title, "", "Файлы походов (*.json);;Все файлы (*.*)")
+        if not filename:
+            return None
+        try:
+            return self.load_hike_file(filename)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось открыть файл:\n{str(e)}")
+            return None
+
+    def compare_with_file(self):
+        """
+        Показывает различия между выбранным файлом и открытым походом по записям журнала.
+        """
+        if self.current_works_widget() is None:
+            return
+        other = self._choose_hike_file("Сравнить с файлом")
+        if other is None:
+            return
+        current = self.get_hike_data()
+        diff = diff_hikes(other, current)
+        message = QMessageBox(self)
+        message.setWindowTitle("Сравнение походов")
+        message.setText(f"Добавлено записей: {len(diff['added'])}\n"
+                        f"Удалено записей: {len(diff['removed'])}\n"
+                        f"Изменено записей: {len(diff['changed'])}\n"
+                        f"Изменений похода и участников: {len(diff['header']) + len(diff['participants'])}")
+        message.setDetailedText(format_diff(diff, current['participants']))
+        message.exec()
+
+    def merge_with_file(self):
+        """
+        Объединяет открытый поход с другой копией файла.
+        Если указан общий предок, слияние трёхстороннее: применяются и удаления.
+        """
+        if self.current_works_widget() is None:
+            return
+        theirs = self._choose_hike_file("Объединить с файлом")
+        if theirs is None:
+            return
+        base = {}
+        answer = QMessageBox.question(self, "Объединение",
+                                      "Указать общий исходный файл (предка) обеих копий?\n"
+                                      "Без предка записи только добавляются.")
+        if answer == QMessageBox.StandardButton.Yes:
+            base = self._choose_hike_file("Общий предок")
+            if base is None:
+                return
+
+        merged, conflicts = merge_hikes(base, self.get_hike_data(), theirs)
+        if conflicts:
+            message = QMessageBox(self)
+            message.setIcon(QMessageBox.Icon.Warning)
+            message.setWindowTitle("Конфликты объединения")
+            message.setText(f"Конфликтов: {len(conflicts)}. В них будет оставлен ваш вариант.\n"
+                            f"Применить объединение?")
+            message.setDetailedText(format_conflicts(conflicts, merged['participants']))
+            message.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if message.exec() != QMessageBox.StandardButton.Yes:
+                return
+        self.workspace.reload_tab(self.workspace.current_tab(), merged)
+        works_widget = self.current_works_widget()
+        if works_widget is not None:
+            works_widget.mark_as_modified()
+        self.statusBar().showMessage(f"Объединение завершено, конфликтов: {len(conflicts)}", 5000)
+
     def save_ini_file(self):
         """
         Записывает настройки в файл init.ini с использованием кодировки UTF-8.
@@ -700,49 +1018,58 @@ class MainWindow(QMainWindow):
                     return
                 
                 # Читаем и проверяем данные файла
-                with open(filename, 'r', encoding='utf-8') as файл:
-                    try:
-                        hike_data = json.load(file)
-                        
-                        # Проверяем структуру данных
-                        required_fields = ['hike_name', 'participants', 'start_date', 
-                                         'end_date', 'track_days', 'expenses_data']
-                        if not all(field in hike_data for field in required_fields):
-                            raise ValueError("Неверная структура файла")
-                        
-                        # Создаем виджет для работы с походом
-                        self.main_works_widget = MainWorksWidget(hike_data, self)
-                        self.setCentralWidget(self.main_works_widget)
-                        
-                        # Обновляем заголовок окна
-                        self.current_file = filename
-                        self.setWindowTitle(f"Калькулятор экспедиции - {os.path.basename(filename)}")
-                        
-                        # Активируем кнопки управления
-                        self.save_action.setEnabled(True)
-                        self.save_as_action.setEnabled(True)
-                        self.close_action.setEnabled(True)
-                        self.edit_trek_action.setEnabled(True)
-                        self.stats_trek_action.setEnabled(True)
-                        
-                        # Обновляем список недавних файлов
-                        if filename in self.recent_files:
-                            self.recent_files.remove(filename)
-                        self.recent_files.insert(0, filename)
-                        if len(self.recent_files) > 5:
-                            self.recent_files.pop()
-                        self.save_recent_files()
-                        self.populate_recent_files_menu()
-                        
-                    except json.JSONDecodeError:
-                        QMessageBox.critical(self, "Ошибка", 
-                                          "Файл содержит некорректные данные JSON")
-                    except ValueError as e:
-                        QMessageBox.critical(self, "Ошибка", str(e))
+                try:
+                    hike_data = self.load_hike_file(filename)
+                except json.JSONDecodeError:
+                    QMessageBox.critical(self, "Ошибка", 
+                                      "Файл содержит некорректные данные JSON")
+                    return
+                except ValueError as e:
+                    QMessageBox.critical(self, "Ошибка", str(e))
+                    return
+
+                # Открываем поход во вкладке (или переключаемся на уже открытую)
+                tab = self.show_workspace().add_hike(filename, hike_data)
+                self.on_hike_tab_changed(tab)
+                if tab.lock_owner:
+                    QMessageBox.warning(self, "Файл уже открыт",
+                                        f"Поход открыт у {format_lock_owner(tab.lock_owner)}.\n"
+                                        "Изменения из файла будут подхватываться автоматически.")
+                    tab.lock_owner = None
+
+                # Обновляем список недавних файлов
+                if filename in self.recent_files:
+                    self.recent_files.remove(filename)
+                self.recent_files.insert(0, filename)
+                if len(self.recent_files) > 5:
+                    self.recent_files.pop()
+                self.save_recent_files()
+                self.populate_recent_files_menu()
                         
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось открыть файл:\n{str(e)}")
 
+    def load_hike_file(self, filename):
+        """
+        Читает файл похода и проверяет его структуру.
+        Неизменённые файлы берутся из дискового кэша без повторного разбора JSON.
+        Бросает json.JSONDecodeError или ValueError при некорректном файле.
+        """
+        hike_data = self.file_cache.get(filename)
+        if hike_data is not None:
+            return hike_data
+
+        with open(filename, 'r', encoding='utf-8') as file:
+            hike_data = json.load(file)
+
+        # Проверяем структуру данных
+        required_fields = ['hike_name', 'participants', 'start_date', 
+                         'end_date', 'track_days', 'expenses_data']
+        if not all(field in hike_data for field in required_fields):
+            raise ValueError("Неверная структура файла")
+        self.file_cache.put(filename, hike_data)
+        return hike_data
+
     def save_hike(self):
         """
         Сохраняет текущий поход в файл.
@@ -753,13 +1080,36 @@ class MainWindow(QMainWindow):
             return self.save_hike_as()
             
         try:
+            # Сначала подхватываем чужие правки, чтобы не затереть их
+            tab = self.workspace.current_tab() if self.workspace else None
+            if tab is not None:
+                self.workspace.sync_external(tab)
+                owner = tab.lock.held_by_other() if tab.lock else None
+                if owner:
+                    answer = QMessageBox.question(
+                        self, "Файл открыт другим гидом",
+                        f"Файл открыт у {format_lock_owner(owner)}.\nСохранить всё равно?")
+                    if answer != QMessageBox.StandardButton.Yes:
+                        return False
+
             hike_data = self.get_hike_data()
             if hike_data:
-                with open(self.current_file, 'w', encoding='utf-8') as файл:
-                    json.dump(hike_data, file, ensure_ascii=False, indent=4)
+                # Атомарная запись: другие гиды не прочитают файл наполовину записанным
+                write_hike(self.current_file, hike_data)
+                # Сохранённое состояние сразу кладём в кэш для следующего открытия
+                self.file_cache.put(self.current_file, hike_data)
+                self.update_archive_index(self.current_file, hike_data)
+                # Проверяются только сегменты аудита после последней проверенной контрольной точки
+                problems = remember_verified(self.current_file, hike_data, self.file_cache.directory)
+                if problems:
+                    QMessageBox.warning(self, "Проверка целостности",
+                                        "Журнал аудита не сходится с записями:\n" + "\n".join(problems))
+                if tab is not None:
+                    self.workspace.mark_saved(tab, hike_data)
                 
-                if hasattr(self, 'main_works_widget'):
-                    self.main_works_widget.mark_as_saved()
+                works_widget = self.current_works_widget()
+                if works_widget is not None:
+                    works_widget.mark_as_saved()
                     
                 return True
                 
@@ -774,7 +1124,16 @@ class MainWindow(QMainWindow):
         """
         filename, _ = QFileDialog.getSaveFileName(self, "Сохранить поход как", "", "JSON files (*.json)")
         if filename:
+            old_file = self.current_file
             self.current_file = filename
+            works_widget = self.current_works_widget()
+            if old_file and works_widget is not None and os.path.abspath(old_file) != os.path.abspath(filename):
+                # Чеки хранятся рядом с файлом похода - переносим их к новому файлу
+                try:
+                    AttachmentStore(old_file).copy_to(AttachmentStore(filename),
+                                                      entry_receipts(works_widget.journal.entries))
+                except OSError as e:
+                    QMessageBox.warning(self, "Предупреждение", f"Не удалось скопировать чеки: {str(e)}")
             if self.save_hike():
                 self.setWindowTitle(f"Калькулятор экспедиции - {os.path.basename(filename)}")
                 return True
@@ -782,19 +1141,14 @@ class MainWindow(QMainWindow):
 
     def close_hike(self):
         """
-        Закрывает текущий поход.
-        Сбрасывает текущий выбранный файл, отключает действия сохранения и закрытия,
-        устанавливает центральный виджет в пустое состояние.
+        Закрывает текущий поход (активную вкладку).
+        После закрытия последней вкладки отключает действия сохранения и закрытия
+        и устанавливает центральный виджет в пустое состояние.
         """
-        self.current_file = None
-        self.save_action.setEnabled(False)
-        self.save_as_action.setEnabled(False)
-        self.close_action.setEnabled(False)
-        self.setCentralWidget(QWidget())
-        self.main_layout = QVBoxLayout(self.centralWidget())
-        self.saved_hikes_list = QListWidget()
-        self.main_layout.addWidget(self.saved_hikes_list)
-        self.show_empty_state()
+        if self.workspace is not None and self.workspace.count():
+            self.workspace.close_tab(self.workspace.currentIndex())
+        else:
+            self.on_workspace_empty()
 
     def show_main_works_widget(self, hike_data):
         """
@@ -803,55 +1157,45 @@ class MainWindow(QMainWindow):
         
         :param hike_data: Словарь с данными о походе
         """
-        self.main_works_widget = MainWorksWidget(hike_data, self)
-        self.setCentralWidget(self.main_works_widget)
+        self.show_workspace().add_hike(None, hike_data)
         # Enable view menu actions when trek is loaded
-        self.edit_trek_action.setEnabled(True)
-        self.stats_trek_action.setEnabled(True)
+        self.on_hike_tab_changed(self.workspace.current_tab())
 
     def get_hike_data(self):
         """
         Получает данные текущего похода для сохранения.
         Формирует словарь с именем похода, участниками, датами, днями трека и расходами.
         """
-        if hasattr(self, 'main_works_widget'):
+        works_widget = self.current_works_widget()
+        if works_widget is not None:
             # Get expenses data from table
-            expenses_data = []
-            num_participants = len(self.main_works_widget.hike_data['participants'])
-            num_days = self.main_works_widget.hike_data['track_days']
-            
-            for строки in range(num_days):  # Exclude total row
-                day_expenses = []
-                for col in range(1, num_participants + 1):  # Skip date column
-                    item = self.main_works_widget.table.item(row, col)
-                    expense = item.text() if item else "0"
-                    day_expenses.append(expense)
-                expenses_data.append(day_expenses)
-
-            return {
-                "hike_name": self.main_works_widget.hike_data['hike_name'],
-                "participants": self.main_works_widget.hike_data['participants'],
-                "start_date": self.main_works_widget.hike_data['start_date'],
-                "end_date": self.main_works_widget.hike_data['end_date'],
-                "track_days": self.main_works_widget.hike_data['track_days'],
-                "expenses_data": expenses_data
+            hike_data = {
+                "hike_name": works_widget.hike_data['hike_name'],
+                "participants": works_widget.hike_data['participants'],
+                "start_date": works_widget.hike_data['start_date'],
+                "end_date": works_widget.hike_data['end_date'],
+                "track_days": works_widget.hike_data['track_days'],
+                "expenses_data": works_widget.get_expenses_data(),
+                "journal": works_widget.journal.entries,
+                "audit": works_widget.model.audit.data,
+                "schema_version": HIKE_SCHEMA_VERSION
             }
+            # Необязательные поля похода: места пополнения, бюджеты, ключ обмена и надгробия
+            for field in (POINTS_FIELD, BUDGETS_FIELD, SYNC_ID_FIELD, TOMBSTONES_FIELD):
+                if field in works_widget.hike_data:
+                    hike_data[field] = works_widget.hike_data[field]
+            return hike_data
         elif hasattr(self, 'create_hike_widget'):
-            num_participants = self.create_hike_widget.participant_fields.count()
+            participants = [{key: value for key, value in participant.items() if key != "team"}
+                            for participant in self.create_hike_widget.get_participants()]
             num_days = self.create_hike_widget.track_days.value()
             
             # Create initial expenses array filled with zeros
-            expenses_data = [["0"] * num_participants for _ in range(num_days)]
+            expenses_data = [["0"] * len(participants) for _ in range(num_days)]
             
             return {
                 "hike_name": self.create_hike_widget.hike_name.currentText(),
-                "participants": [
-                    {
-                        "name": self.create_hike_widget.participant_fields.itemAt(i).layout().itemAt(0).widget().text() or f"Участник {i + 1}",
-                        "payment": self.create_hike_widget.participant_fields.itemAt(i).layout().itemAt(1).widget().value()
-                    }
-                    for i in range(num_participants)
-                ],
+                "participants": participants,
                 "start_date": self.create_hike_widget.start_date.date().toString(Qt.DateFormat.ISODate),
                 "end_date": self.create_hike_widget.end_date.date().toString(Qt.DateFormat.ISODate),
                 "track_days": num_days,
@@ -864,35 +1208,169 @@ class MainWindow(QMainWindow):
     def show_edit_trek(self):
         """
         Показывает экран редактирования трека.
-        Создает новый экземпляр MainWorksWidget если необходимо.
+        Возвращает во вкладку таблицу расходов вместо статистики.
         """
-        if hasattr(self, 'main_works_widget'):
-            # Recreate MainWorksWidget with current data
-            self.main_works_widget = MainWorksWidget(self.main_works_widget.hike_data, self)
-            self.setCentralWidget(self.main_works_widget)
-            self.main_works_widget.has_unsaved_changes = False
+        tab = self.workspace.current_tab() if self.workspace else None
+        if tab is not None and tab.works_widget is not None:
+            tab.set_view(tab.works_widget)
 
     def show_trek_stats(self):
         """
         Показывает экран статистики трека.
         Создает новый экземпляр StatisticWidget с текущими данными.
         """
-        if hasattr(self, 'main_works_widget'):
-            from statistic import StatisticWidget
+        works_widget = self.current_works_widget()
+        if works_widget is not None:
             # Get current data before switching
             current_data = self.get_hike_data()
+            tab = self.workspace.current_tab()
             statistic_widget = StatisticWidget(current_data, 
-                                             self.main_works_widget.table, 
-                                             self)
-            self.setCentralWidget(statistic_widget)
+                                             works_widget.table, 
+                                             tab,
+                                             works_widget.model)
+            tab.set_view(statistic_widget)
+
+    def show_search_dialog(self):
+        """
+        Показывает окно поиска записей по заметкам и категориям.
+        """
+        if self.search_dialog is None:
+            self.search_dialog = SearchDialog(self)
+        self.search_dialog.show()
+        self.search_dialog.raise_()
+        self.search_dialog.query_edit.setFocus()
+
+    def show_pivot_dialog(self):
+        """
+        Показывает сводную таблицу расходов открытого похода или архива.
+        """
+        if self.pivot_dialog is None:
+            self.pivot_dialog = PivotDialog(self)
+        self.pivot_dialog.show()
+        self.pivot_dialog.raise_()
+        self.pivot_dialog.refresh()
+
+    def get_archive_pivot(self, folder):
+        """
+        Возвращает сводные таблицы папки архива (факты хранятся в папке кэша).
+        """
+        if self.archive_pivot is None or self.archive_pivot.directory != os.path.abspath(folder):
+            self.archive_pivot = ArchivePivot(folder, self.file_cache.directory)
+        return self.archive_pivot
+
+    def get_participant_directory(self):
+        """
+        Возвращает справочник участников папки архива или None, если папка не выбрана.
+        Файлы перечитываются только при первом обращении и если изменились.
+        """
+        folder = self.settings['Search'].get('archive_dir', '')
+        if not folder or not os.path.isdir(folder):
+            return None
+        if self.participant_directory is None or self.participant_directory.directory != os.path.abspath(folder):
+            self.participant_directory = ParticipantDirectory(folder, self.file_cache.directory)
+            self.participant_directory.refresh()
+        return self.participant_directory
+
+    def get_budget_planner(self):
+        """
+        Возвращает планировщик взноса по папке архива или None, если папка не выбрана.
+        """
+        folder = self.settings['Search'].get('archive_dir', '')
+        if not folder or not os.path.isdir(folder):
+            return None
+        if self.budget_planner is None or self.budget_planner.directory != os.path.abspath(folder):
+            self.budget_planner = BudgetPlanner(folder, self.file_cache.directory)
+        self.budget_planner.refresh()
+        return self.budget_planner
+
+    def get_archive_index(self, folder):
+        """
+        Возвращает поисковый индекс папки архива (хранится в папке кэша).
+        """
+        if self.archive_index is None or self.archive_index.directory != os.path.abspath(folder):
+            self.archive_index = ArchiveSearchIndex(folder, self.file_cache.directory)
+        return self.archive_index
+
+    def verify_archive(self):
+        """
+        Проверяет журналы аудита всех походов в папке (параллельно, только изменённые файлы).
+        """
+        folder = QFileDialog.getExistingDirectory(self, "Папка архива походов",
+                                                  self.settings['Search'].get('archive_dir', ''))
+        if not folder:
+            return
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            reports = verify_directory(folder, cache_dir=self.file_cache.directory)
+        finally:
+            QApplication.restoreOverrideCursor()
+        broken = [report for report in reports if report["problems"]]
+        lines = [f"Проверено изменённых файлов: {len(reports)}, с нарушениями: {len(broken)}"]
+        for report in broken:
+            lines.append(f"{os.path.relpath(report['path'], folder)}: " + "; ".join(report["problems"]))
+        if broken:
+            QMessageBox.warning(self, "Проверка целостности", "\n".join(lines))
+        else:
+            QMessageBox.information(self, "Проверка целостности", "\n".join(lines))
+
+    def update_archive_index(self, filename, hike_data):
+        """
+        Переиндексирует сохранённый файл, если он лежит в папке архива
+        (поисковый индекс, факты сводных таблиц, справочник участников и планировщик взноса).
+        """
+        path = os.path.abspath(filename)
+        if self.archive_index is not None and path.startswith(self.archive_index.directory + os.sep):
+            self.archive_index.update_file(path, hike_data=hike_data)
+            self.archive_index.save()
+        if self.archive_pivot is not None and path.startswith(self.archive_pivot.directory + os.sep):
+            self.archive_pivot.update_file(path, hike_data=hike_data)
+            self.archive_pivot.save()
+        people = self.participant_directory
+        if people is not None and path.startswith(people.directory + os.sep):
+            people.update_file(path, hike_data=hike_data)
+            people.save()
+        planner = self.budget_planner
+        if planner is not None and path.startswith(planner.directory + os.sep):
+            planner.update_file(path, hike_data=hike_data)
+            planner.save()
+
+    def open_search_match(self, match):
+        """
+        Открывает поход найденной записи и выделяет её ячейку.
+        """
+        if "hike" in match:
+            self.open_hike(match["hike"])
+        works_widget = self.current_works_widget()
+        if works_widget is not None:
+            self.show_edit_trek()
+            works_widget.table.setCurrentCell(match["day"], match["participant"] + 1)
+
+    def show_memory_report(self):
+        """
+        Показывает отчёт о памяти открытого похода по подсистемам
+        (данные похода, ячейки таблицы, копия статистики).
+        """
+        works_widget = self.current_works_widget()
+        if works_widget is None:
+            return
+        view = self.workspace.current_tab().view
+        statistic_widget = view if isinstance(view, StatisticWidget) else None
+        report = memprofile.profile_hike(works_widget, statistic_widget)
+        report["cache"] = self.workspace.cache.total_bytes
+        QMessageBox.information(self, "Диагностика памяти", memprofile.format_report(report))
 
 def main():
     """
     Точка входа в приложение.
     Создаёт экземпляр QApplication, главное окно и запускает главный цикл событий.
+    С ключом --memprofile запускает tracemalloc для режима диагностики памяти.
     """
+    if "--memprofile" in sys.argv:
+        sys.argv.remove("--memprofile")
+        tracemalloc.start()
     app = QApplication(sys.argv)
     window = MainWindow()
+    app.aboutToQuit.connect(window.thumbnails.shutdown)
     window.show()
     sys.exit(app.exec())
 
@@ -0,0 +1,321 @@
+import os, sys, csv, json, time, pickle, argparse, datetime
+from journal import ExpenseJournal
+from filecache import DEFAULT_CACHE_DIR
+from migrate import find_hike_files
+
+# Измерения сводной таблицы и их заголовки
+DIMENSIONS = ("trek", "day", "month", "participant", "category")
+DIMENSION_TITLES = {"trek": "Поход", "day": "День", "month": "Месяц", "participant": "Участник",
+                    "category": "Категория"}
+# Показатели: сумма записей или их количество
+MEASURES = ("sum", "count")
+MEASURE_TITLES = {"sum": "Сумма", "count": "Количество"}
+
+# Версия формата сохранённых фактов архива
+PIVOT_VERSION = 1
+# Имя файла фактов архива в папке кэша
+ARCHIVE_PIVOT_FILE = "pivot_archive.idx"
+
+
+def _start_date(hike_data):
+    try:
+        return datetime.date.fromisoformat(hike_data.get('start_date', ''))
+    except (TypeError, ValueError):
+        return None
+
+
+def fact_key(entry, trek, start, participant=None):
+    """
+    Ключ факта записи по всем измерениям: (поход, день, месяц, участник, категория).
+    Участник по умолчанию - индекс; в архиве передаётся имя.
+    """
+    day = entry['day']
+    month = (start + datetime.timedelta(days=day)).strftime("%Y-%m") if start else "?"
+    return (trek, day + 1, month, entry['participant'] if participant is None else participant,
+            entry.get('category', ''))
+
+
+def add_fact(facts, key, amount, count):
+    """
+    Прибавляет сумму и количество к факту; пустые факты удаляются.
+    """
+    cell = facts.get(key)
+    if cell is None:
+        cell = facts[key] = [0.0, 0]
+    cell[0] += amount
+    cell[1] += count
+    if cell[1] == 0:
+        del facts[key]
+
+
+def hike_facts(hike_data, trek=None):
+    """
+    Строит факты похода: {ключ факта (участник - имя): [сумма, количество]}.
+    """
+    trek = trek or hike_data.get('hike_name', '')
+    start = _start_date(hike_data)
+    names = [p['name'] for p in hike_data.get('participants', [])]
+    entries = hike_data['journal'] if 'journal' in hike_data else ExpenseJournal(dict(hike_data)).entries
+    facts = {}
+    for entry in entries:
+        index = entry['participant']
+        name = names[index] if 0 <= index < len(names) else f"Участник {index + 1}"
+        add_fact(facts, fact_key(entry, trek, start, name), entry['amount'], 1)
+    return facts
+
+
+class PivotCube:
+    """
+    Агрегат по двум измерениям (строки x столбцы): {(строка, столбец): [сумма, количество]}.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows, self.cols = rows, cols
+        self._row = DIMENSIONS.index(rows)
+        self._col = DIMENSIONS.index(cols)
+        self.cells = {}
+
+    def add(self, key, amount, count):
+        add_fact(self.cells, (key[self._row], key[self._col]), amount, count)
+
+    def table(self, measure="sum", label=None):
+        """
+        Возвращает срез для показа: {"rows", "cols", "values", "row_totals", "col_totals", "total"}.
+        Подписи строк и столбцов берутся из label(измерение, значение).
+        """
+        label = label or (lambda dimension, value: value)
+        index = MEASURES.index(measure)
+        row_keys = sorted({row for row, _ in self.cells}, key=_sort_key)
+        col_keys = sorted({col for _, col in self.cells}, key=_sort_key)
+        values, row_totals, col_totals = {}, {}, {}
+        for (row, col), cell in self.cells.items():
+            values[(row, col)] = cell[index]
+            row_totals[row] = row_totals.get(row, 0) + cell[index]
+            col_totals[col] = col_totals.get(col, 0) + cell[index]
+        return {"rows": [(key, label(self.rows, key)) for key in row_keys],
+                "cols": [(key, label(self.cols, key)) for key in col_keys],
+                "values": values, "row_totals": row_totals, "col_totals": col_totals,
+                "total": sum(row_totals.values()), "row_title": DIMENSION_TITLES[self.rows],
+                "col_title": DIMENSION_TITLES[self.cols], "measure": measure}
+
+
+def _sort_key(value):
+    return (0, value, "") if isinstance(value, (int, float)) else (1, 0, str(value))
+
+
+class PivotEngine:
+    """
+    Факты (записи, сгруппированные по всем измерениям) и кэш материализованных кубов.
+    Куб строится из фактов при первом запросе и дальше обновляется вместе с фактами.
+    """
+
+    def __init__(self):
+        self.facts = {}
+        self.cubes = {}
+
+    def apply(self, key, amount, count):
+        add_fact(self.facts, key, amount, count)
+        for cube in self.cubes.values():
+            cube.add(key, amount, count)
+
+    def cube(self, rows, cols):
+        cube = self.cubes.get((rows, cols))
+        if cube is None:
+            cube = self.cubes[(rows, cols)] = PivotCube(rows, cols)
+            for key, (amount, count) in self.facts.items():
+                cube.add(key, amount, count)
+        return cube
+
+    def label(self, dimension, value):
+        if dimension == "day":
+            return f"День {value}"
+        return str(value)
+
+    def table(self, rows, cols, measure="sum"):
+        return self.cube(rows, cols).table(measure, self.label)
+
+
+class LedgerPivot(PivotEngine):
+    """
+    Сводные таблицы открытого похода. Слушает журнал расходов: каждая правка
+    меняет факты и все уже построенные кубы, без пересчёта по всем записям.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self.rebuild()
+        model.journal.listeners.append(self._on_journal_changed)
+
+    def rebuild(self):
+        """
+        Строит факты заново (например, после изменения дат или названия похода).
+        """
+        self.facts, self.cubes = {}, {}
+        self.trek = self.model.hike_data.get('hike_name', '')
+        self.start = _start_date(self.model.hike_data)
+        self._on_journal_changed(self.model.journal.entries, ())
+
+    def _on_journal_changed(self, added, removed):
+        for entry in removed:
+            self.apply(fact_key(entry, self.trek, self.start), -entry['amount'], -1)
+        for entry in added:
+            self.apply(fact_key(entry, self.trek, self.start), entry['amount'], 1)
+
+    def label(self, dimension, value):
+        if dimension == "participant":
+            participants = self.model.participants
+            return participants[value]['name'] if 0 <= value < len(participants) else f"Участник {value + 1}"
+        return super().label(dimension, value)
+
+
+class ArchivePivot(PivotEngine):
+    """
+    Сводные таблицы по всем походам папки архива (например, поход x месяц).
+
+    Факты каждого файла хранятся в папке кэша; при обновлении перечитываются
+    только файлы, у которых изменились время изменения или размер.
+    """
+
+    def __init__(self, directory, cache_dir=DEFAULT_CACHE_DIR):
+        super().__init__()
+        self.directory = os.path.abspath(directory)
+        self.cache_path = os.path.join(cache_dir, ARCHIVE_PIVOT_FILE)
+        self.files = {}  # путь -> (подпись файла, факты файла)
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "rb") as file:
+                state = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return
+        if state.get("version") == PIVOT_VERSION and state.get("directory") == self.directory:
+            self.files = state["files"]
+            for _, facts in self.files.values():
+                self._apply_facts(facts, 1)
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "wb") as file:
+                pickle.dump({"version": PIVOT_VERSION, "directory": self.directory, "files": self.files},
+                            file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # Кэш необязателен: при ошибке записи факты будут собраны заново
+            pass
+
+    def _apply_facts(self, facts, sign):
+        for key, (amount, count) in facts.items():
+            self.apply(key, sign * amount, sign * count)
+
+    def refresh(self):
+        """
+        Пересобирает факты новых и изменённых файлов, убирает пропавшие.
+        Возвращает количество обновлённых файлов.
+        """
+        seen = set()
+        updated = 0
+        for path in find_hike_files(self.directory):
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if path in self.files and self.files[path][0] == signature:
+                continue
+            self.update_file(path, signature)
+            updated += 1
+        for path in set(self.files) - seen:
+            self._apply_facts(self.files.pop(path)[1], -1)
+            updated += 1
+        if updated:
+            self.save()
+        return updated
+
+    def update_file(self, path, signature=None, hike_data=None):
+        """
+        Заменяет факты одного файла (например, сразу после сохранения похода).
+        """
+        if path in self.files:
+            self._apply_facts(self.files.pop(path)[1], -1)
+        try:
+            if hike_data is None:
+                with open(path, "r", encoding="utf-8") as file:
+                    hike_data = json.load(file)
+            facts = hike_facts(hike_data, os.path.splitext(os.path.relpath(path, self.directory))[0])
+            if signature is None:
+                stat = os.stat(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return
+        self.files[path] = (signature, facts)
+        self._apply_facts(facts, 1)
+
+
+def _format_value(value, measure):
+    return str(value) if measure == "count" else f"{value:.0f}"
+
+
+def table_rows(table):
+    """
+    Возвращает срез в виде строк: заголовок, строки с итогами и итоговая строка.
+    """
+    measure = table["measure"]
+    header = [f"{table['row_title']} \\ {table['col_title']}"] + [title for _, title in table["cols"]] + ["Итого"]
+    rows = [header]
+    for key, title in table["rows"]:
+        rows.append([title] + [_format_value(table["values"][(key, col)], measure)
+                               if (key, col) in table["values"] else "" for col, _ in table["cols"]]
+                    + [_format_value(table["row_totals"][key], measure)])
+    rows.append(["Итого"] + [_format_value(table["col_totals"][col], measure) for col, _ in table["cols"]]
+                + [_format_value(table["total"], measure)])
+    return rows
+
+
+def format_table(table):
+    """
+    Текстовая сводная таблица с выравниванием по столбцам.
+    """
+    rows = table_rows(table)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join("  ".join(cell.ljust(widths[0]) if i == 0 else cell.rjust(widths[i])
+                               for i, cell in enumerate(row)) for row in rows)
+
+
+def main(argv=None):
+    """
+    Сводная таблица: python pivot.py поход.json|папка --rows category --cols day [--measure count] [--csv]
+    """
+    parser = argparse.ArgumentParser(description="Сводные таблицы расходов похода или архива")
+    parser.add_argument("source", help="файл похода или папка архива")
+    parser.add_argument("--rows", choices=DIMENSIONS, default="category")
+    parser.add_argument("--cols", choices=DIMENSIONS, default="participant")
+    parser.add_argument("--measure", choices=MEASURES, default="sum")
+    parser.add_argument("--csv", action="store_true", help="вывести в формате CSV")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if os.path.isdir(args.source):
+        engine = ArchivePivot(args.source, args.cache_dir)
+        engine.refresh()
+    else:
+        with open(args.source, "r", encoding="utf-8") as file:
+            hike_data = json.load(file)
+        engine = PivotEngine()
+        engine.facts = hike_facts(hike_data)
+    table = engine.table(args.rows, args.cols, args.measure)
+    if args.csv:
+        csv.writer(sys.stdout).writerows(table_rows(table))
+    else:
+        print(format_table(table))
+        print(f"За {(time.perf_counter() - started) * 1000:.0f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
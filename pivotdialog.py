@@ -0,0 +1,138 @@
+import os
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QComboBox, QLabel, QPushButton,
+                             QTableWidget, QTableWidgetItem, QFileDialog, QHeaderView)
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QFont
+from pivot import DIMENSIONS, DIMENSION_TITLES, MEASURES, MEASURE_TITLES, table_rows
+
+
+class PivotDialog(QDialog):
+    def __init__(self, parent):
+        """
+        Окно сводной таблицы: строки и столбцы выбираются из измерений
+        (поход, день, месяц, участник, категория), показатель - сумма или количество.
+        Для открытого похода таблица обновляется при каждой правке.
+        """
+        super().__init__(parent)
+        self.window = parent
+        self.unsubscribe = None
+        self._refresh_scheduled = False
+        self.setWindowTitle("Сводная таблица")
+        self.resize(800, 500)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        self.scope_combo = QComboBox(self)
+        self.scope_combo.addItems(["Текущий поход", "Архив походов"])
+        controls.addWidget(self.scope_combo)
+        controls.addWidget(QLabel("Строки:", self))
+        self.rows_combo = self._dimension_combo("category")
+        controls.addWidget(self.rows_combo)
+        controls.addWidget(QLabel("Столбцы:", self))
+        self.cols_combo = self._dimension_combo("participant")
+        controls.addWidget(self.cols_combo)
+        self.measure_combo = QComboBox(self)
+        for measure in MEASURES:
+            self.measure_combo.addItem(MEASURE_TITLES[measure], measure)
+        controls.addWidget(self.measure_combo)
+        self.folder_button = QPushButton("Папка архива...", self)
+        self.folder_button.clicked.connect(self.choose_archive_folder)
+        controls.addWidget(self.folder_button)
+        layout.addLayout(controls)
+
+        for combo in (self.scope_combo, self.rows_combo, self.cols_combo, self.measure_combo):
+            combo.currentIndexChanged.connect(self.refresh)
+
+        self.table = QTableWidget(self)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        layout.addWidget(self.table)
+        self.status_label = QLabel("", self)
+        layout.addWidget(self.status_label)
+
+    def _dimension_combo(self, current):
+        combo = QComboBox(self)
+        for dimension in DIMENSIONS:
+            combo.addItem(DIMENSION_TITLES[dimension], dimension)
+        combo.setCurrentIndex(DIMENSIONS.index(current))
+        return combo
+
+    def choose_archive_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Папка архива походов",
+                                                  self.window.settings['Search'].get('archive_dir', ''))
+        if folder:
+            self.window.settings['Search']['archive_dir'] = folder
+            self.window.save_ini_file()
+            self.scope_combo.setCurrentIndex(1)
+            self.refresh()
+
+    def _watch(self, works_widget):
+        """
+        Подписывается на события модели похода: таблица перерисовывается после правок.
+        """
+        if self.unsubscribe is not None:
+            self.unsubscribe()
+            self.unsubscribe = None
+        if works_widget is not None:
+            self.unsubscribe = works_widget.model.subscribe(self._on_model_event)
+
+    def _on_model_event(self, event):
+        # Пакет изменений даёт много событий - перерисовываем один раз
+        if event["type"] in ("entry_added", "entry_removed") and not self._refresh_scheduled:
+            self._refresh_scheduled = True
+            QTimer.singleShot(0, self.refresh)
+
+    def _engine(self):
+        if self.scope_combo.currentIndex() == 0:
+            works_widget = self.window.current_works_widget()
+            self._watch(works_widget)
+            if works_widget is None:
+                self.status_label.setText("Нет открытого похода")
+                return None
+            return works_widget.pivot_engine()
+        self._watch(None)
+        folder = self.window.settings['Search'].get('archive_dir', '')
+        if not folder or not os.path.isdir(folder):
+            self.status_label.setText("Выберите папку архива походов")
+            return None
+        engine = self.window.get_archive_pivot(folder)
+        engine.refresh()
+        return engine
+
+    def refresh(self, *args):
+        self._refresh_scheduled = False
+        if not self.isVisible():
+            return
+        self.table.clear()
+        self.table.setRowCount(0)
+        self.table.setColumnCount(0)
+        engine = self._engine()
+        if engine is None:
+            return
+        table = engine.table(self.rows_combo.currentData(), self.cols_combo.currentData(),
+                             self.measure_combo.currentData())
+        rows = table_rows(table)
+        header, body = rows[0], rows[1:]
+        self.table.setColumnCount(len(header) - 1)
+        self.table.setRowCount(len(body))
+        self.table.setHorizontalHeaderLabels(header[1:])
+        self.table.setVerticalHeaderLabels([row[0] for row in body])
+        bold = QFont()
+        bold.setBold(True)
+        for r, row in enumerate(body):
+            for c, text in enumerate(row[1:]):
+                item = QTableWidgetItem(text)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                # Итоговые строка и столбец
+                if r == len(body) - 1 or c == len(header) - 2:
+                    item.setFont(bold)
+                self.table.setItem(r, c, item)
+        self.status_label.setText(f"{table['row_title']} x {table['col_title']}: "
+                                  f"{len(table['rows'])} x {len(table['cols'])}")
+
+    def closeEvent(self, event):
+        self._watch(None)
+        super().closeEvent(event)
@@ -0,0 +1,350 @@
+import os, sys, json, math, time, pickle, random, argparse
+from concurrent.futures import ProcessPoolExecutor
+from filecache import DEFAULT_CACHE_DIR
+from journal import ExpenseJournal
+from migrate import find_hike_files
+from hikemodel import is_pool
+from presence import normalize_intervals, contains
+
+try:
+    import numpy as np
+except ImportError:
+    # Без NumPy симуляции идут циклом на Python (медленнее, но с тем же результатом по смыслу)
+    np = None
+
+# Версия формата сохранённой статистики архива
+PLANNER_VERSION = 1
+# Имя файла статистики архива в папке кэша
+PLANNER_FILE = "planner_archive.idx"
+# Число симуляций по умолчанию
+DEFAULT_SIMULATIONS = 50000
+# Без NumPy симуляций меньше: цикл на Python примерно в сто раз медленнее,
+# а взнос всё равно округляется до DEPOSIT_STEP
+PYTHON_SIMULATIONS = 5000
+# Уровни уверенности, для которых рекомендуется взнос
+DEFAULT_LEVELS = (0.5, 0.8, 0.9, 0.95)
+# Взнос округляется вверх до этого шага, рупий
+DEPOSIT_STEP = 500
+# Если у похода меньше наблюдённых дней, распределения берутся по всему архиву
+MIN_TREK_DAYS = 5
+# Меньше этого числа симуляций считается в одном процессе
+PARALLEL_MIN = 20000
+
+
+def hike_day_stats(hike_data):
+    """
+    Статистика расходов похода на человека в день по категориям.
+
+    День похода учитывается до последнего дня с записями. Расход дня по категории
+    (со всех столбцов, включая фонды) делится на число присутствовавших участников.
+    Для категории хранятся достаточные статистики логнормального распределения
+    ненулевых дней: [число ненулевых дней, сумма ln x, сумма (ln x)^2].
+    """
+    participants = hike_data.get('participants', [])
+    days = int(hike_data.get('track_days') or 0)
+    people = [normalize_intervals(p.get('presence'), days) for p in participants if not is_pool(p)]
+    entries = hike_data['journal'] if 'journal' in hike_data else ExpenseJournal(dict(hike_data)).entries
+    spent = {}  # (день, категория) -> расход
+    last_day = -1
+    for entry in entries:
+        if entry['amount'] >= 0 or not 0 <= entry['day'] < days:
+            continue
+        key = (entry['day'], entry.get('category', ''))
+        spent[key] = spent.get(key, 0.0) - entry['amount']
+        last_day = max(last_day, entry['day'])
+    present = [sum(1 for intervals in people if contains(intervals, day)) for day in range(last_day + 1)]
+    categories = {}
+    for (day, category), amount in spent.items():
+        if present[day] and amount > 0:
+            value = math.log(amount / present[day])
+            stats = categories.setdefault(category, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += value
+            stats[2] += value * value
+    return {"hikes": 1, "days": sum(1 for count in present if count), "lengths": {days: 1},
+            "categories": categories}
+
+
+def add_stats(total, stats, sign):
+    """
+    Прибавляет (sign=1) или вычитает (sign=-1) статистику похода.
+    """
+    total["hikes"] += sign * stats["hikes"]
+    total["days"] += sign * stats["days"]
+    for length, count in stats["lengths"].items():
+        total["lengths"][length] = total["lengths"].get(length, 0) + sign * count
+        if total["lengths"][length] <= 0:
+            del total["lengths"][length]
+    for category, (count, sum1, sum2) in stats["categories"].items():
+        cell = total["categories"].setdefault(category, [0, 0.0, 0.0])
+        cell[0] += sign * count
+        cell[1] += sign * sum1
+        cell[2] += sign * sum2
+        if cell[0] <= 0:
+            del total["categories"][category]
+
+
+def empty_stats():
+    return {"hikes": 0, "days": 0, "lengths": {}, "categories": {}}
+
+
+def fit_categories(stats):
+    """
+    Подгоняет распределение дневного расхода на человека для каждой категории:
+    с вероятностью p день с расходом, сумма - логнормальная (mu, sigma).
+    Возвращает {категория: (p, mu, sigma)}.
+    """
+    params = {}
+    for category, (count, sum1, sum2) in stats["categories"].items():
+        if count <= 0 or stats["days"] <= 0:
+            continue
+        mu = sum1 / count
+        sigma = math.sqrt(max(sum2 / count - mu * mu, 0.0))
+        params[category] = (min(count / stats["days"], 1.0), mu, sigma)
+    return params
+
+
+def simulate_chunk(params, days, count, seed):
+    """
+    Симулирует count походов по days дней: расход на человека за поход.
+    params - список (p, mu, sigma) по категориям. Возвращает список сумм.
+    """
+    if np is not None:
+        generator = np.random.default_rng(seed)
+        totals = np.zeros(count)
+        for p, mu, sigma in params:
+            amounts = generator.lognormal(mu, sigma, (count, days))
+            amounts *= generator.random((count, days)) < p
+            totals += amounts.sum(axis=1)
+        return totals.tolist()
+    generator = random.Random(seed)
+    totals = []
+    for _ in range(count):
+        total = 0.0
+        for p, mu, sigma in params:
+            for _ in range(days):
+                if generator.random() < p:
+                    total += generator.lognormvariate(mu, sigma)
+        totals.append(total)
+    return totals
+
+
+def simulate(params, days, simulations=DEFAULT_SIMULATIONS, workers=None, seed=None):
+    """
+    Симулирует расход на человека за поход, при большом числе симуляций - на всех ядрах.
+    Возвращает отсортированный список сумм.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = workers if workers > 1 and simulations >= PARALLEL_MIN else 1
+    seeds = random.Random(seed).sample(range(2 ** 31), chunks)
+    sizes = [simulations // chunks + (1 if i < simulations % chunks else 0) for i in range(chunks)]
+    if chunks == 1:
+        totals = simulate_chunk(params, days, simulations, seeds[0])
+    else:
+        totals = []
+        with ProcessPoolExecutor(chunks) as executor:
+            for part in executor.map(simulate_chunk, [params] * chunks, [days] * chunks, sizes, seeds):
+                totals.extend(part)
+    totals.sort()
+    return totals
+
+
+def round_deposit(amount):
+    return int(math.ceil(amount / DEPOSIT_STEP) * DEPOSIT_STEP)
+
+
+class BudgetPlanner:
+    """
+    Планировщик взноса на человека для нового похода по расходам походов из папки архива.
+
+    Для каждого похода (по названию трека) и категории хранятся достаточные статистики
+    дневного расхода на человека, поэтому при сохранении похода статистика файла
+    вычитается и добавляется заново, а остальные файлы не читаются.
+    Взнос - квантиль расхода за поход по Монте-Карло при выбранных уровнях уверенности.
+    """
+
+    def __init__(self, directory, cache_dir=DEFAULT_CACHE_DIR):
+        self.directory = os.path.abspath(directory)
+        self.cache_path = os.path.join(cache_dir, PLANNER_FILE)
+        self.files = {}  # путь -> (подпись файла, трек, статистика файла)
+        self.treks = {}  # трек -> статистика всех его походов
+        self.total = empty_stats()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "rb") as file:
+                state = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return
+        if state.get("version") == PLANNER_VERSION and state.get("directory") == self.directory:
+            self.files = state["files"]
+            for _, trek, stats in self.files.values():
+                self._apply(trek, stats, 1)
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "wb") as file:
+                pickle.dump({"version": PLANNER_VERSION, "directory": self.directory, "files": self.files},
+                            file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # Кэш необязателен: при ошибке записи статистика будет собрана заново
+            pass
+
+    def _apply(self, trek, stats, sign):
+        add_stats(self.treks.setdefault(trek, empty_stats()), stats, sign)
+        if self.treks[trek]["hikes"] <= 0:
+            del self.treks[trek]
+        add_stats(self.total, stats, sign)
+
+    def refresh(self):
+        """
+        Пересобирает статистику новых и изменённых файлов, убирает пропавшие.
+        Возвращает количество обновлённых файлов.
+        """
+        seen = set()
+        updated = 0
+        for path in find_hike_files(self.directory):
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if path in self.files and self.files[path][0] == signature:
+                continue
+            self.update_file(path, signature)
+            updated += 1
+        for path in set(self.files) - seen:
+            _, trek, stats = self.files.pop(path)
+            self._apply(trek, stats, -1)
+            updated += 1
+        if updated:
+            self.save()
+        return updated
+
+    def update_file(self, path, signature=None, hike_data=None):
+        """
+        Заменяет статистику одного файла (например, сразу после сохранения похода).
+        """
+        if path in self.files:
+            _, trek, stats = self.files.pop(path)
+            self._apply(trek, stats, -1)
+        try:
+            if hike_data is None:
+                with open(path, "r", encoding="utf-8") as file:
+                    hike_data = json.load(file)
+            trek = str(hike_data.get('hike_name', ''))
+            stats = hike_day_stats(hike_data)
+            if signature is None:
+                stat = os.stat(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return
+        self.files[path] = (signature, trek, stats)
+        self._apply(trek, stats, 1)
+
+    def typical_days(self, trek):
+        """
+        Самая частая длительность похода в архиве или None.
+        """
+        lengths = self.treks.get(trek, {}).get("lengths")
+        return max(lengths, key=lambda days: (lengths[days], days)) if lengths else None
+
+    def fit(self, trek):
+        """
+        Распределения расходов для трека: {"trek", "hikes", "whole_archive", "params"}.
+        Не зависит от статистики архива после вызова, поэтому симуляцию можно
+        запускать в другом потоке (simulate_plan).
+        """
+        stats = self.treks.get(trek)
+        whole_archive = stats is None or stats["days"] < MIN_TREK_DAYS
+        if whole_archive:
+            # Мало данных по этому треку: берём дневные расходы всех походов архива
+            stats = self.total
+        return {"trek": trek, "hikes": stats["hikes"], "whole_archive": whole_archive,
+                "params": fit_categories(stats)}
+
+    def plan(self, trek, days, simulations=None, levels=DEFAULT_LEVELS, workers=None, seed=None):
+        """
+        Рекомендуемый взнос на человека для похода trek на days дней (см. simulate_plan).
+        """
+        return simulate_plan(self.fit(trek), days, simulations, levels, workers, seed)
+
+
+def simulate_plan(fitted, days, simulations=None, levels=DEFAULT_LEVELS, workers=None, seed=None):
+    """
+    Рекомендуемый взнос на человека по распределениям BudgetPlanner.fit.
+    simulations по умолчанию - DEFAULT_SIMULATIONS с NumPy и PYTHON_SIMULATIONS без него.
+    Возвращает {"trek", "days", "hikes", "whole_archive", "simulations", "mean",
+    "levels": [(уровень, взнос)], "categories": {категория: средний расход за поход}, "elapsed"}.
+    Бросает ValueError, если в архиве нет расходов.
+    """
+    started = time.perf_counter()
+    params = fitted["params"]
+    if not params or days <= 0:
+        raise ValueError("В архиве нет расходов для расчёта взноса")
+    if simulations is None:
+        simulations = DEFAULT_SIMULATIONS if np is not None else PYTHON_SIMULATIONS
+    categories = {category: p * math.exp(mu + sigma * sigma / 2) * days
+                  for category, (p, mu, sigma) in params.items()}
+    totals = simulate(list(params.values()), days, simulations, workers, seed)
+    result = []
+    for level in levels:
+        index = min(int(math.ceil(level * len(totals))) - 1, len(totals) - 1)
+        result.append((level, round_deposit(totals[max(index, 0)])))
+    return {"trek": fitted["trek"], "days": days, "hikes": fitted["hikes"], "whole_archive": fitted["whole_archive"],
+            "simulations": len(totals), "mean": sum(totals) / len(totals), "levels": result,
+            "categories": categories, "elapsed": time.perf_counter() - started}
+
+
+def format_plan(plan):
+    """
+    Текст рекомендации взноса для окна и командной строки.
+    """
+    source = "всем походам архива" if plan["whole_archive"] else f"походам \"{plan['trek']}\""
+    lines = [f"{plan['trek']}, {plan['days']} дн.: по {source} ({plan['hikes']}), "
+             f"симуляций {plan['simulations']}",
+             f"Средний расход на человека: {plan['mean']:.0f}"]
+    lines += [f"Взнос с уверенностью {level:.0%}: {deposit}" for level, deposit in plan["levels"]]
+    lines += [f"  {category}: ~{amount:.0f}" for category, amount in
+              sorted(plan["categories"].items(), key=lambda item: -item[1])]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """
+    Расчёт взноса: python planner.py папка --trek Манаслу [--days N] [--simulations N] [--workers K]
+    """
+    parser = argparse.ArgumentParser(description="Планирование взноса на человека по архиву походов")
+    parser.add_argument("folder")
+    parser.add_argument("--trek", required=True)
+    parser.add_argument("--days", type=int, help="по умолчанию - самая частая длительность в архиве")
+    parser.add_argument("--simulations", type=int,
+                        help=f"по умолчанию {DEFAULT_SIMULATIONS}, без NumPy - {PYTHON_SIMULATIONS}")
+    parser.add_argument("--workers", type=int, help="процессов (по умолчанию - число ядер)")
+    parser.add_argument("--levels", type=float, nargs="+", default=list(DEFAULT_LEVELS))
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    planner = BudgetPlanner(args.folder, args.cache_dir)
+    planner.refresh()
+    days = args.days or planner.typical_days(args.trek)
+    if not days:
+        parser.error("укажите --days: трека нет в архиве")
+    try:
+        plan = planner.plan(args.trek, days, args.simulations, args.levels, args.workers, args.seed)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(format_plan(plan))
+    print(f"За {plan['elapsed'] * 1000:.0f} мс ({'NumPy' if np is not None else 'без NumPy'})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
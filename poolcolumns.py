@@ -0,0 +1,45 @@
+from PyQt6.QtWidgets import QTableWidgetItem
+
+# Значки свёрнутого и развёрнутого фонда в заголовке столбца
+COLLAPSED_MARK = "▸"
+EXPANDED_MARK = "▾"
+
+
+class PoolColumns:
+    """
+    Сворачиваемые столбцы фондов в таблице похода.
+    Щелчок по заголовку фонда скрывает или показывает столбцы его участников и вложенных фондов.
+    """
+
+    def __init__(self, table, model, first_col=1):
+        self.table = table
+        self.model = model
+        self.first_col = first_col
+        self.collapsed = set()
+        table.horizontalHeader().sectionClicked.connect(self.toggle)
+        self.update_headers()
+
+    def toggle(self, col):
+        index = col - self.first_col
+        if not self.model.is_pool(index):
+            return
+        if index in self.collapsed:
+            self.collapsed.discard(index)
+        else:
+            self.collapsed.add(index)
+        self.apply()
+
+    def apply(self):
+        hidden = set()
+        for pool in self.collapsed:
+            hidden.update(self.model.descendants(pool))
+        for index in range(len(self.model.participants)):
+            self.table.setColumnHidden(index + self.first_col, index in hidden)
+        self.update_headers()
+
+    def update_headers(self):
+        for index, participant in enumerate(self.model.participants):
+            name = participant['name']
+            if self.model.is_pool(index):
+                name = f"{COLLAPSED_MARK if index in self.collapsed else EXPANDED_MARK} {name}"
+            self.table.setHorizontalHeaderItem(index + self.first_col, QTableWidgetItem(name))
@@ -0,0 +1,81 @@
+import bisect
+
+# Присутствие участника хранится в поле presence: список отрезков дней [первый, последний]
+# (номера дней с нуля, включительно). Нет поля - участник весь поход в группе.
+
+
+def normalize_intervals(intervals, days):
+    """
+    Сортирует, обрезает по длине похода и склеивает отрезки присутствия.
+    Возвращает список [первый, последний] или None, если участник в группе все дни.
+    """
+    if intervals is None:
+        return None
+    clipped = []
+    for interval in intervals:
+        first, last = int(interval[0]), int(interval[1])
+        first, last = max(first, 0), min(last, days - 1)
+        if first <= last:
+            clipped.append([first, last])
+    clipped.sort()
+    merged = []
+    for first, last in clipped:
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    if days > 0 and merged == [[0, days - 1]]:
+        return None
+    return merged
+
+
+def parse_intervals(text, days):
+    """
+    Разбирает дни присутствия вида "1-5, 9, 12-14" (дни с единицы).
+    Пустая строка - весь поход. Бросает ValueError при неверной записи.
+    """
+    if not text.strip():
+        return None
+    intervals = []
+    for part in text.replace(";", ",").split(","):
+        if not part.strip():
+            continue
+        first, _, last = part.partition("-")
+        try:
+            first = int(first.strip())
+            last = int(last.strip()) if last.strip() else first
+        except ValueError:
+            raise ValueError(f"Неверные дни: {part.strip()}")
+        if not 1 <= first <= last <= days:
+            raise ValueError(f"Дни {part.strip()} вне похода (1-{days})")
+        intervals.append([first - 1, last - 1])
+    return normalize_intervals(intervals, days)
+
+
+def format_intervals(intervals):
+    """
+    Возвращает отрезки присутствия текстом для правки ("1-5, 9").
+    """
+    if intervals is None:
+        return ""
+    return ", ".join(f"{first + 1}" if first == last else f"{first + 1}-{last + 1}"
+                     for first, last in intervals)
+
+
+def contains(intervals, day):
+    """
+    Проверяет, попадает ли день в отрезки присутствия (двоичный поиск по началам).
+    """
+    if intervals is None:
+        return True
+    position = bisect.bisect_right(intervals, [day, float("inf")]) - 1
+    return position >= 0 and intervals[position][1] >= day
+
+
+def count_days(intervals, days):
+    """
+    Число дней присутствия.
+    """
+    if intervals is None:
+        return days
+    return sum(last - first + 1 for first, last in intervals)
@@ -0,0 +1,97 @@
+import os, csv, json
+from cellparser import parse_amount
+from hikemodel import POOL_NAME, POOL_KIND, is_pool
+
+# Взнос участника по умолчанию, рупий
+DEFAULT_PAYMENT = 20000
+# Наибольшее число участников одного похода
+MAX_PARTICIPANTS = 1000
+
+
+def _row_participant(row):
+    """
+    Участник из строки списка: имя, необязательные взнос и связка. Пустые строки - None.
+    """
+    cells = [cell.strip() for cell in row]
+    if not cells or not cells[0]:
+        return None
+    payment = DEFAULT_PAYMENT
+    if len(cells) > 1 and cells[1]:
+        payment = int(round(parse_amount(cells[1])))
+    participant = {"name": cells[0], "payment": payment}
+    if len(cells) > 2 and cells[2]:
+        participant["team"] = cells[2]
+    return participant
+
+
+def read_roster(path):
+    """
+    Читает список участников из файла.
+
+    CSV: имя, взнос и связка в столбцах (разделитель ; , или табуляция, заголовок необязателен).
+    TXT: одно имя в строке, взнос по умолчанию.
+    JSON: список {"name", "payment"} или файл похода (берутся его участники без фондов).
+    Бросает ValueError с номером строки, если взнос не разобран.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        if isinstance(data, dict):
+            data = [p for p in data.get('participants', []) if not is_pool(p)]
+        participants = [_row_participant([str(p.get('name', '')), str(p.get('payment', DEFAULT_PAYMENT))])
+                        for p in data if str(p.get('name', '')).strip()]
+    else:
+        participants = _read_rows(path, ext)
+    if len(participants) > MAX_PARTICIPANTS:
+        raise ValueError(f"в списке {len(participants)} участников, допустимо не больше {MAX_PARTICIPANTS}")
+    return participants
+
+
+def _read_rows(path, ext):
+    with open(path, "r", encoding="utf-8-sig", newline="") as file:
+        text = file.read()
+    if ext == ".txt":
+        rows = [[line] for line in text.splitlines()]
+    else:
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=";,\t")
+        except csv.Error:
+            dialect = csv.excel
+        rows = list(csv.reader(text.splitlines(), dialect))
+
+    participants = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            participant = _row_participant(row)
+        except ValueError:
+            if number == 1:
+                # Первая строка с нечисловым взносом - заголовок
+                continue
+            raise ValueError(f"строка {number}: неверный взнос {row[1]!r}")
+        if participant is not None:
+            participants.append(participant)
+    return participants
+
+
+def build_pools(participants):
+    """
+    Достраивает список участников фондами: для каждой связки (поле team) - столбец
+    фонда связки, в конце - общак. Участники связки и фонды связок ссылаются
+    на свой фонд полем parent. Возвращает новый список участников.
+    """
+    teams = []
+    for participant in participants:
+        if participant.get("team") and participant["team"] not in teams:
+            teams.append(participant["team"])
+    first_team = len(participants)
+    root = first_team + len(teams)
+    result = []
+    for participant in participants:
+        member = {key: value for key, value in participant.items() if key != "team"}
+        if participant.get("team"):
+            member["parent"] = first_team + teams.index(participant["team"])
+        result.append(member)
+    result.extend({"name": f"Связка {name}", "payment": 0, "kind": POOL_KIND, "parent": root} for name in teams)
+    result.append({"name": POOL_NAME, "payment": 0})
+    return result
@@ -0,0 +1,268 @@
+import os, re, sys, json, time, pickle, bisect, argparse, unicodedata
+from journal import ExpenseJournal
+from filecache import DEFAULT_CACHE_DIR
+from migrate import find_hike_files
+
+# Версия формата сохранённого индекса архива
+INDEX_VERSION = 1
+# Имя файла индекса архива в папке кэша
+ARCHIVE_INDEX_FILE = "search_index.idx"
+
+# Кириллица приводится к латинице, чтобы "Тадапани" находилось по "Tadapani" и наоборот
+TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya",
+})
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize(word):
+    """
+    Приводит слово к форме для индекса: нижний регистр, без диакритики, кириллица латиницей.
+    """
+    # NFKD отделяет диакритические знаки (é -> e, й -> и), они отбрасываются
+    word = unicodedata.normalize("NFKD", word.lower())
+    word = "".join(ch for ch in word if not unicodedata.combining(ch))
+    return word.translate(TRANSLIT)
+
+
+def tokenize(text):
+    """
+    Возвращает нормализованные слова текста без повторов.
+    """
+    return sorted({normalize(word) for word in WORD_RE.findall(text or "")} - {""})
+
+
+def entry_document(entry):
+    """
+    Возвращает текст записи для поиска: категория, исходный текст ячейки и заметка.
+    """
+    return " ".join(str(part) for part in (entry.get("category"), entry.get("text"), entry.get("note"))
+                    if part)
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс: слово -> множество документов.
+    Документы добавляются и удаляются по одному, без перестройки индекса.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}  # документ -> его слова
+        self.vocabulary = []  # отсортированные слова для поиска по префиксу
+
+    def add(self, doc_id, text):
+        if doc_id in self.documents:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        self.documents[doc_id] = tokens
+        for token in tokens:
+            docs = self.postings.get(token)
+            if docs is None:
+                docs = self.postings[token] = set()
+                bisect.insort(self.vocabulary, token)
+            docs.add(doc_id)
+
+    def remove(self, doc_id):
+        for token in self.documents.pop(doc_id, ()):
+            docs = self.postings.get(token)
+            if docs is None:
+                continue
+            docs.discard(doc_id)
+            if not docs:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+
+    def _prefix_docs(self, prefix):
+        docs = set()
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            docs |= self.postings[token]
+        return docs
+
+    def search(self, query):
+        """
+        Возвращает документы, в которых есть слова, начинающиеся с каждого слова запроса
+        ("чаев" находит "чаевые", поиск работает по мере ввода).
+        """
+        words = {normalize(word) for word in WORD_RE.findall(query or "")} - {""}
+        if not words:
+            return set()
+        sets = sorted((self._prefix_docs(word) for word in words), key=len)
+        result = set(sets[0])
+        for docs in sets[1:]:
+            if not result:
+                break
+            result &= docs
+        return result
+
+
+def _match(entry, hike=None):
+    match = {"id": entry["id"], "day": entry["day"], "participant": entry["participant"],
+             "category": entry.get("category", ""), "amount": entry.get("amount", 0),
+             "note": entry.get("note", "")}
+    if hike is not None:
+        match["hike"] = hike
+    return match
+
+
+def _sort_matches(matches):
+    return sorted(matches, key=lambda m: (m.get("hike", ""), m["day"], m["participant"], m["id"]))
+
+
+class HikeSearchIndex:
+    """
+    Поисковый индекс записей одного похода.
+    Обновляется по уведомлениям журнала при каждой правке.
+    """
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.index = InvertedIndex()
+        self.entries = {}
+        self._on_journal_changed(journal.entries, ())
+        journal.listeners.append(self._on_journal_changed)
+
+    def _on_journal_changed(self, added, removed):
+        for entry in removed:
+            self.index.remove(entry["id"])
+            self.entries.pop(entry["id"], None)
+        for entry in added:
+            self.entries[entry["id"]] = entry
+            self.index.add(entry["id"], entry_document(entry))
+
+    def search(self, query):
+        """
+        Возвращает найденные записи: день, участник, категория, сумма, заметка.
+        """
+        return _sort_matches(_match(self.entries[doc_id]) for doc_id in self.index.search(query))
+
+
+class ArchiveSearchIndex:
+    """
+    Поисковый индекс по всем файлам походов в папке архива.
+
+    Индекс хранится в папке кэша; при обновлении перечитываются только файлы,
+    у которых изменились время изменения или размер.
+    """
+
+    def __init__(self, directory, cache_dir=DEFAULT_CACHE_DIR):
+        self.directory = os.path.abspath(directory)
+        self.index_path = os.path.join(cache_dir, ARCHIVE_INDEX_FILE)
+        self.files = {}  # путь -> (подпись файла, {id записи: найденная запись})
+        self.index = InvertedIndex()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "rb") as file:
+                state = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return
+        if state.get("version") == INDEX_VERSION and state.get("directory") == self.directory:
+            self.files, self.index = state["files"], state["index"]
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "wb") as file:
+                pickle.dump({"version": INDEX_VERSION, "directory": self.directory,
+                             "files": self.files, "index": self.index},
+                            file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # Индекс необязателен: при ошибке записи он будет построен заново
+            pass
+
+    def refresh(self):
+        """
+        Переиндексирует новые и изменённые файлы, удаляет из индекса пропавшие.
+        Возвращает количество переиндексированных файлов.
+        """
+        seen = set()
+        updated = 0
+        for path in find_hike_files(self.directory):
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if path in self.files and self.files[path][0] == signature:
+                continue
+            self.update_file(path, signature)
+            updated += 1
+        for path in set(self.files) - seen:
+            self._remove_file(path)
+            updated += 1
+        if updated:
+            self.save()
+        return updated
+
+    def update_file(self, path, signature=None, hike_data=None):
+        """
+        Переиндексирует один файл (например, сразу после сохранения похода).
+        """
+        self._remove_file(path)
+        try:
+            if hike_data is None:
+                with open(path, "r", encoding="utf-8") as file:
+                    hike_data = json.load(file)
+                journal = ExpenseJournal(hike_data)
+            else:
+                journal = ExpenseJournal(dict(hike_data))
+            if signature is None:
+                stat = os.stat(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return
+        matches = {}
+        for entry in journal.entries:
+            matches[entry["id"]] = _match(entry, path)
+            self.index.add((path, entry["id"]), entry_document(entry))
+        self.files[path] = (signature, matches)
+
+    def _remove_file(self, path):
+        _, matches = self.files.pop(path, (None, {}))
+        for entry_id in matches:
+            self.index.remove((path, entry_id))
+
+    def search(self, query):
+        """
+        Возвращает найденные записи всех походов архива (с путём к файлу похода).
+        """
+        return _sort_matches(self.files[path][1][entry_id] for path, entry_id in self.index.search(query))
+
+
+def main(argv=None):
+    """
+    Поиск по архиву походов: python search.py папка запрос
+    """
+    parser = argparse.ArgumentParser(description="Поиск записей по архиву походов")
+    parser.add_argument("folder")
+    parser.add_argument("query")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    archive = ArchiveSearchIndex(args.folder, args.cache_dir)
+    archive.refresh()
+    started = time.perf_counter()
+    matches = archive.search(args.query)
+    elapsed = (time.perf_counter() - started) * 1000
+    for match in matches:
+        note = f" ({match['note']})" if match["note"] else ""
+        print(f"{os.path.relpath(match['hike'], archive.directory)}: день {match['day'] + 1}, "
+              f"участник {match['participant'] + 1}, {match['category']} {match['amount']:g}{note}")
+    print(f"Найдено: {len(matches)} за {elapsed:.1f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
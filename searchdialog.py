@@ -0,0 +1,103 @@
+import os
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QComboBox, QListWidget,
+                             QListWidgetItem, QLabel, QPushButton, QFileDialog)
+from PyQt6.QtCore import Qt
+
+# Не показывать больше стольких найденных записей
+MAX_RESULTS = 500
+
+
+class SearchDialog(QDialog):
+    def __init__(self, parent):
+        """
+        Окно поиска записей по категории и заметке: в открытом походе или во всём архиве.
+        Двойной клик по результату открывает поход и выделяет ячейку записи.
+        """
+        super().__init__(parent)
+        self.window = parent
+        self.archive_index = None
+        self.setWindowTitle("Поиск записей")
+        self.resize(600, 400)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        query_layout = QHBoxLayout()
+        self.query_edit = QLineEdit(self)
+        self.query_edit.setPlaceholderText("Например: носильщик Тадапани")
+        self.query_edit.textChanged.connect(self.run_search)
+        query_layout.addWidget(self.query_edit)
+        self.scope_combo = QComboBox(self)
+        self.scope_combo.addItems(["Текущий поход", "Архив походов"])
+        self.scope_combo.currentIndexChanged.connect(self.run_search)
+        query_layout.addWidget(self.scope_combo)
+        self.folder_button = QPushButton("Папка архива...", self)
+        self.folder_button.clicked.connect(self.choose_archive_folder)
+        query_layout.addWidget(self.folder_button)
+        layout.addLayout(query_layout)
+
+        self.results_list = QListWidget(self)
+        self.results_list.itemActivated.connect(self.open_result)
+        layout.addWidget(self.results_list)
+        self.status_label = QLabel("", self)
+        layout.addWidget(self.status_label)
+
+        if self.window.current_works_widget() is None:
+            self.scope_combo.setCurrentIndex(1)
+
+    def choose_archive_folder(self):
+        """
+        Выбирает папку архива походов и строит (или обновляет) её индекс.
+        """
+        folder = QFileDialog.getExistingDirectory(self, "Папка архива походов",
+                                                  self.window.settings['Search'].get('archive_dir', ''))
+        if folder:
+            self.window.settings['Search']['archive_dir'] = folder
+            self.window.save_ini_file()
+            self.archive_index = None
+            self.scope_combo.setCurrentIndex(1)
+            self.run_search()
+
+    def get_archive_index(self):
+        """
+        Возвращает индекс архива, перечитывая только изменённые файлы.
+        """
+        folder = self.window.settings['Search'].get('archive_dir', '')
+        if not folder or not os.path.isdir(folder):
+            return None
+        if self.archive_index is None:
+            self.archive_index = self.window.get_archive_index(folder)
+            self.archive_index.refresh()
+        return self.archive_index
+
+    def run_search(self, *args):
+        self.results_list.clear()
+        query = self.query_edit.text().strip()
+        if not query:
+            self.status_label.setText("")
+            return
+        if self.scope_combo.currentIndex() == 0:
+            works_widget = self.window.current_works_widget()
+            if works_widget is None:
+                self.status_label.setText("Нет открытого похода")
+                return
+            matches = works_widget.search_index.search(query)
+        else:
+            archive_index = self.get_archive_index()
+            if archive_index is None:
+                self.status_label.setText("Выберите папку архива походов")
+                return
+            matches = archive_index.search(query)
+
+        for match in matches[:MAX_RESULTS]:
+            hike = os.path.basename(match["hike"]) + ": " if "hike" in match else ""
+            note = f" - {match['note']}" if match["note"] else ""
+            item = QListWidgetItem(f"{hike}день {match['day'] + 1}, участник {match['participant'] + 1}: "
+                                   f"{match['category']} {round(match['amount'])}{note}")
+            item.setData(Qt.ItemDataRole.UserRole, match)
+            self.results_list.addItem(item)
+        self.status_label.setText(f"Найдено: {len(matches)}")
+
+    def open_result(self, item):
+        self.window.open_search_match(item.data(Qt.ItemDataRole.UserRole))
@@ -0,0 +1,286 @@
+import sys, time, random, argparse
+
+try:
+    import numpy as np
+except ImportError:
+    # Без NumPy доли считаются тем же разреженным умножением в цикле по ненулевым элементам
+    np = None
+
+# Правила деления записи (поле split записи журнала)
+SPLIT_EQUAL = "equal"  # поровну между members (по умолчанию - все участники)
+SPLIT_WEIGHTS = "weights"  # пропорционально weights между members
+SPLIT_PRESENT = "present"  # поровну между присутствовавшими в этот день
+SPLIT_RULES = (SPLIT_EQUAL, SPLIT_WEIGHTS, SPLIT_PRESENT)
+SPLIT_TITLES = {SPLIT_EQUAL: "Поровну на всех", SPLIT_WEIGHTS: "По весам",
+                SPLIT_PRESENT: "Поровну на присутствующих"}
+
+
+def make_split(rule, members=None, weights=None):
+    """
+    Возвращает компактное описание деления для записи журнала.
+    Список участников хранится только если он задан явно.
+    """
+    if rule not in SPLIT_RULES:
+        raise ValueError(f"Неизвестное правило деления: {rule}")
+    split = {"rule": rule}
+    if members is not None:
+        split["members"] = list(members)
+    if rule == SPLIT_WEIGHTS:
+        if weights is None or members is None or len(weights) != len(members):
+            raise ValueError("Для деления по весам нужны участники и веса")
+        if any(weight < 0 for weight in weights) or not sum(weights):
+            raise ValueError("Веса должны быть неотрицательными и не все нулевые")
+        split["weights"] = list(weights)
+    return split
+
+
+def parse_weights(text, names):
+    """
+    Разбирает веса вида "Иван=2; Пётр=1" по именам участников.
+    Возвращает ([индексы], [веса]); бросает ValueError при неизвестном имени или весе.
+    """
+    index = {name.strip().lower(): i for i, name in enumerate(names)}
+    members, weights = [], []
+    for part in text.replace(",", ";").split(";"):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        if name.strip().lower() not in index:
+            raise ValueError(f"Неизвестный участник: {name.strip()}")
+        try:
+            weight = float(value.strip()) if value.strip() else 1.0
+        except ValueError:
+            raise ValueError(f"Неверный вес: {value.strip()}")
+        members.append(index[name.strip().lower()])
+        weights.append(weight)
+    return members, weights
+
+
+def split_shares(split, people, present=None):
+    """
+    Возвращает доли записи: ([участники], [доли]), доли в сумме дают 1.
+    people - все участники, между которыми делятся общие расходы (без фондов);
+    present - присутствовавшие в день записи (None - все).
+    """
+    members = split.get("members")
+    if members is not None:
+        allowed = set(people)
+        members = [m for m in members if m in allowed]
+    else:
+        members = people
+    if split["rule"] == SPLIT_PRESENT and present is not None:
+        present = set(present)
+        members = [m for m in members if m in present]
+    if split["rule"] == SPLIT_WEIGHTS:
+        weights = dict(zip(split.get("members", []), split.get("weights", [])))
+        values = [weights.get(m, 0) for m in members]
+    else:
+        values = [1] * len(members)
+    total = sum(values)
+    if not total:
+        return [], []
+    pairs = [(m, value / total) for m, value in zip(members, values) if value]
+    return [m for m, _ in pairs], [share for _, share in pairs]
+
+
+class SplitMatrix:
+    """
+    Разреженная матрица распределения: строка - участник, столбец - запись журнала,
+    значение - доля участника в записи. Хранится столбцами (формат CSC):
+    indptr[k]..indptr[k+1] - ненулевые элементы столбца k.
+
+    Нагрузка участников - произведение матрицы на вектор сумм записей.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.indptr = [0]
+        self.indices = []
+        self.data = []
+        self.amounts = []
+        self._arrays = None
+
+    def append(self, rows, shares, amount):
+        self.indices.extend(rows)
+        self.data.extend(shares)
+        self.indptr.append(len(self.indices))
+        self.amounts.append(amount)
+        self._arrays = None
+        return len(self.amounts) - 1
+
+    def set_amount(self, column, amount):
+        self.amounts[column] = amount
+        self._arrays = None
+
+    def dot(self):
+        """
+        Возвращает вектор нагрузки: для каждого участника сумма долей записей.
+        """
+        if np is not None:
+            if self._arrays is None:
+                indptr = np.asarray(self.indptr)
+                self._arrays = (np.asarray(self.indices, dtype=np.int64), np.asarray(self.data, dtype=float),
+                                np.repeat(np.arange(len(self.amounts)), np.diff(indptr)))
+            indices, data, columns = self._arrays
+            amounts = np.asarray(self.amounts, dtype=float)
+            return np.bincount(indices, weights=data * amounts[columns], minlength=self.size).tolist()
+        result = [0.0] * self.size
+        indptr, indices, data = self.indptr, self.indices, self.data
+        for column, amount in enumerate(self.amounts):
+            if amount:
+                for k in range(indptr[column], indptr[column + 1]):
+                    result[indices[k]] += data[k] * amount
+        return result
+
+
+class SplitEngine:
+    """
+    Справедливое распределение общих расходов похода по правилам деления записей.
+
+    Запись без правила целиком ложится на участника своего столбца (расходы фондов -
+    на сам фонд). Матрица дополняется по уведомлениям журнала; удалённая запись
+    получает нулевую сумму, а матрица сжимается при следующей перестройке.
+    Нагрузка пересчитывается при первом запросе после изменения.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.rebuild()
+        model.journal.listeners.append(self._on_journal_changed)
+
+    def people(self):
+        return [i for i in range(len(self.model.participants)) if not self.model.is_pool(i)]
+
+    def present(self, day):
+        """
+        Участники, присутствовавшие в день (None - все). Переопределяется учётом присутствия.
+        """
+        presence = getattr(self.model, "present", None)
+        return presence(day) if presence is not None else None
+
+    def rebuild(self):
+        """
+        Строит матрицу заново по всем записям (например, после изменения состава участников).
+        """
+        self.matrix = SplitMatrix(len(self.model.participants))
+        self.columns = {}  # id записи -> столбец матрицы
+        self.shared = set()  # id записей с правилом деления
+        self.spent = [0.0] * self.matrix.size  # расходы, записанные в столбец (без знака)
+        self._people = self.people()
+        self._burdens = None
+        self._credits = None
+        self._on_journal_changed(self.model.journal.entries, ())
+
+    def _on_journal_changed(self, added, removed):
+        self._burdens = None
+        self._credits = None
+        for entry in removed:
+            column = self.columns.pop(entry["id"], None)
+            if column is not None:
+                self.matrix.set_amount(column, 0.0)
+                self.shared.discard(entry["id"])
+                self.spent[entry["participant"]] -= max(-entry["amount"], 0.0)
+        for entry in added:
+            participant = entry["participant"]
+            if not 0 <= participant < self.matrix.size:
+                continue
+            rows, shares = [participant], [1.0]
+            split = entry.get("split")
+            if split:
+                present = self.present(entry["day"])
+                rows, shares = split_shares(split, self._people, present)
+                if not rows:
+                    rows, shares = [participant], [1.0]
+            if split:
+                self.shared.add(entry["id"])
+            # Нагрузка - только расходы (со сменой знака), пополнения её не дают
+            amount = max(-entry["amount"], 0.0)
+            self.spent[participant] += amount
+            self.columns[entry["id"]] = self.matrix.append(rows, shares, amount)
+        if len(self.matrix.amounts) > 2 * len(self.columns) + 1024:
+            self.rebuild()
+
+    def burdens(self):
+        """
+        Возвращает нагрузку каждого столбца: его доля во всех расходах похода.
+        """
+        if self._burdens is None:
+            self._burdens = self.matrix.dot()
+        return list(self._burdens)
+
+    def credit(self, participant):
+        """
+        Поправка к остатку столбца по правилам деления: расходы, записанные в его столбец,
+        минус его доля во всех расходах; у фонда - сумма поправок его поддерева.
+        Без записей с делением - ноль.
+        """
+        if not self.shared:
+            return 0.0
+        if self._credits is None:
+            burdens, parents = self.burdens(), self.model.parents
+            credits = [0.0] * self.matrix.size
+            for index in range(self.matrix.size):
+                own = self.spent[index] - burdens[index]
+                node = index
+                while node is not None:
+                    credits[node] += own
+                    node = parents[node]
+            self._credits = credits
+        return self._credits[participant]
+
+    def shares(self):
+        """
+        Возвращает [(индекс, имя, нагрузка)] по участникам без фондов.
+        """
+        burdens = self.burdens()
+        return [(i, self.model.participants[i]['name'], burdens[i]) for i in self.people()]
+
+
+def run_benchmark(num_participants=300, num_days=30, entries_per_day=20):
+    """
+    Замеряет пересчёт долей всех участников: записи общака делятся поровну,
+    по весам и по присутствию. Возвращает (число записей, время построения, время пересчёта).
+    """
+    from hikeutil import make_synthetic_hike
+    from hikemodel import HikeModel
+    hike = make_synthetic_hike(num_participants, num_days, 0)
+    model = HikeModel(hike)
+    pool = len(hike['participants']) - 1
+    people = list(range(num_participants))
+    generator = random.Random(1)
+    records = []
+    for day in range(num_days):
+        for n in range(entries_per_day):
+            rule = SPLIT_RULES[n % 3]
+            if rule == SPLIT_WEIGHTS:
+                members = generator.sample(people, 10)
+                split = make_split(rule, members, [generator.randint(1, 3) for _ in members])
+            else:
+                split = make_split(rule)
+            records.append((day, pool, "Обед", -1000.0, {"split": split}))
+    model.journal.record_batch(records)
+    started = time.perf_counter()
+    engine = SplitEngine(model)
+    built = time.perf_counter() - started
+    started = time.perf_counter()
+    engine.burdens()
+    return len(records), built, time.perf_counter() - started
+
+
+def main(argv=None):
+    """
+    Бенчмарк распределения: python splits.py [--participants N] [--days N] [--entries N]
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк распределения общих расходов")
+    parser.add_argument("--participants", type=int, default=300)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--entries", type=int, default=20, help="записей общака в день")
+    args = parser.parse_args(argv)
+    count, built, elapsed = run_benchmark(args.participants, args.days, args.entries)
+    print(f"Записей: {count}, построение матрицы: {built * 1000:.0f} мс, "
+          f"пересчёт долей: {elapsed * 1000:.1f} мс ({'NumPy' if np is not None else 'без NumPy'})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,25 @@
 from PyQt6.QtWidgets import (QWidget, QTableWidget, QTableWidgetItem, QVBoxLayout, 
                            QLabel, QHeaderView, QHBoxLayout)
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
+from hikemodel import HikeModel
+from poolcolumns import PoolColumns
+from cellparser import parse_amount
 
 class StatisticWidget(QWidget):
-    def __init__(self, hike_data, table_data, parent=None):
+    def __init__(self, hike_data, table_data, parent=None, model=None):
+        """
+        Окно статистики похода. Если передана модель открытого похода,
+        статистика обновляется по её событиям без пересчёта всех расходов.
+        """
         super().__init__(parent)
         self.hike_data = hike_data
         self.table_data = table_data
+        self.model = model if model is not None else HikeModel(hike_data)
+        self.stats_labels = {}
+        self._cards_scheduled = False
         self.setWindowTitle(f"Статистика похода: {self.hike_data['hike_name']}")
         self.init_ui()
+        self.destroyed.connect(self.model.subscribe(self._on_model_event))
 
     def init_ui(self):
         self.main_layout = QVBoxLayout(self)
@@ -74,48 +85,17 @@ class StatisticWidget(QWidget):
             header.setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
         
         self.main_layout.addWidget(self.table)
-
-        # Initialize arrays for statistics
-        num_participants = len(self.hike_data['participants'])
-        participant_expenses = [0] * num_participants
-        participant_initial = [p['payment'] for p in self.hike_data['participants']]
-
-        # Calculate total expenses from expenses_data
-        for day_idx, day_expenses in enumerate(self.hike_data['expenses_data']):
-            for participant_idx, expense in enumerate(day_expenses):
-                try:
-                    participant_expenses[participant_idx] += float(expense)
-                except ValueError:
-                    pass
+        # Фонды связок сворачиваются так же, как в таблице расходов
+        self.pool_columns = PoolColumns(self.table, self.model)
 
         # Create layout for participant statistics columns
         stats_layout = QHBoxLayout()
         
-        # Calculate and show statistics for each participant
-        for col in range(1, num_cols - 1):
-            participant_idx = col - 1
-            participant_name = self.table_data.horizontalHeaderItem(col).text()
-            initial_amount = participant_initial[participant_idx]
-            total_expenses = abs(participant_expenses[participant_idx])
-            days_count = self.hike_data['track_days']
-            daily_average = total_expenses / days_count if days_count > 0 else 0
-            
-            # Calculate final balance: initial payment - total expenses
-            final_balance = initial_amount + participant_expenses[participant_idx]
-            
-            # Create frame for participant statistics
-            participant_stats = QLabel(
-                f"<div style='background-color: #333333; padding: 10px; margin: 5px; "
-                f"border-radius: 5px; min-width: 200px;'>"
-                f"<h4 style='text-align: center; color: white;'>{participant_name}</h4>"
-                f"<hr style='border-color: #666666;'>"
-                f"<p style='color: white;'>Внесено в общак: {initial_amount:.0f}</p>"
-                f"<p style='color: white;'>Общие расходы: {total_expenses:.0f}</p>"
-                f"<p style='color: white;'>Расход в день: {daily_average:.0f}</p>"
-                f"<p style='color: white;'>Баланс: {final_balance:.0f}</p>"
-                f"</div>"
-            )
-            
+        # Show statistics for each participant (totals are kept by the model; pools are skipped)
+        for row in self.model.statistics():
+            participant_idx = row["index"]
+            participant_stats = QLabel(self._stats_html(participant_idx))
+            self.stats_labels[participant_idx] = participant_stats
             stats_layout.addWidget(participant_stats)
         
         # Add statistics layout to main layout
@@ -124,6 +104,76 @@ class StatisticWidget(QWidget):
         stats_container.setStyleSheet("background-color: #4A4A4A;")
         self.main_layout.addWidget(stats_container)
 
+    def _stats_html(self, participant_idx):
+        """
+        Возвращает карточку статистики участника.
+        """
+        stats = self.model.participant_statistics(participant_idx)
+        # Доля участника в общих расходах по правилам деления записей
+        if "share" in stats:
+            shared = f"<p style='color: white;'>Доля в расходах: {stats['share']:.0f}</p>"
+        else:
+            shared = ""
+        participant_name = stats['name']
+        present = ""
+        if stats['present_days'] != self.model.days:
+            present = f"<p style='color: white;'>Дней в походе: {stats['present_days']}</p>"
+        carried_in = self.model.participants[participant_idx].get('carried_in', 0)
+        carried = f"<p style='color: white;'>В т.ч. остаток прошлых походов: {carried_in:.0f}</p>" if carried_in else ""
+        return (
+            f"<div style='background-color: #333333; padding: 10px; margin: 5px; "
+            f"border-radius: 5px; min-width: 200px;'>"
+            f"<h4 style='text-align: center; color: white;'>{participant_name}</h4>"
+            f"<hr style='border-color: #666666;'>"
+            f"<p style='color: white;'>Внесено в общак: {stats['payment']:.0f}</p>"
+            f"{carried}"
+            f"<p style='color: white;'>Общие расходы: {stats['expenses']:.0f}</p>"
+            f"<p style='color: white;'>Расход в день: {stats['daily_average']:.0f}</p>"
+            f"{present}"
+            f"<p style='color: white;'>Баланс: {stats['balance']:.0f}</p>"
+            f"{shared}"
+            f"</div>"
+        )
+
+    def _refresh_cards(self):
+        self._cards_scheduled = False
+        for participant_idx, label in self.stats_labels.items():
+            label.setText(self._stats_html(participant_idx))
+
+    def _on_model_event(self, event):
+        """
+        Обновляет ячейку и карточку участника, затронутые событием модели.
+        """
+        participant_idx = event.get("participant")
+        if event["type"] == "presence_changed":
+            # Присутствие меняет расход в день участника и доли расходов по присутствию
+            if not self._cards_scheduled:
+                self._cards_scheduled = True
+                QTimer.singleShot(0, self._refresh_cards)
+            return
+        if event["type"] in ("entry_added", "entry_removed") and self.model.splits.shared \
+                and not self._cards_scheduled:
+            # Общая запись меняет доли всех участников: карточки обновляются один раз на пакет
+            self._cards_scheduled = True
+            QTimer.singleShot(0, self._refresh_cards)
+        if event["type"] in ("entry_added", "entry_removed"):
+            row = event["day"]
+            if row < self.table.rowCount() - 1:
+                item = QTableWidgetItem(self.model.journal.cell_text(row, participant_idx))
+                item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                item.setForeground(Qt.GlobalColor.white)
+                self.table.setItem(row, participant_idx + 1, item)
+        elif event["type"] == "total_changed":
+            if participant_idx + 1 < self.table.columnCount():
+                item = QTableWidgetItem(str(round(event["total"])))
+                item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                item.setForeground(Qt.GlobalColor.white)
+                self.table.setItem(self.table.rowCount() - 1, participant_idx + 1, item)
+            if participant_idx in self.stats_labels:
+                self.stats_labels[participant_idx].setText(self._stats_html(participant_idx))
+
     def _get_return_message(self, amount):
         """Helper method to generate return/pay message"""
         if amount > 0:
@@ -135,6 +185,6 @@ class StatisticWidget(QWidget):
     def _parse_number(self, text):
         """Helper method to convert string numbers with spaces to float"""
         try:
-            return float(text.replace(" ", ""))
-        except (ValueError, AttributeError):
+            return parse_amount(text)
+        except ValueError:
             return 0.0
\ No newline at end of file
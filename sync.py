@@ -0,0 +1,196 @@
+import os, json, uuid, hashlib, argparse
+from journal import BASE_DEVICE
+from hikemodel import HikeModel
+from hikefile import write_hike
+
+# Поле файла похода с ключом обмена: записывается при первой синхронизации и дальше
+# не меняется, поэтому переименование похода или участников не разрывает обмен
+SYNC_ID_FIELD = "sync_id"
+
+
+def new_device_id():
+    """
+    Создаёт идентификатор устройства для журнала расходов.
+    """
+    return uuid.uuid4().hex[:12]
+
+
+def hike_sync_key(hike_data):
+    """
+    Возвращает ключ похода для обмена журналами: сохранённый в файле SYNC_ID_FIELD,
+    а до первой синхронизации - построенный по названию, дате начала и участникам,
+    поэтому копии одного файла на разных ноутбуках получают одинаковый ключ.
+    """
+    if hike_data.get(SYNC_ID_FIELD):
+        return hike_data[SYNC_ID_FIELD]
+    names = "|".join(p['name'] for p in hike_data.get('participants', []))
+    raw = f"{hike_data.get('hike_name', '')}|{hike_data.get('start_date', '')}|{names}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def ensure_sync_key(hike_data):
+    """
+    Закрепляет ключ обмена в данных похода (при первой синхронизации) и возвращает его.
+    """
+    hike_data[SYNC_ID_FIELD] = hike_sync_key(hike_data)
+    return hike_data[SYNC_ID_FIELD]
+
+
+def sync_journals(first, second):
+    """
+    Обменивает записи между двумя журналами, передавая только то, чего нет у другой стороны.
+    Возвращает (изменённые ячейки первого, изменённые ячейки второго).
+    """
+    to_second = first.delta_since(second.version_vector())
+    to_first = second.delta_since(first.version_vector())
+    return first.merge(to_first), second.merge(to_second)
+
+
+class LoopbackTransport:
+    """
+    Транспорт в памяти: журналы нескольких устройств одного процесса.
+    Используется для проверки синхронизации без файлов и сети.
+    """
+
+    def __init__(self):
+        self.journals = {}
+
+    def register(self, journal):
+        self.journals[journal.device_id] = journal
+
+    def sync(self, journal):
+        """
+        Синхронизирует журнал со всеми зарегистрированными устройствами.
+        Возвращает список ячеек, изменившихся в этом журнале.
+        """
+        changed = set()
+        for device_id, other in self.journals.items():
+            if other is not journal:
+                mine, _ = sync_journals(journal, other)
+                changed.update(mine)
+        return sorted(changed)
+
+
+class FolderTransport:
+    """
+    Обмен журналами через общую папку (флешка, облачный диск).
+
+    Каждое устройство дописывает только свои записи в файл
+    <папка>/<ключ похода>/<устройство>.jsonl и читает из файлов других устройств
+    только записи с номерами больше уже известных.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.offsets = {}  # путь -> позиция, до которой файл уже прочитан
+        self.known = {}  # путь -> записи, прочитанные из файла
+
+    def _read_new(self, path):
+        """
+        Читает записи, дописанные в файл после предыдущего чтения этим транспортом.
+        """
+        entries = self.known.setdefault(path, [])
+        if not os.path.exists(path):
+            return []
+        new_entries = []
+        with open(path, "r", encoding="utf-8") as file:
+            file.seek(self.offsets.get(path, 0))
+            while True:
+                line = file.readline()
+                if not line.endswith("\n"):
+                    # Недописанная последняя строка - заберём при следующей синхронизации
+                    break
+                self.offsets[path] = file.tell()
+                if line.strip():
+                    new_entries.append(json.loads(line))
+        entries.extend(new_entries)
+        return new_entries
+
+    def _hike_dir(self, journal):
+        return os.path.join(self.directory, ensure_sync_key(journal.hike_data))
+
+    def publish(self, journal):
+        """
+        Дописывает в свой файл записи и надгробия текущего устройства, которых там ещё нет.
+        Записи исходного файла публикуются один раз, в файл base.jsonl.
+        Возвращает количество записанных записей.
+        """
+        hike_dir = self._hike_dir(journal)
+        os.makedirs(hike_dir, exist_ok=True)
+        written = 0
+        for device_id in (journal.device_id, BASE_DEVICE):
+            path = os.path.join(hike_dir, f"{device_id}.jsonl")
+            self._read_new(path)
+            published = {entry["id"] for entry in self.known[path]}
+            new_entries = [entry for entry in journal.entries + journal.tombstones
+                           if entry["device"] == device_id and entry["id"] not in published]
+            if not new_entries:
+                continue
+            with open(path, "a", encoding="utf-8") as file:
+                for entry in new_entries:
+                    file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            written += len(new_entries)
+        return written
+
+    def fetch(self, journal):
+        """
+        Читает записи других устройств, которых нет в журнале, и добавляет их.
+        Возвращает список изменившихся ячеек.
+        """
+        hike_dir = self._hike_dir(journal)
+        if not os.path.isdir(hike_dir):
+            return []
+        vector = journal.version_vector()
+        incoming = []
+        for name in sorted(os.listdir(hike_dir)):
+            device_id, ext = os.path.splitext(name)
+            if ext != ".jsonl" or device_id == journal.device_id:
+                continue
+            known = vector.get(device_id, 0)
+            path = os.path.join(hike_dir, name)
+            self._read_new(path)
+            incoming.extend(entry for entry in self.known[path]
+                            if entry["device"] == BASE_DEVICE or entry["seq"] > known)
+        return journal.merge(incoming)
+
+    def sync(self, journal):
+        """
+        Публикует свои записи и забирает чужие. Возвращает список изменившихся ячеек.
+        """
+        self.publish(journal)
+        return self.fetch(journal)
+
+
+def sync_hike_file(hike_data, directory, device_id):
+    """
+    Синхронизирует данные похода через папку без открытия окна программы.
+    Возвращает список изменившихся ячеек; текст ячеек в hike_data обновляется.
+    """
+    # Через модель, чтобы полученные записи попали в журнал аудита
+    journal = HikeModel(hike_data, device_id).journal
+    changed = FolderTransport(directory).sync(journal)
+    for day, participant in changed:
+        hike_data['expenses_data'][day][participant] = journal.cell_text(day, participant)
+    return changed
+
+
+def main(argv=None):
+    """
+    Синхронизация файла похода через папку из командной строки:
+    python sync.py поход.json папка --device ID
+    """
+    parser = argparse.ArgumentParser(description="Синхронизация журнала расходов через папку")
+    parser.add_argument("hike_file")
+    parser.add_argument("folder")
+    parser.add_argument("--device", required=True, help="идентификатор этого устройства")
+    args = parser.parse_args(argv)
+
+    with open(args.hike_file, "r", encoding="utf-8") as file:
+        hike_data = json.load(file)
+    changed = sync_hike_file(hike_data, args.folder, args.device)
+    write_hike(args.hike_file, hike_data)
+    print(f"Обновлено ячеек: {len(changed)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import json, asyncio, shutil
+import pytest
+from hikeutil import make_synthetic_hike
+from apiserver import HikeApi, ApiError, default_device_id
+
+
+def write(path, hike_data):
+    path.write_text(json.dumps(hike_data, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_copies_of_one_hike_get_different_ids(tmp_path):
+    first = write(tmp_path / "first.json", make_synthetic_hike(3, 5, 1))
+    second = str(tmp_path / "second.json")
+    shutil.copy(first, second)
+
+    async def scenario():
+        api = HikeApi("test", flush_interval=0)
+        _, one = await api.handle("POST", "/hikes", {"path": first})
+        _, other = await api.handle("POST", "/hikes", {"path": second})
+        _, again = await api.handle("POST", "/hikes", {"path": first})
+        await api.handle("POST", f"/hikes/{one['id']}/entries",
+                         {"day": 0, "participant": 0, "category": "Обед", "amount": -100})
+        _, first_totals = await api.handle("GET", f"/hikes/{one['id']}/totals", None)
+        _, second_totals = await api.handle("GET", f"/hikes/{other['id']}/totals", None)
+        return one, other, again, first_totals, second_totals
+
+    one, other, again, first_totals, second_totals = run(scenario())
+    assert one["id"] != other["id"] and again["id"] == one["id"]
+    assert first_totals != second_totals
+
+
+def test_open_repairs_old_file(tmp_path):
+    hike_data = make_synthetic_hike(2, 3, 1)
+    hike_data["track_days"] = "3"
+    hike_data["expenses_data"][0][0] = "-1500.0"
+    path = write(tmp_path / "old.json", hike_data)
+
+    async def scenario():
+        api = HikeApi("test", flush_interval=0)
+        _, opened = await api.handle("POST", "/hikes", {"path": path})
+        await api.flush(api.hikes[opened["id"]])
+        return opened
+
+    opened = run(scenario())
+    assert opened["track_days"] == 3
+    saved = json.loads(open(path, encoding="utf-8").read())
+    assert "journal" in saved and saved["schema_version"] == 2
+
+
+def test_unknown_hike_is_not_found():
+    with pytest.raises(ApiError) as error:
+        run(HikeApi("test").handle("GET", "/hikes/missing/totals", None))
+    assert error.value.status == 404
+
+
+def test_default_device_id_is_persisted(tmp_path):
+    settings = str(tmp_path / "init.ini")
+    device_id = default_device_id(settings)
+    assert device_id and device_id != "api"
+    assert default_device_id(settings) == device_id
+    assert HikeApi().device_id != HikeApi().device_id
@@ -0,0 +1,32 @@
+import os
+from attachments import AttachmentStore, attachments_dir, entry_receipts, file_digest
+
+
+def test_same_file_is_stored_once(tmp_path):
+    photo = tmp_path / "photo.jpg"
+    photo.write_bytes(b"receipt" * 1000)
+    copy = tmp_path / "copy.jpg"
+    copy.write_bytes(photo.read_bytes())
+    store = AttachmentStore(str(tmp_path / "hike.json"))
+    digest = store.add(str(photo))
+    assert store.add(str(copy)) == digest == file_digest(str(photo))
+    assert store.has(digest) and os.listdir(os.path.dirname(store.blob_path(digest))) == [digest]
+    assert store.directory == attachments_dir(str(tmp_path / "hike.json"))
+
+
+def test_copy_to_and_unused(tmp_path):
+    first, second = tmp_path / "a.jpg", tmp_path / "b.jpg"
+    first.write_bytes(b"a")
+    second.write_bytes(b"b")
+    store = AttachmentStore(str(tmp_path / "hike.json"))
+    kept, dropped = store.add(str(first)), store.add(str(second))
+    assert store.unused([kept]) == [dropped]
+    other = AttachmentStore(str(tmp_path / "copy.json"))
+    assert store.copy_to(other, [kept]) == 1
+    assert store.copy_to(other, [kept]) == 0
+    assert other.has(kept) and not other.has(dropped)
+
+
+def test_entry_receipts_keep_order_without_repeats():
+    entries = [{"receipts": ["b", "a"]}, {}, {"receipts": ["a", "c"]}]
+    assert entry_receipts(entries) == ["b", "a", "c"]
@@ -0,0 +1,70 @@
+import copy
+from hikemodel import HikeModel
+from audit import AuditLog, journal_state, merkle_root, remember_verified, verify_hike
+from test_sync import small_hike
+
+
+def audited_hike(segment=4, entries=9):
+    model = HikeModel(small_hike(), "a")
+    # Записи из ячеек уже в цепочке, сегмент укорочен до первой контрольной точки
+    model.hike_data["audit"]["segment"] = segment
+    for day in range(entries):
+        model.add_entry(day % 3, day % 2, f"Обед {day}", -10 - day)
+    return model.hike_data
+
+
+def test_journal_state_ignores_order():
+    entries = HikeModel(small_hike(), "a").journal.entries
+    assert journal_state(entries) == journal_state(list(reversed(entries)))
+    assert journal_state(entries[:1]) != journal_state(entries)
+
+
+def test_merkle_root_duplicates_odd_node():
+    hashes = ["11" * 32, "22" * 32, "33" * 32]
+    assert merkle_root(hashes) == merkle_root(hashes + hashes[-1:])
+
+
+def test_chain_closes_segments_and_verifies():
+    hike_data = audited_hike()
+    audit = hike_data["audit"]
+    assert len(audit["checkpoints"]) == len(audit["records"]) // 4
+    problems, verified, checked = verify_hike(hike_data)
+    assert problems == [] and checked == len(audit["records"])
+    assert verified["checkpoint"] == len(audit["checkpoints"])
+
+
+def test_incremental_verification_checks_only_new_records():
+    hike_data = audited_hike()
+    _, verified, _ = verify_hike(hike_data)
+    AuditLog(hike_data).on_journal_changed([], [hike_data["journal"].pop()])
+    problems, _, checked = verify_hike(hike_data, verified)
+    assert problems == []
+    assert checked == len(hike_data["audit"]["records"]) - verified["checkpoint"] * 4
+
+
+def test_tampering_is_detected():
+    hike_data = audited_hike()
+    changed = copy.deepcopy(hike_data)
+    changed["journal"][0]["amount"] = -1
+    assert verify_hike(changed)[0] == ["записи журнала расходов не совпадают с журналом аудита"]
+    changed = copy.deepcopy(hike_data)
+    changed["audit"]["records"][1]["op"] = "remove"
+    assert verify_hike(changed)[0] == ["запись аудита 1 изменена или удалена"]
+    assert verify_hike(small_hike())[0] == ["нет журнала аудита"]
+
+
+def test_rewritten_history_is_reported(tmp_path):
+    hike_path, cache_dir = str(tmp_path / "hike.json"), str(tmp_path / "cache")
+    open(hike_path, "w").close()
+    hike_data = audited_hike(segment=256, entries=600)
+    assert remember_verified(hike_path, hike_data, cache_dir) == []
+    # Запись изменена, а аудит удалён: модель начинает цепочку заново
+    hike_data["journal"][0]["amount"] = -1
+    del hike_data["audit"]
+    rewritten = HikeModel(hike_data, "a").hike_data
+    problems = remember_verified(hike_path, rewritten, cache_dir)
+    assert problems[0].startswith("журнал аудита удалён и начат заново")
+    assert "проверенная история переписана" in problems
+    # Отметку о новой цепочке тоже убрали - помнится проверенная история
+    del rewritten["audit"]["restarted"]
+    assert remember_verified(hike_path, rewritten, cache_dir) == ["проверенная история переписана"]
@@ -0,0 +1,42 @@
+import pytest
+from hikemodel import HikeModel
+from budgets import (BUDGET_OK, BUDGET_OVER, BUDGET_WARN, budget_level, budget_text, format_budgets,
+                     parse_budgets)
+from test_sync import small_hike
+
+
+def test_parse_and_format_budgets():
+    text = "Питание: Обед, Чай = 1 000\nТакси = 500"
+    budgets = parse_budgets(text)
+    assert budgets == [{"name": "Питание", "categories": ["Обед", "Чай"], "amount": 1000.0},
+                       {"name": "Такси", "categories": ["Такси"], "amount": 500.0}]
+    assert format_budgets(budgets) == "Питание: Обед, Чай = 1000\nТакси = 500"
+    with pytest.raises(ValueError, match="строка 2"):
+        parse_budgets("Обед = 100\nЕда: Обед = 200")
+    with pytest.raises(ValueError):
+        parse_budgets("Обед = -5")
+
+
+def test_budget_levels():
+    assert budget_level(100, 1000) == BUDGET_OK
+    assert budget_level(800, 1000) == BUDGET_WARN
+    assert budget_level(1001, 1000) == BUDGET_OVER
+
+
+def test_budgets_follow_journal_and_publish():
+    model = HikeModel(small_hike(), "a")
+    events = []
+    model.subscribe(events.append)
+    model.budgets.set_budgets(parse_budgets("Питание: Обед, Чай = 1000"))
+    assert model.budgets.status(0)["spent"] == 150
+    assert events[-1]["type"] == "budget_changed" and events[-1]["level_changed"]
+    model.add_entry(1, 1, "Обед", -700)
+    assert events[-1]["level"] == BUDGET_WARN and events[-1]["remaining"] == 150
+    # Пополнения и чужие категории бюджет не трогают
+    model.add_entry(1, 1, "Такси", -300)
+    model.add_entry(1, 1, "Пополнение", 500)
+    assert model.budgets.status(0)["spent"] == 850
+    model.add_entry(2, 0, "Чай", -200)
+    assert budget_text(model.budgets.status(0)) == "Бюджет Питание: превышен на 50"
+    model.budgets.set_budgets([])
+    assert "budgets" not in model.hike_data and model.budgets.statuses() == []
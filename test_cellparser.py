@@ -0,0 +1,31 @@
+import pytest
+from cellparser import parse_amount, parse_cell, cell_total, normalize_cell, format_entry, split_cell_total
+
+
+def test_parse_amount_with_separators():
+    assert parse_amount("-1 200,50") == -1200.5
+    assert parse_amount("+3 000") == 3000
+    assert parse_amount(" 15.5 ") == 15.5
+    with pytest.raises(ValueError):
+        parse_amount("сто")
+
+
+def test_parse_cell_entries():
+    assert parse_cell("0") == () and parse_cell("") == ()
+    assert parse_cell("Завтрак -500; Обед +1 200") == (("Завтрак", -500.0, "Завтрак -500"),
+                                                       ("Обед", 1200.0, "Обед +1 200"))
+    assert parse_cell("Ночёвка 2 -500")[0][:2] == ("Ночёвка 2", -500.0)
+    assert parse_cell("Чай дорогой") == (("Чай дорогой", None, "Чай дорогой"),)
+
+
+def test_totals_and_normalize():
+    text = "Завтрак -1 000,5; мусор; Пополнение +300"
+    assert cell_total(text) == pytest.approx(-700.5)
+    assert normalize_cell(text) == "Завтрак -1000.5; мусор; Пополнение +300"
+    assert normalize_cell("0") == "0"
+    assert format_entry("", 50) == "+50"
+
+
+def test_new_parser_agrees_with_old_on_simple_cells():
+    text = "Обед -100; Ужин -250; Пополнение 500"
+    assert cell_total(text) == split_cell_total(text) == 150
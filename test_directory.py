@@ -0,0 +1,61 @@
+import json
+from directory import ParticipantDirectory, person_key
+
+
+def write_hike(path, participants, cells):
+    path.write_text(json.dumps({"hike_name": path.stem, "start_date": "2025-03-20", "end_date": "2025-03-20",
+                                "track_days": 1, "participants": participants, "expenses_data": [cells]},
+                               ensure_ascii=False), encoding="utf-8")
+
+
+def test_person_key_normalizes_spelling():
+    assert person_key("Иван  Петров") == person_key("иван петров")
+    assert person_key("Алёна") == person_key("Алена")
+    assert person_key("Участник 3") is None
+    assert person_key("Общак") is None and person_key("  ") is None
+
+
+def test_complete_by_word_prefixes(tmp_path):
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    write_hike(archive / "a.json", [{"name": "Иван Петров", "payment": 100}, {"name": "Инна", "payment": 100}],
+               ["0", "0"])
+    write_hike(archive / "b.json", [{"name": "иван  петров", "payment": 100}], ["0"])
+    write_hike(archive / "c.json", [{"name": "Иван Петров", "payment": 100}], ["0"])
+    directory = ParticipantDirectory(str(archive), str(tmp_path / "cache"))
+    assert directory.refresh() == 3
+    # Показывается самое частое написание
+    assert directory.complete("пет ив") == ["Иван Петров"]
+    assert directory.complete("и") == ["Иван Петров", "Инна"]
+    assert directory.person("ИВАН ПЕТРОВ")["hikes"] == 3
+
+
+def test_saved_directory_reads_only_changed_files(tmp_path):
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    write_hike(archive / "a.json", [{"name": "Аня", "payment": 100}], ["0"])
+    write_hike(archive / "b.json", [{"name": "Боря", "payment": 100}], ["0"])
+    ParticipantDirectory(str(archive), str(tmp_path / "cache")).refresh()
+    (archive / "b.json").unlink()
+    directory = ParticipantDirectory(str(archive), str(tmp_path / "cache"))
+    assert directory.refresh() == 1
+    assert directory.person("Боря") is None and directory.person("Аня")["hikes"] == 1
+
+
+def test_carried_over_balance_is_not_counted_twice(tmp_path):
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    write_hike(archive / "a.json", [{"name": "Аня", "payment": 1000}], ["Обед -400"])
+    directory = ParticipantDirectory(str(archive), str(tmp_path / "cache"))
+    directory.refresh()
+    assert directory.balance("аня") == 600
+    assert directory.balance("Кто-то новый") == 0
+    # Следующий поход: остаток перенесён во взнос, после похода осталось 100
+    write_hike(archive / "b.json", [{"name": "Аня", "payment": 1600, "carried_in": 600}], ["Ужин -1500"])
+    directory.refresh()
+    assert directory.balance("Аня") == 100
+    assert directory.person("Аня")["spend"] == 1900
+    # Поход удалили из архива - переходящий остаток снова прежний
+    (archive / "b.json").unlink()
+    directory.refresh()
+    assert directory.balance("Аня") == 600
@@ -0,0 +1,51 @@
+import os, json
+from hikeutil import make_synthetic_hike
+from filecache import ParsedFileCache
+
+
+def write(path, hike_data):
+    path.write_text(json.dumps(hike_data, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_hit_until_file_changes(tmp_path):
+    cache = ParsedFileCache(str(tmp_path / "cache"))
+    hike = make_synthetic_hike(2, 3, 1)
+    path = write(tmp_path / "hike.json", hike)
+    assert cache.get(path) is None
+    cache.put(path, hike)
+    assert cache.get(path) == hike
+    hike["hike_name"] = "Другое название"
+    write(tmp_path / "hike.json", hike)
+    os.utime(path, ns=(1, 1))
+    assert cache.get(path) is None
+    cache.put(path, hike)
+    # Старая запись того же файла удалена
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ParsedFileCache(str(tmp_path / "cache"))
+    path = write(tmp_path / "hike.json", make_synthetic_hike(2, 3, 1))
+    cache.put(path, {"x": 1})
+    entry = os.path.join(tmp_path / "cache", os.listdir(tmp_path / "cache")[0])
+    with open(entry, "wb") as file:
+        file.write(b"not a pickle")
+    assert cache.get(path) is None
+    assert not os.path.exists(entry)
+
+
+def test_size_limit_evicts_oldest(tmp_path):
+    cache = ParsedFileCache(str(tmp_path / "cache"), max_bytes=1)
+    paths = [write(tmp_path / f"{n}.json", make_synthetic_hike(2, 3, 1)) for n in range(3)]
+    for path in paths:
+        cache.put(path, {"path": path})
+    assert len(os.listdir(tmp_path / "cache")) <= 1
+    cache.clear()
+    assert os.listdir(tmp_path / "cache") == []
+
+
+def test_missing_file_is_ignored(tmp_path):
+    cache = ParsedFileCache(str(tmp_path / "cache"))
+    cache.put(str(tmp_path / "none.json"), {})
+    assert cache.get(str(tmp_path / "none.json")) is None
@@ -0,0 +1,34 @@
+import os
+import pytest
+
+pytest.importorskip("PyQt6.QtCore")
+
+from filewatch import HikeFileLock, merge_expenses, same_structure, file_signature
+
+
+def test_merge_expenses_by_cell():
+    base = [["0", "Обед -100"], ["0", "0"]]
+    local = [["Чай -50", "Обед -100"], ["0", "Ужин -10"]]
+    remote = [["0", "Обед -200"], ["0", "Ужин -20"], ["Такси -5", "0"]]
+    changes, conflicts = merge_expenses(base, local, remote)
+    assert changes == [(0, 1, "Обед -200"), (2, 0, "Такси -5")]
+    assert conflicts == [(1, 1, "Ужин -20")]
+
+
+def test_same_structure_ignores_expenses():
+    first = {"participants": [{"name": "Аня"}], "start_date": "a", "end_date": "b", "track_days": 2,
+             "expenses_data": [["0"]]}
+    assert same_structure(first, dict(first, expenses_data=[["Чай -5"]]))
+    assert not same_structure(first, dict(first, track_days=3))
+
+
+def test_lock_is_exclusive_and_released(tmp_path):
+    path = str(tmp_path / "hike.json")
+    assert file_signature(path) is None
+    first = HikeFileLock(path)
+    assert first.acquire() is None and os.path.exists(first.lock_path)
+    other = HikeFileLock(path)
+    other.owner_info = dict(other.owner_info, host="другой-ноутбук")
+    assert other.acquire()["host"] == first.owner_info["host"]
+    first.release()
+    assert not os.path.exists(first.lock_path)
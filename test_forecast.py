@@ -0,0 +1,63 @@
+import pytest
+from hikemodel import HikeModel
+from hikeutil import make_synthetic_hike
+from forecast import BurnForecast, forecast_text
+
+
+def model(days=10):
+    hike = make_synthetic_hike(2, days, 0)
+    for participant in hike['participants']:
+        participant['payment'] = 1000 if participant['name'] != "Общак" else 0
+    return HikeModel(hike)
+
+
+def test_rate_is_smoothed_daily_spend():
+    hike = model()
+    hike.add_entry(0, 0, "Обед", -100)
+    assert hike.forecast.rate(0) == pytest.approx(100)
+    hike.add_entry(1, 0, "Обед", -200)
+    # (0.3 * 200 + 0.3 * 0.7 * 100) / (1 - 0.7 ** 2)
+    assert hike.forecast.rate(0) == pytest.approx(81 / 0.51)
+    forecast = hike.forecast.forecast(0)
+    assert forecast["dry_day"] == 1 + int(700 // forecast["rate"]) + 1
+    assert "кончатся" in forecast_text(forecast)
+
+
+def test_total_subscribers_see_fresh_forecast():
+    hike = model()
+    hike.add_entry(0, 0, "Обед", -100)
+    seen = []
+    hike.subscribe(lambda event: seen.append((event["type"], hike.forecast.rate(0)))
+                   if event["type"] in ("total_changed", "forecast_changed") and event["participant"] == 0 else None)
+    hike.add_entry(1, 0, "Обед", -500)
+    rate = hike.forecast.rate(0)
+    assert seen[0] == ("total_changed", rate)
+    assert ("forecast_changed", rate) in seen
+    assert [kind for kind, _ in seen].index("forecast_changed") > 0
+
+
+def test_current_day_goes_back_when_last_day_is_emptied():
+    hike = model()
+    hike.add_entry(0, 0, "Обед", -100)
+    hike.add_entry(3, 0, "Обед", -100)
+    assert hike.forecast.current_day == 3
+    hike.replace_cell_text(3, 0, "0")
+    assert hike.forecast.current_day == 0
+    assert hike.forecast.rate(0) == pytest.approx(100)
+    fresh = BurnForecast(hike)
+    assert fresh.current_day == 0 and fresh.rate(0) == pytest.approx(100)
+
+
+def test_topups_do_not_count_as_spend():
+    hike = model()
+    hike.add_entry(2, 1, "Пополнение", 500)
+    assert hike.forecast.current_day == -1
+    assert hike.forecast.forecast(1)["balance"] == 1500
+
+
+def test_presence_limits_remaining_days():
+    hike = model()
+    hike.add_entry(0, 0, "Обед", -100)
+    hike.set_presence(0, [[0, 4]])
+    assert hike.forecast.remaining_days(0) == 4
+    assert hike.forecast.remaining_days(1) == 9
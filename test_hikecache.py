@@ -0,0 +1,28 @@
+from hikeutil import make_synthetic_hike, deep_sizeof
+from hikecache import HikeCache
+
+
+def test_cache_evicts_least_recently_used():
+    hikes = {name: make_synthetic_hike(3, 5, 1) for name in "abc"}
+    size = deep_sizeof(hikes["a"])
+    cache = HikeCache(size * 2 + size // 2)
+    assert cache.put("a", hikes["a"]) == []
+    assert cache.put("b", hikes["b"]) == []
+    assert cache.put("c", hikes["c"]) == ["a"]
+    assert "a" not in cache and len(cache) == 2
+
+
+def test_pinned_hikes_are_never_evicted():
+    cache = HikeCache(1)
+    hike = make_synthetic_hike(3, 5, 1)
+    assert cache.put("dirty", hike, pinned=True) == []
+    assert cache.peek("dirty") is hike
+    assert cache.put("clean", make_synthetic_hike(3, 5, 1)) == ["clean"]
+    assert cache.pop("dirty") is hike and cache.total_bytes == 0
+
+
+def test_smaller_budget_applies_at_once():
+    cache = HikeCache(10 ** 9)
+    for name in "ab":
+        cache.put(name, make_synthetic_hike(3, 5, 1))
+    assert cache.set_budget(0) == ["a", "b"]
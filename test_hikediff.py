@@ -0,0 +1,58 @@
+import copy
+from hikemodel import HikeModel
+from hikediff import diff_hikes, merge_hikes
+from journal import TOMBSTONES_FIELD
+from test_sync import small_hike
+
+
+def snapshot(model):
+    return copy.deepcopy(model.hike_data)
+
+
+def test_diff_finds_added_removed_and_header():
+    model = HikeModel(small_hike(), "a")
+    old = snapshot(model)
+    model.add_entry(1, 1, "Ужин", -300)
+    model.replace_cell_text(0, 0, "Обед -100")
+    new = snapshot(model)
+    new["hike_name"] = "Манаслу"
+    diff = diff_hikes(old, new)
+    assert diff["header"] == [("hike_name", "Аннапурна", "Манаслу")]
+    assert [entry["category"] for entry in diff["added"]] == ["Ужин"]
+    assert [entry["category"] for entry in diff["removed"]] == ["Чай"]
+    assert diff["changed"] == [] and diff["participants"] == []
+
+
+def test_merge_combines_both_sides():
+    base_model = HikeModel(small_hike(), "base")
+    base = snapshot(base_model)
+    ours_model, theirs_model = HikeModel(copy.deepcopy(base), "a"), HikeModel(copy.deepcopy(base), "b")
+    ours_model.add_entry(1, 0, "Ужин", -300)
+    theirs_model.add_entry(2, 1, "Такси", -200)
+    merged, conflicts = merge_hikes(base, snapshot(ours_model), snapshot(theirs_model))
+    assert conflicts == []
+    categories = sorted(entry["category"] for entry in merged["journal"])
+    assert categories == ["Обед", "Такси", "Ужин", "Чай"]
+    assert merged["expenses_data"][2][1] == "Такси -200"
+
+
+def test_merge_conflicting_fields_keeps_ours():
+    base = small_hike()
+    ours, theirs = copy.deepcopy(base), copy.deepcopy(base)
+    ours["hike_name"], theirs["hike_name"] = "Манаслу", "Лангтанг"
+    merged, conflicts = merge_hikes(base, ours, theirs)
+    assert merged["hike_name"] == "Манаслу"
+    assert [(conflict["kind"], conflict["key"]) for conflict in conflicts] == [("field", "hike_name")]
+
+
+def test_merge_keeps_tombstones_of_both_sides():
+    base = snapshot(HikeModel(small_hike(), "base"))
+    ours_model, theirs_model = HikeModel(copy.deepcopy(base), "a"), HikeModel(copy.deepcopy(base), "b")
+    ours_model.replace_cell_text(0, 0, "Обед -100")
+    theirs = snapshot(theirs_model)
+    merged, _ = merge_hikes(base, snapshot(ours_model), theirs)
+    assert len(merged[TOMBSTONES_FIELD]) == 1
+    assert merged["expenses_data"][0][0] == "Обед -100"
+    # Слияние в обратную сторону тоже не возвращает удалённую запись
+    merged, _ = merge_hikes(base, theirs, snapshot(ours_model))
+    assert [entry["category"] for entry in merged["journal"]] == ["Обед"]
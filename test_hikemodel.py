@@ -0,0 +1,102 @@
+import pytest
+from hikemodel import HikeModel
+from hikeutil import make_synthetic_hike
+
+
+def model():
+    hike = make_synthetic_hike(2, 3, 0)
+    hike['participants'][0]['payment'] = 1500
+    hike['participants'][1]['payment'] = 5000
+    return HikeModel(hike)
+
+
+def test_entry_events_and_totals():
+    hike = model()
+    events = []
+    unsubscribe = hike.subscribe(events.append)
+    entry = hike.add_entry(0, 0, "Обед", -600)
+    kinds = [event["type"] for event in events]
+    assert kinds[:2] == ["entry_added", "total_changed"]
+    assert events[0]["id"] == entry["id"] and events[1]["total"] == 900
+    assert {"type": "threshold_crossed", "participant": 0, "level": "low", "total": 900} in events
+    assert hike.hike_data['expenses_data'][0][0] == "Обед -600"
+    unsubscribe()
+    hike.add_entry(0, 0, "Чай", -10)
+    assert len([event for event in events if event["type"] == "entry_added"]) == 1
+
+
+def test_pool_total_follows_participants():
+    hike = model()
+    pool = hike.pool_index
+    hike.add_entry(1, 1, "Ужин", -1000)
+    hike.add_entry(1, pool, "Пермит", -2000)
+    assert hike.totals() == [1500, 4000, 3500]
+    assert hike.pool_total() == 3500
+
+
+def test_replace_cell_publishes_removal():
+    hike = model()
+    hike.add_entry(0, 1, "Обед", -100)
+    events = []
+    hike.subscribe(events.append)
+    hike.replace_cell_text(0, 1, "0")
+    assert [event["type"] for event in events][:2] == ["entry_removed", "total_changed"]
+    assert hike.total(1) == 5000
+
+
+def test_check_cell_rejects_outside_hike():
+    hike = model()
+    with pytest.raises(ValueError):
+        hike.add_entry(3, 0, "Обед", -1)
+    with pytest.raises(ValueError):
+        hike.add_entry(0, 5, "Обед", -1)
+
+
+def test_statistics_and_settlements():
+    hike = model()
+    hike.add_entry(0, 0, "Обед", -2000)
+    rows = hike.statistics()
+    assert [row["balance"] for row in rows] == [-500, 5000]
+    assert rows[0]["daily_average"] == pytest.approx(2000 / 3)
+    assert [row["action"] for row in hike.settlements()] == ["pay", "return"]
+
+
+def team_hike():
+    # Аня и Боря в связке 3, Вера напрямую в общаке
+    participants = [{"name": "Аня", "payment": 1000, "parent": 3}, {"name": "Боря", "payment": 2000, "parent": 3},
+                    {"name": "Вера", "payment": 3000}, {"name": "Связка 1", "payment": 0, "kind": "pool", "parent": 4},
+                    {"name": "Общак", "payment": 0}]
+    return {"hike_name": "Связки", "start_date": "2025-03-20", "end_date": "2025-03-21", "track_days": 2,
+            "participants": participants, "expenses_data": [["0"] * 5, ["0"] * 5]}
+
+
+def test_pool_parents_break_bad_links_and_cycles():
+    from hikemodel import pool_parents
+    participants = [{"name": "Аня", "parent": 1}, {"name": "A", "kind": "pool", "parent": 2},
+                    {"name": "B", "kind": "pool", "parent": 1}, {"name": "Боря", "parent": 0},
+                    {"name": "Общак"}]
+    parents = pool_parents(participants, 4)
+    # Ссылка на участника ведёт в корень, цикл фондов A <-> B разорван
+    assert parents[3] == 4 and parents[4] is None
+    assert 4 in (parents[1], parents[2])
+    for index in range(4):
+        seen, node = set(), index
+        while node is not None:
+            assert node not in seen
+            seen.add(node)
+            node = parents[node]
+
+
+def test_nested_pools_sum_subtrees():
+    hike = HikeModel(team_hike())
+    assert hike.children(3) == [0, 1] and hike.children(4) == [2, 3]
+    assert hike.descendants(4) == [0, 1, 2, 3]
+    assert hike.total(3) == 3000 and hike.pool_total() == 6000
+    events = []
+    hike.subscribe(events.append)
+    hike.add_entry(0, 0, "Обед", -500)
+    hike.add_entry(1, 3, "Пермит", -1000)
+    assert hike.total(3) == 1500 and hike.pool_total() == 4500
+    # Изменения фондов публикуются после участников
+    totals = [event["participant"] for event in events if event["type"] == "total_changed"]
+    assert totals == [0, 3, 4, 3, 4]
@@ -0,0 +1,55 @@
+from hikemodel import HikeModel
+from hikeutil import make_synthetic_hike
+from ingest import IngestQueue, item_key, summarize, ACCEPTED, DUPLICATE, REJECTED
+
+
+def model():
+    return HikeModel(make_synthetic_hike(3, 5, 0))
+
+
+def test_bad_participant_rejects_only_that_item():
+    results = IngestQueue(model()).ingest([
+        {"day": 0, "participant": None, "category": "Обед", "amount": 100},
+        {"day": 0, "participant": [1], "category": "Обед", "amount": 100},
+        {"day": 0, "participant": "Нет такого", "category": "Обед", "amount": 100},
+        {"day": 0, "participant": 1, "category": "Обед", "amount": 100},
+    ])
+    assert [result["status"] for result in results] == [REJECTED, REJECTED, REJECTED, ACCEPTED]
+    assert "участник" in results[0]["error"]
+
+
+def test_notes_distinguish_items():
+    hike = model()
+    items = [{"day": 0, "participant": 0, "category": "Обед", "amount": 100, "note": "Аня"},
+             {"day": 0, "participant": 0, "category": "Обед", "amount": 100, "note": "Боря"},
+             {"day": 0, "participant": 0, "category": "Обед", "amount": 100, "note": "Аня"}]
+    first = IngestQueue(hike).ingest(items)
+    assert summarize(first) == {ACCEPTED: 3, DUPLICATE: 0, REJECTED: 0}
+    again = IngestQueue(hike).ingest(items)
+    assert summarize(again) == {ACCEPTED: 0, DUPLICATE: 3, REJECTED: 0}
+    assert [result["id"] for result in again] == [result["id"] for result in first]
+    assert hike.total(0) == hike.participants[0]["payment"] - 300
+
+
+def test_keys_without_note_are_unchanged():
+    item = {"day": 1, "participant": 2, "category": "Обед", "amount": 100}
+    assert item_key(item) == item_key(dict(item, note=""))
+    assert item_key(item) != item_key(dict(item, note="чай"))
+
+
+def test_repeated_key_in_batch_points_to_original():
+    results = IngestQueue(model()).ingest([
+        {"day": 0, "participant": 0, "category": "Обед", "amount": 100, "key": "k1"},
+        {"day": 0, "participant": 0, "category": "Обед", "amount": 100, "key": "k1"},
+    ])
+    assert [result["status"] for result in results] == [ACCEPTED, DUPLICATE]
+    assert results[1]["id"] == results[0]["id"] is not None
+
+
+def test_batch_is_one_journal_operation():
+    hike = model()
+    calls = []
+    hike.journal.listeners.append(lambda added, removed: calls.append(len(added)))
+    IngestQueue(hike).ingest([{"day": day, "participant": 0, "category": "Обед", "amount": 10}
+                              for day in range(5)])
+    assert calls == [5]
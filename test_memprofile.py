@@ -0,0 +1,52 @@
+import datetime
+from hikeutil import deep_sizeof, make_synthetic_hike
+from memprofile import measure_allocation, profile_hike, format_report, run_benchmark
+
+
+class FakeWidget:
+    def __init__(self, hike_data):
+        self.hike_data = hike_data
+        self.table = None
+
+
+def test_synthetic_hike_dates_match_days():
+    for days in (1, 10, 30):
+        hike = make_synthetic_hike(3, days, 1)
+        start = datetime.date.fromisoformat(hike['start_date'])
+        end = datetime.date.fromisoformat(hike['end_date'])
+        # MainWorksWidget строит таблицу на start.daysTo(end) + 1 строк
+        assert (end - start).days + 1 == days == len(hike['expenses_data'])
+
+
+def test_synthetic_hike_shape():
+    hike = make_synthetic_hike(4, 5, 2)
+    assert len(hike['participants']) == 5
+    assert hike['participants'][-1]['name'] == "Общак"
+    assert all(len(row) == 5 for row in hike['expenses_data'])
+    assert hike['expenses_data'][0][0].count(";") == 1
+
+
+def test_deep_sizeof_counts_shared_objects_once():
+    shared = ["x" * 1000]
+    single = deep_sizeof({"a": shared})
+    double = deep_sizeof({"a": shared, "b": shared})
+    assert double - single < 1000
+
+
+def test_measure_allocation_returns_result():
+    result, grown, peak = measure_allocation(lambda: [0] * 100000)
+    assert len(result) == 100000
+    assert grown > 0 and peak >= grown
+
+
+def test_profile_report_has_no_undo():
+    report = profile_hike(FakeWidget(make_synthetic_hike(3, 5, 1)))
+    assert set(report) == {"ledger", "grid", "stats"}
+    assert report["ledger"] > 0
+    assert "Всего" in format_report(report)
+
+
+def test_benchmark_scales_with_hike_size():
+    rows = run_benchmark([(2, 5, 1), (10, 20, 2)], with_widgets=False)
+    assert rows[0]["entries"] == 10 and rows[1]["entries"] == 400
+    assert rows[1]["ledger"] > rows[0]["ledger"]
@@ -0,0 +1,59 @@
+import json
+from hikeutil import make_synthetic_hike
+from hikefile import read_hike, write_hike
+from migrate import repair_hike, migrate_file, find_hike_files, HIKE_SCHEMA_VERSION, STATUS_OK, STATUS_REPAIRED
+
+
+def old_hike():
+    return {"hike_name": "Старый", "start_date": "2024-05-01", "end_date": "2024-05-03", "track_days": "3",
+            "participants": [{"name": "Аня", "payment": "1000"}, {"name": "Общак", "payment": 0}],
+            "expenses_data": [["-1500.0", "Обед -100"], ["0", "0"], ["Чай -50", "0", "Ужин -70"]]}
+
+
+def test_repair_old_file_builds_journal_and_keeps_entries():
+    hike_data = old_hike()
+    issues = repair_hike(hike_data)
+    assert "создан журнал записей" in issues
+    assert hike_data["schema_version"] == HIKE_SCHEMA_VERSION
+    assert hike_data["track_days"] == 3
+    assert hike_data["participants"][0]["payment"] == 1000
+    # Лишний столбец с записью стал участником перед общаком
+    assert [p["name"] for p in hike_data["participants"]] == ["Аня", "Без имени 1", "Общак"]
+    assert hike_data["expenses_data"][2] == ["Чай -50", "Ужин -70", "0"]
+    assert sum(entry["amount"] for entry in hike_data["journal"]) == -1720
+
+
+def test_extra_days_extend_end_date_inclusively():
+    hike_data = old_hike()
+    hike_data["track_days"] = 2
+    repair_hike(hike_data)
+    # Три дня с 1 мая кончаются 3 мая: верная дата не сдвигается
+    assert hike_data["track_days"] == 3 and hike_data["end_date"] == "2024-05-03"
+    hike_data = old_hike()
+    hike_data["track_days"], hike_data["end_date"] = 2, "2024-05-02"
+    repair_hike(hike_data)
+    assert hike_data["end_date"] == "2024-05-03"
+
+
+def test_repair_is_idempotent():
+    hike_data = old_hike()
+    repair_hike(hike_data)
+    assert repair_hike(hike_data) == []
+
+
+def test_write_hike_round_trip(tmp_path):
+    path = str(tmp_path / "hike.json")
+    hike_data = make_synthetic_hike(2, 3, 1)
+    write_hike(path, hike_data)
+    assert read_hike(path) == hike_data
+    assert [p.name for p in tmp_path.iterdir()] == ["hike.json"]
+
+
+def test_migrate_file_reports_and_backs_up(tmp_path):
+    path = tmp_path / "old.json"
+    path.write_text(json.dumps(old_hike(), ensure_ascii=False), encoding="utf-8")
+    (tmp_path / "notes.json").write_text("[1, 2]", encoding="utf-8")
+    assert find_hike_files(str(tmp_path)) == [str(tmp_path / "notes.json"), str(path)]
+    assert migrate_file(str(path))["status"] == STATUS_REPAIRED
+    assert (tmp_path / "old.json.bak").exists()
+    assert migrate_file(str(path))["status"] == STATUS_OK
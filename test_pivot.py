@@ -0,0 +1,34 @@
+from hikemodel import HikeModel
+from pivot import LedgerPivot, hike_facts, table_rows
+from test_sync import small_hike
+
+
+def test_hike_facts_group_by_all_dimensions():
+    hike_data = small_hike()
+    hike_data["expenses_data"][1][0] = "Обед -200"
+    facts = hike_facts(hike_data)
+    assert facts[("Аннапурна", 1, "2025-03", "Аня", "Обед")] == [-100.0, 1]
+    assert facts[("Аннапурна", 2, "2025-03", "Аня", "Обед")] == [-200.0, 1]
+    assert sum(count for _, count in facts.values()) == 3
+
+
+def test_ledger_pivot_follows_journal():
+    model = HikeModel(small_hike(), "a")
+    pivot = LedgerPivot(model)
+    table = pivot.table("participant", "category")
+    assert table["total"] == -150
+    model.add_entry(2, 1, "Обед", -300)
+    table = pivot.table("participant", "category")
+    assert table["values"][(1, "Обед")] == -300
+    assert table["col_totals"]["Обед"] == -400
+    assert [title for _, title in table["rows"]] == ["Аня", "Боря"]
+    model.replace_cell_text(0, 0, "0")
+    assert pivot.table("participant", "category", "count")["total"] == 1
+
+
+def test_table_rows_with_totals():
+    model = HikeModel(small_hike(), "a")
+    rows = table_rows(LedgerPivot(model).table("day", "category"))
+    assert rows[0] == ["День \\ Категория", "Обед", "Чай", "Итого"]
+    assert rows[1] == ["День 1", "-100", "-50", "-150"]
+    assert rows[-1] == ["Итого", "-100", "-50", "-150"]
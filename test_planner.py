@@ -0,0 +1,64 @@
+import json
+import pytest
+import planner
+from planner import BudgetPlanner, hike_day_stats, round_deposit, simulate, simulate_plan, PYTHON_SIMULATIONS
+
+
+def hike(name, days, spend):
+    return {"hike_name": name, "start_date": "2024-04-01", "end_date": "2024-04-10", "track_days": days,
+            "participants": [{"name": "Аня", "payment": 0}, {"name": "Боря", "payment": 0},
+                             {"name": "Общак", "payment": 0}],
+            "expenses_data": [["0", "0", f"Еда -{spend * 2 + day * 10}"] for day in range(days)]}
+
+
+@pytest.fixture
+def archive(tmp_path):
+    folder = tmp_path / "archive"
+    folder.mkdir()
+    for number in range(3):
+        data = hike("Манаслу", 8, 1000 + number * 100)
+        (folder / f"m{number}.json").write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    result = BudgetPlanner(str(folder), str(tmp_path / "cache"))
+    result.refresh()
+    return result
+
+
+def test_day_stats_per_person():
+    stats = hike_day_stats(hike("Манаслу", 2, 1000))
+    count, log_sum, _ = stats["categories"]["Еда"]
+    assert stats["days"] == 2 and count == 2
+    assert log_sum == pytest.approx(2 * 6.9077, abs=0.02)
+
+
+def test_plan_levels_grow_and_are_rounded(archive):
+    plan = archive.plan("Манаслу", 8, simulations=2000, seed=1, workers=1)
+    deposits = [deposit for _, deposit in plan["levels"]]
+    assert deposits == sorted(deposits)
+    assert all(deposit % 500 == 0 for deposit in deposits)
+    assert not plan["whole_archive"] and plan["hikes"] == 3
+    assert 8000 < plan["mean"] < 10000
+
+
+def test_fitted_plan_is_independent_of_archive(archive):
+    fitted = archive.fit("Манаслу")
+    archive.treks.clear()
+    plan = simulate_plan(fitted, 8, 1000, seed=1, workers=1)
+    assert plan["trek"] == "Манаслу" and plan["simulations"] == 1000
+
+
+def test_default_simulations_without_numpy(archive, monkeypatch):
+    monkeypatch.setattr(planner, "np", None)
+    plan = archive.plan("Манаслу", 3, seed=1, workers=1)
+    assert plan["simulations"] == PYTHON_SIMULATIONS
+
+
+def test_unknown_trek_uses_whole_archive(archive):
+    assert archive.plan("Лангтанг", 5, simulations=500, seed=1, workers=1)["whole_archive"]
+    with pytest.raises(ValueError):
+        simulate_plan(archive.fit("Лангтанг"), 0, 100)
+
+
+def test_simulate_is_sorted_and_round_deposit():
+    totals = simulate([(0.5, 6.0, 0.3)], 4, 300, workers=1, seed=2)
+    assert totals == sorted(totals) and len(totals) == 300
+    assert round_deposit(1) == 500 and round_deposit(1000) == 1000
@@ -0,0 +1,44 @@
+import pytest
+from hikemodel import HikeModel
+from presence import contains, count_days, format_intervals, normalize_intervals, parse_intervals
+from test_sync import small_hike
+
+
+def test_normalize_clips_and_merges():
+    assert normalize_intervals([[5, 9], [-2, 1], [2, 3]], 8) == [[0, 3], [5, 7]]
+    assert normalize_intervals([[0, 3], [4, 7]], 8) is None
+    assert normalize_intervals(None, 8) is None
+
+
+def test_parse_and_format_round_trip():
+    intervals = parse_intervals("1-3, 6; 7, 9", 10)
+    assert intervals == [[0, 2], [5, 6], [8, 8]]
+    assert format_intervals(intervals) == "1-3, 6-7, 9"
+    assert parse_intervals("  ", 10) is None and format_intervals(None) == ""
+    with pytest.raises(ValueError):
+        parse_intervals("3-a", 10)
+    with pytest.raises(ValueError):
+        parse_intervals("9-11", 10)
+
+
+def test_contains_and_count_days():
+    intervals = [[0, 2], [5, 6]]
+    assert [day for day in range(8) if contains(intervals, day)] == [0, 1, 2, 5, 6]
+    assert contains(None, 100)
+    assert count_days(intervals, 8) == 5 and count_days(None, 8) == 8
+
+
+def test_model_presence():
+    model = HikeModel(small_hike(), "a")
+    assert model.present(0) is None
+    events = []
+    model.subscribe(events.append)
+    model.set_presence(1, [[1, 5]])
+    assert model.participants[1]["presence"] == [[1, 2]]
+    assert model.present(0) == [0] and model.present(1) == [0, 1]
+    assert model.present_days(1) == 2
+    assert {"type": "presence_changed", "participant": 1} in events
+    with pytest.raises(ValueError):
+        model.set_presence(model.pool_index, [[0, 0]])
+    model.set_presence(1, None)
+    assert "presence" not in model.participants[1] and model.present(0) is None
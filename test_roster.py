@@ -0,0 +1,35 @@
+import json
+import pytest
+from hikemodel import POOL_NAME, POOL_KIND
+from roster import DEFAULT_PAYMENT, build_pools, read_roster
+
+
+def test_csv_with_header_teams_and_default_payment(tmp_path):
+    path = tmp_path / "roster.csv"
+    path.write_text("Имя;Взнос;Связка\nАня;25 000;1\nБоря;;1\nВера;15000;\n", encoding="utf-8")
+    assert read_roster(str(path)) == [{"name": "Аня", "payment": 25000, "team": "1"},
+                                      {"name": "Боря", "payment": DEFAULT_PAYMENT, "team": "1"},
+                                      {"name": "Вера", "payment": 15000}]
+
+
+def test_bad_payment_reports_line(tmp_path):
+    path = tmp_path / "roster.csv"
+    path.write_text("Аня;25000\nБоря;много\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="строка 2"):
+        read_roster(str(path))
+
+
+def test_json_hike_file_skips_pools(tmp_path):
+    path = tmp_path / "hike.json"
+    path.write_text(json.dumps({"participants": [{"name": "Аня", "payment": 5000},
+                                                 {"name": POOL_NAME, "payment": 0}]}), encoding="utf-8")
+    assert read_roster(str(path)) == [{"name": "Аня", "payment": 5000}]
+
+
+def test_build_pools_links_teams_to_common_pool():
+    participants = build_pools([{"name": "Аня", "payment": 1, "team": "A"}, {"name": "Боря", "payment": 1},
+                                {"name": "Вера", "payment": 1, "team": "A"}])
+    assert [p.get("parent") for p in participants] == [3, None, 3, 4, None]
+    assert participants[3] == {"name": "Связка A", "payment": 0, "kind": POOL_KIND, "parent": 4}
+    assert participants[-1]["name"] == POOL_NAME
+    assert all("team" not in p for p in participants)
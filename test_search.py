@@ -0,0 +1,45 @@
+import json
+from hikemodel import HikeModel
+from hikeutil import make_synthetic_hike
+from search import ArchiveSearchIndex, HikeSearchIndex, normalize, tokenize
+
+
+def write(path, hike_data):
+    path.write_text(json.dumps(hike_data, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_hike_index_follows_journal():
+    model = HikeModel(make_synthetic_hike(2, 3, 0))
+    index = HikeSearchIndex(model.journal)
+    model.add_entry(0, 0, "Такси", -300, note="до Покхары")
+    assert [match["category"] for match in index.search("покх")] == ["Такси"]
+    model.replace_cell_text(0, 0, "0")
+    assert index.search("такси") == []
+
+
+def test_archive_refresh_reindexes_only_changed_files(tmp_path):
+    archive, cache = tmp_path / "archive", tmp_path / "cache"
+    (archive / "2024").mkdir(parents=True)
+    hike_data = make_synthetic_hike(2, 3, 0)
+    hike_data["expenses_data"][1][0] = "Пермит -3000"
+    first = write(archive / "2024" / "a.json", hike_data)
+    write(archive / "b.json", make_synthetic_hike(2, 3, 1))
+    (archive / "a.files").mkdir()
+    write(archive / "a.files" / "receipt.json", hike_data)
+
+    index = ArchiveSearchIndex(str(archive), str(cache))
+    assert index.refresh() == 2
+    assert [match["hike"] for match in index.search("пермит")] == [first]
+    assert ArchiveSearchIndex(str(archive), str(cache)).refresh() == 0
+
+
+def test_update_file_ignores_missing_file(tmp_path):
+    index = ArchiveSearchIndex(str(tmp_path), str(tmp_path / "cache"))
+    index.update_file(str(tmp_path / "gone.json"), hike_data=make_synthetic_hike(2, 3, 1))
+    assert index.files == {}
+
+
+def test_normalize_folds_case_and_yo():
+    assert normalize("Ёлка") == normalize("елка")
+    assert tokenize("Обед, чай")
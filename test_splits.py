@@ -0,0 +1,102 @@
+import pytest
+from hikemodel import HikeModel
+from hikeutil import make_synthetic_hike
+from splits import (SplitEngine, SplitMatrix, make_split, parse_weights, split_shares,
+                    SPLIT_EQUAL, SPLIT_PRESENT, SPLIT_WEIGHTS)
+
+
+def model():
+    hike = make_synthetic_hike(3, 4, 0)
+    for participant in hike['participants']:
+        participant['payment'] = 5000 if participant['name'] != "Общак" else 0
+    return HikeModel(hike)
+
+
+def test_split_shares_rules():
+    assert split_shares(make_split(SPLIT_EQUAL), [0, 1, 2]) == ([0, 1, 2], [1 / 3] * 3)
+    assert split_shares(make_split(SPLIT_PRESENT), [0, 1, 2], present=[0, 2]) == ([0, 2], [0.5, 0.5])
+    rows, shares = split_shares(make_split(SPLIT_WEIGHTS, [0, 1], [3, 1]), [0, 1, 2])
+    assert rows == [0, 1] and shares == [0.75, 0.25]
+    with pytest.raises(ValueError):
+        make_split(SPLIT_WEIGHTS, [0], [0])
+
+
+def test_parse_weights_by_name():
+    assert parse_weights("аня=2; Боря", ["Аня", "Боря"]) == ([0, 1], [2.0, 1.0])
+    with pytest.raises(ValueError):
+        parse_weights("Вова=1", ["Аня"])
+
+
+def test_matrix_dot_matches_loop():
+    matrix = SplitMatrix(3)
+    matrix.append([0, 1], [0.5, 0.5], 100)
+    matrix.append([2], [1.0], 40)
+    column = matrix.append([0, 2], [0.25, 0.75], 80)
+    matrix.set_amount(column, 0)
+    assert matrix.dot() == [50, 50, 40]
+
+
+def test_listener_added_during_notification_does_not_double_count():
+    hike = model()
+    pool = len(hike.participants) - 1
+    hike.journal.record(0, 0, "Обед", -10)
+    late = []
+    # Слушатель, подписывающий новый расчёт долей прямо во время уведомления
+    hike.journal.listeners.append(lambda added, removed: late.append(SplitEngine(hike)) if not late else None)
+    hike.add_entry(0, pool, "Пермит", -3000, split=make_split(SPLIT_EQUAL))
+    assert late[0].burdens() == pytest.approx([1010, 1000, 1000, 0])
+    assert hike.splits.burdens() == pytest.approx([1010, 1000, 1000, 0])
+
+
+def test_split_changes_balances_and_settlements():
+    hike = model()
+    pool = len(hike.participants) - 1
+    balances = [row["balance"] for row in hike.statistics()]
+    assert balances == [5000, 5000, 5000] and "share" not in hike.statistics()[0]
+    # Аня платит за ужин на двоих с Борей
+    entry = hike.add_entry(1, 0, "Ужин", -600, split=make_split(SPLIT_EQUAL, [0, 1]))
+    hike.add_entry(1, pool, "Пермит", -3000, split=make_split(SPLIT_EQUAL))
+    rows = hike.statistics()
+    # Каждый из двоих несёт половину ужина и треть пермита, кто бы ни платил
+    assert [row["balance"] for row in rows] == pytest.approx([3700, 3700, 4000])
+    assert [row["share"] for row in rows] == pytest.approx([1300, 1300, 1000])
+    assert hike.settlements()[1] == {"name": rows[1]["name"], "action": "return", "amount": pytest.approx(3700)}
+    hike.replace_cell_text(1, 0, "0")
+    assert entry["id"] not in hike.splits.shared
+    assert [row["balance"] for row in hike.statistics()] == pytest.approx([4000, 4000, 4000])
+
+
+def test_split_by_presence_follows_presence_changes():
+    hike = model()
+    pool = len(hike.participants) - 1
+    hike.add_entry(2, pool, "Джип", -900, split=make_split(SPLIT_PRESENT))
+    hike.set_presence(2, [[0, 1]])
+    assert hike.splits.burdens()[:3] == pytest.approx([450, 450, 0])
+
+
+def test_totals_include_split_shares_everywhere():
+    from directory import hike_people, person_key
+    from test_sync import small_hike
+    hike = HikeModel(small_hike(), "a")
+    events = []
+    hike.subscribe(events.append)
+    hike.add_entry(0, hike.pool_index, "Пермит", -1000, split=make_split(SPLIT_EQUAL))
+    assert hike.totals() == pytest.approx([4350, 4500, 8850])
+    assert [row["balance"] for row in hike.statistics()] == hike.totals()[:2]
+    # Остатки меняются у всех, между кем делится запись
+    changed = {event["participant"]: event["total"] for event in events if event["type"] == "total_changed"}
+    assert changed == pytest.approx({0: 4350, 1: 4500, 2: 8850})
+    assert hike.forecast.forecast(0)["balance"] == pytest.approx(4350)
+    # Переходящий остаток справочника - тот же остаток
+    assert hike_people(hike.hike_data)[person_key("Аня")]["balance"] == pytest.approx(4350)
+
+
+def test_presence_change_republishes_totals():
+    hike = model()
+    pool = len(hike.participants) - 1
+    hike.add_entry(2, pool, "Джип", -900, split=make_split(SPLIT_PRESENT))
+    events = []
+    hike.subscribe(events.append)
+    hike.set_presence(2, [[0, 1]])
+    changed = {event["participant"]: event["total"] for event in events if event["type"] == "total_changed"}
+    assert changed == pytest.approx({0: 4550, 1: 4550, 2: 5000})
@@ -0,0 +1,83 @@
+import json
+from hikemodel import HikeModel
+from sync import (FolderTransport, LoopbackTransport, SYNC_ID_FIELD, hike_sync_key, sync_journals,
+                  sync_hike_file, main)
+
+
+def small_hike():
+    return {"hike_name": "Аннапурна", "start_date": "2025-03-20", "end_date": "2025-03-22", "track_days": 3,
+            "participants": [{"name": "Аня", "payment": 5000}, {"name": "Боря", "payment": 5000},
+                             {"name": "Общак", "payment": 0}],
+            "expenses_data": [["Обед -100; Чай -50", "0", "0"], ["0", "0", "0"], ["0", "0", "0"]]}
+
+
+def test_loopback_sync_converges():
+    first, second = HikeModel(small_hike(), "a"), HikeModel(small_hike(), "b")
+    first.add_entry(1, 0, "Ужин", -300)
+    second.add_entry(1, 0, "Такси", -200)
+    sync_journals(first.journal, second.journal)
+    assert first.journal.cell_text(1, 0) == second.journal.cell_text(1, 0)
+    assert first.total(0) == second.total(0) == 5000 - 150 - 500
+
+
+def test_cell_edits_after_first_sync_converge():
+    first, second = HikeModel(small_hike(), "a"), HikeModel(small_hike(), "b")
+    sync_journals(first.journal, second.journal)
+    first.replace_cell_text(0, 0, "Обед -100; Чай -50")
+    first.replace_cell_text(2, 1, "Такси -700")
+    second.replace_cell_text(0, 0, "Обед -100")
+    sync_journals(first.journal, second.journal)
+    for day, participant in ((0, 0), (2, 1)):
+        assert first.journal.cell_text(day, participant) == second.journal.cell_text(day, participant)
+    assert second.journal.cell_text(2, 1) == "Такси -700"
+    assert first.totals() == second.totals()
+    assert sync_journals(first.journal, second.journal) == ([], [])
+
+
+def test_cell_deletion_is_published_as_tombstone():
+    first, second = HikeModel(small_hike(), "a"), HikeModel(small_hike(), "b")
+    transport = LoopbackTransport()
+    transport.register(first.journal)
+    transport.register(second.journal)
+    first.replace_cell_text(0, 0, "Обед -100")
+    assert transport.sync(second.journal) == [(0, 0)]
+    assert second.journal.cell_text(0, 0) == "Обед -100"
+    # Повторный обмен не возвращает удалённую запись
+    transport.sync(first.journal)
+    assert first.journal.cell_text(0, 0) == "Обед -100"
+    assert second.total(0) == first.total(0) == 4900
+
+
+def test_retyped_deleted_entry_is_a_new_entry():
+    model = HikeModel(small_hike(), "a")
+    model.replace_cell_text(0, 0, "Обед -100")
+    model.replace_cell_text(0, 0, "Обед -100; Чай -50")
+    assert model.journal.cell_text(0, 0) == "Обед -100; Чай -50"
+    assert model.total(0) == 4850
+
+
+def test_folder_sync_survives_rename(tmp_path):
+    first_data, second_data = small_hike(), small_hike()
+    sync_hike_file(first_data, str(tmp_path), "a")
+    key = first_data[SYNC_ID_FIELD]
+    second_data['participants'][0]['name'] = "Анна"
+    second_data[SYNC_ID_FIELD] = key
+    first_data['hike_name'] = "Вокруг Аннапурны"
+    assert hike_sync_key(first_data) == hike_sync_key(second_data) == key
+
+    model = HikeModel(first_data, "a")
+    model.replace_cell_text(0, 0, "Чай -50")
+    transport = FolderTransport(str(tmp_path))
+    transport.sync(model.journal)
+    changed = sync_hike_file(second_data, str(tmp_path), "b")
+    assert changed == [(0, 0)]
+    assert second_data['expenses_data'][0][0] == "Чай -50"
+
+
+def test_sync_cli_writes_file(tmp_path):
+    path = tmp_path / "hike.json"
+    path.write_text(json.dumps(small_hike(), ensure_ascii=False), encoding="utf-8")
+    main([str(path), str(tmp_path / "share"), "--device", "a"])
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved[SYNC_ID_FIELD] == hike_sync_key(small_hike())
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["hike.json", "share"]
@@ -0,0 +1,68 @@
+import pytest
+import topups
+from hikemodel import HikeModel
+from hikeutil import make_synthetic_hike
+from topups import POINTS_FIELD, TopupPlanner, hike_points, schedule_topups, parse_points, format_points, plan_text
+
+
+def test_fewest_topups_prefers_biggest_limit():
+    points = [{"day": 1, "place": "А", "limit": 300}, {"day": 2, "place": "Б", "limit": 1000},
+              {"day": 3, "place": "В", "limit": 200}]
+    plan = schedule_topups(500, [0, 200, 200, 200, 200, 200], points, 1, threshold=100)
+    assert [topup["place"] for topup in plan["topups"]] == ["Б"]
+    assert plan["topups"][0]["amount"] == 600 and plan["shortfall"] == 0
+
+
+def test_shortfall_before_first_point():
+    plan = schedule_topups(100, [300, 0, 0], [{"day": 2, "place": "", "limit": None}], 0, threshold=0)
+    assert plan == {"topups": [], "shortfall": 200}
+    assert plan_text(plan).endswith("сейчас 200")
+
+
+def test_parse_points_round_trip():
+    points = parse_points("3; Покхара; 35 000\n\n1; Бесисахар", 10)
+    assert points == [{"day": 0, "place": "Бесисахар", "limit": None},
+                      {"day": 2, "place": "Покхара", "limit": 35000.0}]
+    assert parse_points(format_points(points), 10) == points
+    with pytest.raises(ValueError):
+        parse_points("11; Далеко", 10)
+
+
+def planner():
+    hike = make_synthetic_hike(2, 10, 0)
+    hike['participants'][0]['payment'] = 3000
+    hike[POINTS_FIELD] = [{"day": 5, "place": "Покхара", "limit": None}]
+    model = HikeModel(hike)
+    model.add_entry(0, 0, "Обед", -1000)
+    return model, TopupPlanner(model)
+
+
+def test_hike_points_keep_zero_limit_limited():
+    hike_data = {POINTS_FIELD: [{"day": 3, "place": "Банкомат", "limit": None},
+                                {"day": 1, "place": "Пустой", "limit": 0}, {"day": 2, "limit": "5000"}]}
+    assert hike_points(hike_data) == [{"day": 2, "place": "", "limit": 5000.0},
+                                      {"day": 3, "place": "Банкомат", "limit": None}]
+
+
+def test_plans_are_cached_until_inputs_change(monkeypatch):
+    model, topup_planner = planner()
+    calls = []
+    original = topups.schedule_topups
+    monkeypatch.setattr(topups, "schedule_topups", lambda *args: calls.append(1) or original(*args))
+    first = topup_planner.plan(0)
+    assert topup_planner.plan(0) is first and len(calls) == 1
+    assert first["topups"][0]["place"] == "Покхара"
+    model.add_entry(0, 0, "Чай", -10)
+    assert topup_planner.plan(0) is not first and len(calls) == 2
+    model.set_presence(0, [[0, 6]])
+    topup_planner.plan(0)
+    assert len(calls) == 3
+
+
+def test_invalidate_rereads_points():
+    model, topup_planner = planner()
+    assert topup_planner.plan(0)["topups"]
+    model.hike_data[POINTS_FIELD] = []
+    topup_planner.invalidate()
+    plan = topup_planner.plan(0)
+    assert plan["topups"] == [] and plan["shortfall"] > 0
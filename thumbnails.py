@@ -0,0 +1,98 @@
+import os, multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtGui import QPixmap
+from attachments import make_thumbnail, THUMBNAIL_SIZE
+
+# Бюджет памяти для миниатюр в памяти (МБ)
+DEFAULT_THUMBNAIL_CACHE_MB = 16
+# Число процессов для создания миниатюр
+DEFAULT_THUMBNAIL_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+class ThumbnailCache:
+    """
+    LRU-кэш миниатюр в памяти с ограничением по объёму.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.items = OrderedDict()  # хэш -> (QPixmap, размер в байтах)
+        self.total_bytes = 0
+
+    def get(self, digest):
+        item = self.items.get(digest)
+        if item is None:
+            return None
+        self.items.move_to_end(digest)
+        return item[0]
+
+    def put(self, digest, pixmap):
+        size = pixmap.width() * pixmap.height() * 4
+        if digest in self.items:
+            self.total_bytes -= self.items.pop(digest)[1]
+        self.items[digest] = (pixmap, size)
+        self.total_bytes += size
+        while self.total_bytes > self.budget_bytes and len(self.items) > 1:
+            _, (_, evicted_size) = self.items.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+
+class ThumbnailLoader(QObject):
+    """
+    Загружает миниатюры чеков по запросу.
+
+    Готовые миниатюры берутся из кэша в памяти или с диска, недостающие создаются
+    в пуле процессов, чтобы масштабирование фотографий не тормозило интерфейс.
+    Сигнал ready(хэш) приходит в поток интерфейса, когда миниатюра готова.
+    """
+
+    ready = pyqtSignal(str)
+
+    def __init__(self, budget_bytes=DEFAULT_THUMBNAIL_CACHE_MB * 1024 * 1024,
+                 workers=DEFAULT_THUMBNAIL_WORKERS, parent=None):
+        super().__init__(parent)
+        self.cache = ThumbnailCache(budget_bytes)
+        self.workers = workers
+        self.executor = None
+        self.pending = {}  # хэш -> путь к миниатюре
+        self.failed = set()
+        self.ready.connect(self._on_ready)
+
+    def thumbnail(self, store, digest):
+        """
+        Возвращает QPixmap миниатюры или None, если она ещё создаётся.
+        """
+        pixmap = self.cache.get(digest)
+        if pixmap is not None or digest in self.failed:
+            return pixmap
+        thumb_path = store.thumbnail_path(digest, THUMBNAIL_SIZE)
+        if os.path.exists(thumb_path):
+            pixmap = QPixmap(thumb_path)
+            if not pixmap.isNull():
+                self.cache.put(digest, pixmap)
+                return pixmap
+        if digest not in self.pending and store.has(digest):
+            if self.executor is None:
+                # fork работающего Qt-приложения с его потоками может зависнуть: процессы запускаются заново
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            os.makedirs(store.thumbs_dir, exist_ok=True)
+            self.pending[digest] = thumb_path
+            future = self.executor.submit(make_thumbnail, store.blob_path(digest), thumb_path)
+            # Обратный вызов выполняется в служебном потоке: сигнал доставит его в поток интерфейса
+            future.add_done_callback(lambda f, digest=digest: self.ready.emit(digest))
+        return None
+
+    def _on_ready(self, digest):
+        thumb_path = self.pending.pop(digest, None)
+        pixmap = QPixmap(thumb_path) if thumb_path and os.path.exists(thumb_path) else QPixmap()
+        if pixmap.isNull():
+            self.failed.add(digest)
+        else:
+            self.cache.put(digest, pixmap)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
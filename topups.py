@@ -0,0 +1,216 @@
+import sys, json, math, heapq, time, argparse
+from hikemodel import LOW_BALANCE_THRESHOLD, TOPUP_CATEGORY
+
+# Места маршрута, где можно снять или получить наличные: поле похода
+# topup_points = [{"day": номер дня с нуля, "place": "Покхара", "limit": сумма или null}]
+POINTS_FIELD = "topup_points"
+
+
+def hike_points(hike_data):
+    """
+    Возвращает места пополнения похода, отсортированные по дням.
+    Места с нулевым или отрицательным лимитом пропускаются: снять там нечего.
+    """
+    points = []
+    for point in hike_data.get(POINTS_FIELD, []):
+        limit = point.get("limit")
+        limit = None if limit is None else float(limit)
+        if limit is not None and limit <= 0:
+            continue
+        points.append({"day": int(point["day"]), "place": str(point.get("place", "")), "limit": limit})
+    return sorted(points, key=lambda point: point["day"])
+
+
+def parse_points(text, days):
+    """
+    Разбирает места пополнения по строкам "день; место; лимит" (день с единицы,
+    лимит снятия необязателен). Бросает ValueError при неверной строке.
+    """
+    points = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        cells = [cell.strip() for cell in line.split(";")]
+        try:
+            day = int(cells[0])
+            limit = float(cells[2].replace(" ", "")) if len(cells) > 2 and cells[2] else None
+        except ValueError:
+            raise ValueError(f"строка {number}: ожидается \"день; место; лимит\"")
+        if not 1 <= day <= days:
+            raise ValueError(f"строка {number}: день {day} вне похода (1-{days})")
+        if limit is not None and limit <= 0:
+            raise ValueError(f"строка {number}: лимит должен быть положительным")
+        points.append({"day": day - 1, "place": cells[1] if len(cells) > 1 else "", "limit": limit})
+    return sorted(points, key=lambda point: point["day"])
+
+
+def format_points(points):
+    """
+    Места пополнения текстом для правки (обратное к parse_points).
+    """
+    return "\n".join(f"{point['day'] + 1}; {point['place']}; {'' if point['limit'] is None else round(point['limit'])}"
+                     for point in points)
+
+
+def schedule_topups(balance, spend, points, start_day, threshold=LOW_BALANCE_THRESHOLD):
+    """
+    Наименьшее число пополнений (а при нём - наименьшая сумма), при котором остаток
+    после каждого дня не опускается ниже threshold.
+
+    spend[d] - ожидаемый расход дня d, пополнение в месте дня d делается до расходов этого дня.
+    Жадный выбор с кучей (как в задаче о минимуме заправок): идём по дням, а когда остаток
+    падает ниже порога, берём из пройденных мест то, где можно снять больше всего.
+    Это точный оптимум по числу пополнений за O(D log D). Суммы затем урезаются
+    до необходимых: ранние пополнения берутся полностью, последнее - сколько нужно.
+
+    Возвращает {"topups": [{"day", "place", "amount"}], "shortfall"}; shortfall - сколько
+    внести сразу, если до нехватки денег нет ни одного места пополнения.
+    """
+    heap, chosen = [], []
+    shortfall = 0.0
+    current = balance
+    future = sum(spend[start_day:])
+    position = 0
+    while position < len(points) and points[position]["day"] < start_day:
+        position += 1
+    for day in range(start_day, len(spend)):
+        while position < len(points) and points[position]["day"] == day:
+            point = points[position]
+            # При равных лимитах предпочитаем более позднее место: меньше носить наличных
+            limit = point["limit"] if point["limit"] is not None else float("inf")
+            heapq.heappush(heap, (-limit, -day, position))
+            position += 1
+        current -= spend[day]
+        future -= spend[day]
+        while current < threshold:
+            if not heap:
+                shortfall += threshold - current
+                current = threshold
+                break
+            limit, _, index = heapq.heappop(heap)
+            chosen.append(index)
+            # Место без лимита закрывает всю оставшуюся нехватку
+            current += min(-limit, threshold - current + future)
+    need = max(threshold + sum(spend[start_day:]) - balance - shortfall, 0.0)
+    topups = []
+    for index in sorted(chosen):
+        point = points[index]
+        limit = point["limit"] if point["limit"] is not None else float("inf")
+        amount = min(limit, need)
+        if amount <= 0:
+            break
+        need -= amount
+        topups.append({"day": point["day"], "place": point["place"], "amount": _whole(amount)})
+    return {"topups": [topup for topup in topups if topup["amount"] > 0], "shortfall": _whole(shortfall)}
+
+
+def _whole(amount):
+    # Суммы - целые рупии с округлением вверх; погрешность прогноза в доли рупии не в счёт
+    return max(math.ceil(amount - 1e-6), 0)
+
+
+class TopupPlanner:
+    """
+    План пополнений участников по прогнозу расхода модели похода
+    и местам пополнения на маршруте. Пересчитывается за O(D log D) на участника,
+    только если с прошлого раза изменились остаток, расход в день, текущий день
+    или присутствие участника; после правки мест пополнения - invalidate().
+    """
+
+    def __init__(self, model, threshold=LOW_BALANCE_THRESHOLD):
+        self.model = model
+        self.threshold = threshold
+        self.cache = {}  # участник -> (ключ входных данных, план)
+        self._points = None
+
+    def points(self):
+        if self._points is None:
+            self._points = hike_points(self.model.hike_data)
+        return self._points
+
+    def invalidate(self):
+        """
+        Сбрасывает сохранённые планы (после изменения мест пополнения).
+        """
+        self.cache = {}
+        self._points = None
+
+    def _key(self, participant):
+        forecast = self.model.forecast
+        presence = self.model.presence.get(participant)
+        return (self.model.total(participant), forecast.rate(participant), forecast.current_day,
+                tuple(map(tuple, presence)) if presence is not None else None)
+
+    def spend(self, participant):
+        """
+        Ожидаемый расход участника по дням: сглаженный расход в дни присутствия после текущего.
+        """
+        forecast = self.model.forecast
+        rate = forecast.rate(participant)
+        start = forecast.current_day + 1
+        return [rate if day >= start and self.model.is_present(participant, day) else 0.0
+                for day in range(self.model.days)]
+
+    def plan(self, participant, points=None, spend=None):
+        """
+        План пополнений участника: {"participant", "topups", "shortfall"}.
+        spend - свой план расходов по дням вместо прогноза.
+        План по прогнозу и местам похода сохраняется до изменения входных данных.
+        """
+        cached = points is None and spend is None
+        if cached:
+            key = self._key(participant)
+            if participant in self.cache and self.cache[participant][0] == key:
+                return self.cache[participant][1]
+        points = self.points() if points is None else points
+        spend = self.spend(participant) if spend is None else spend
+        start = self.model.forecast.current_day + 1
+        plan = schedule_topups(self.model.total(participant), spend, points, start, self.threshold)
+        plan["participant"] = participant
+        if cached:
+            self.cache[participant] = (key, plan)
+        return plan
+
+    def plans(self):
+        """
+        Планы всех участников без фондов.
+        """
+        return [self.plan(i) for i in range(len(self.model.participants)) if not self.model.is_pool(i)]
+
+
+def plan_text(plan):
+    """
+    Краткий текст плана пополнений.
+    """
+    parts = []
+    if plan["shortfall"] > 0:
+        parts.append(f"сейчас {plan['shortfall']:.0f}")
+    parts += [f"{topup['day'] + 1}-й день{' (' + topup['place'] + ')' if topup['place'] else ''} {topup['amount']:.0f}"
+              for topup in plan["topups"]]
+    return f"{TOPUP_CATEGORY}: " + ", ".join(parts) if parts else "Пополнения не нужны"
+
+
+def main(argv=None):
+    """
+    План пополнений по файлу похода: python topups.py поход.json
+    """
+    from hikemodel import HikeModel
+    parser = argparse.ArgumentParser(description="План пополнений участников похода")
+    parser.add_argument("hike")
+    parser.add_argument("--threshold", type=float, default=LOW_BALANCE_THRESHOLD)
+    args = parser.parse_args(argv)
+    with open(args.hike, "r", encoding="utf-8") as file:
+        hike_data = json.load(file)
+    model = HikeModel(hike_data)
+    planner = TopupPlanner(model, args.threshold)
+    started = time.perf_counter()
+    plans = planner.plans()
+    elapsed = (time.perf_counter() - started) * 1000
+    for plan in plans:
+        print(f"{model.participants[plan['participant']]['name']}: {plan_text(plan)}")
+    print(f"Планы {len(plans)} участников за {elapsed:.1f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
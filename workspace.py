@@ -0,0 +1,292 @@
+import os, copy
+from PyQt6.QtWidgets import QTabWidget, QWidget, QVBoxLayout
+from mainworks import MainWorksWidget
+from hikecache import HikeCache
+from filewatch import HikeFileLock, HikeFileWatcher, merge_expenses, same_structure
+from hikemodel import HikeModel
+
+
+class HikeTab(QWidget):
+    """
+    Вкладка одного похода.
+    Хранит путь к файлу и признак несохранённых изменений; виджеты создаются
+    только пока вкладка активна.
+    """
+
+    def __init__(self, filename, parent=None):
+        super().__init__(parent)
+        self.filename = filename
+        self.hike_name = ""
+        self.modified = False
+        self.base_expenses = None  # расходы на момент последней загрузки/сохранения файла
+        self.lock = None
+        self.lock_owner = None
+        self.works_widget = None
+        self.view = None
+        self.view_layout = QVBoxLayout(self)
+        self.view_layout.setContentsMargins(0, 0, 0, 0)
+
+    def title(self):
+        """
+        Возвращает текст заголовка вкладки: имя файла или название похода, со звёздочкой при изменениях.
+        """
+        title = os.path.basename(self.filename) if self.filename else self.hike_name
+        return f"{title}*" if self.modified else title
+
+    def set_view(self, widget):
+        """
+        Показывает во вкладке указанный виджет (таблицу расходов или статистику).
+        Предыдущее представление удаляется, виджет расходов только скрывается.
+        """
+        if self.view is widget:
+            return
+        if self.view is not None:
+            self.view_layout.removeWidget(self.view)
+            if self.view is self.works_widget:
+                self.view.hide()
+            else:
+                self.view.deleteLater()
+        self.view = widget
+        self.view_layout.addWidget(widget)
+        widget.show()
+
+    def release(self):
+        """
+        Удаляет виджеты вкладки и возвращает актуальные данные похода.
+        """
+        if self.works_widget is None:
+            return None
+        hike_data = self.works_widget.hike_data
+        hike_data['expenses_data'] = self.works_widget.get_expenses_data()
+        self.modified = self.works_widget.has_unsaved_changes
+        if self.view is not None and self.view is not self.works_widget:
+            self.view.deleteLater()
+        self.works_widget.deleteLater()
+        self.works_widget = None
+        self.view = None
+        return hike_data
+
+
+class HikeWorkspace(QTabWidget):
+    """
+    Рабочая область с несколькими открытыми походами во вкладках.
+    Виджеты существуют только у активной вкладки; данные неактивных походов
+    лежат в HikeCache и при возврате на вкладку не перечитываются из файла.
+    """
+
+    def __init__(self, loader, budget_bytes, parent=None):
+        """
+        :param loader: Функция filename -> hike_data для походов, вытесненных из кэша.
+        :param budget_bytes: Бюджет памяти кэша неактивных походов.
+        """
+        super().__init__(parent)
+        self.loader = loader
+        self.cache = HikeCache(budget_bytes)
+        self.active_tab = None
+        self.watcher = HikeFileWatcher(self._on_file_changed, self)
+        self.setTabsClosable(True)
+        self.setMovable(True)
+        self.setDocumentMode(True)
+        self.currentChanged.connect(self._on_current_changed)
+        self.tabCloseRequested.connect(self.close_tab)
+
+    def tabs(self):
+        return [self.widget(i) for i in range(self.count())]
+
+    def find_tab(self, filename):
+        """
+        Возвращает вкладку с указанным файлом или None.
+        """
+        if not filename:
+            return None
+        path = os.path.abspath(filename)
+        for tab in self.tabs():
+            if tab.filename and os.path.abspath(tab.filename) == path:
+                return tab
+        return None
+
+    def current_tab(self):
+        return self.currentWidget()
+
+    def current_works_widget(self):
+        tab = self.currentWidget()
+        return tab.works_widget if tab else None
+
+    def add_hike(self, filename, hike_data):
+        """
+        Открывает поход в новой вкладке или переключается на уже открытую вкладку этого файла.
+        """
+        tab = self.find_tab(filename)
+        if tab is None:
+            tab = HikeTab(filename)
+            tab.hike_name = hike_data.get('hike_name', '')
+            tab.base_expenses = copy.deepcopy(hike_data['expenses_data'])
+            self._attach_file(tab)
+            self.cache.put(tab, hike_data, pinned=filename is None)
+            self.addTab(tab, tab.title())
+        self.setCurrentWidget(tab)
+        if self.active_tab is not tab:
+            self._on_current_changed(self.indexOf(tab))
+        return tab
+
+    def close_tab(self, index):
+        """
+        Закрывает вкладку и освобождает данные похода.
+        """
+        tab = self.widget(index)
+        if tab is None:
+            return
+        if tab is self.active_tab:
+            tab.release()
+            self.active_tab = None
+        self.cache.pop(tab)
+        self._detach_file(tab)
+        self.removeTab(index)
+        tab.deleteLater()
+        if self.count() == 0 and hasattr(self.window(), "on_workspace_empty"):
+            self.window().on_workspace_empty()
+
+    def set_tab_file(self, tab, filename):
+        """
+        Привязывает вкладку к другому файлу (после "Сохранить как"): переносит блокировку и наблюдение.
+        """
+        self._detach_file(tab)
+        tab.filename = filename
+        self._attach_file(tab)
+        self.update_tab_title(tab)
+
+    def mark_saved(self, tab, hike_data):
+        """
+        Запоминает сохранённое состояние как общую базу для слияния с внешними правками.
+        """
+        tab.base_expenses = copy.deepcopy(hike_data['expenses_data'])
+        if tab.filename:
+            self.watcher.expect_write(tab.filename)
+
+    def sync_external(self, tab):
+        """
+        Применяет внешние изменения файла вкладки, если наблюдатель ещё не успел их обработать.
+        Вызывается перед сохранением, чтобы не затереть чужие правки.
+        """
+        if tab.filename and self.watcher.is_changed(tab.filename):
+            self.watcher.mark_seen(tab.filename)
+            self._on_file_changed(tab.filename)
+
+    def _attach_file(self, tab):
+        if not tab.filename:
+            return
+        tab.lock = HikeFileLock(tab.filename)
+        tab.lock_owner = tab.lock.acquire()
+        self.watcher.watch(tab.filename)
+
+    def _detach_file(self, tab):
+        if tab.lock is not None:
+            tab.lock.release()
+            tab.lock = None
+        if tab.filename:
+            self.watcher.unwatch(tab.filename)
+
+    def _on_file_changed(self, filename):
+        tab = self.find_tab(filename)
+        if tab is None:
+            return
+        try:
+            disk_data = self.loader(filename)
+        except (OSError, ValueError):
+            # Файл ещё дописывается или повреждён - дождёмся следующего изменения
+            return
+        self.merge_external(tab, disk_data)
+
+    def merge_external(self, tab, disk_data):
+        """
+        Применяет внешние изменения файла к открытому походу.
+        Меняются только ячейки, изменённые на диске; таблица не перестраивается.
+        При изменении участников или дат поход перезагружается (с подтверждением,
+        если есть несохранённые изменения).
+        """
+        window = self.window()
+        active = tab is self.active_tab and tab.works_widget is not None
+        if active:
+            local_data = tab.works_widget.hike_data
+            local_expenses = tab.works_widget.get_expenses_data()
+        else:
+            local_data = self.cache.peek(tab)
+            if local_data is None:
+                # Данные вытеснены из кэша и будут перечитаны при активации
+                tab.base_expenses = copy.deepcopy(disk_data['expenses_data'])
+                return
+            if not tab.modified:
+                self.cache.pop(tab)
+                tab.base_expenses = copy.deepcopy(disk_data['expenses_data'])
+                return
+            local_expenses = local_data['expenses_data']
+
+        if not same_structure(local_data, disk_data):
+            reload = not tab.modified
+            if not reload and hasattr(window, "confirm_external_reload"):
+                reload = window.confirm_external_reload(tab)
+            if reload:
+                self.reload_tab(tab, disk_data)
+            else:
+                tab.base_expenses = copy.deepcopy(disk_data['expenses_data'])
+            return
+
+        # Ячейки и итоги открытой вкладки обновляются по событиям её модели
+        model = tab.works_widget.model if active else HikeModel(local_data)
+        if 'journal' in disk_data:
+            # Записи имеют идентификаторы: объединяем журналы, конфликтов не бывает
+            changes = [(day, participant, model.journal.cell_text(day, participant))
+                       for day, participant in model.journal.merge(disk_data['journal'])]
+            conflicts = []
+        else:
+            changes, conflicts = merge_expenses(tab.base_expenses or [], local_expenses,
+                                                disk_data['expenses_data'])
+            for row, idx, text in changes:
+                model.replace_cell_text(row, idx, text)
+        tab.base_expenses = copy.deepcopy(disk_data['expenses_data'])
+        if hasattr(window, "on_external_changes"):
+            window.on_external_changes(tab, local_data, changes, conflicts)
+
+    def reload_tab(self, tab, hike_data):
+        """
+        Полностью заменяет данные вкладки (при изменении структуры похода).
+        """
+        tab.base_expenses = copy.deepcopy(hike_data['expenses_data'])
+        tab.modified = False
+        if tab is self.active_tab and tab.works_widget is not None:
+            tab.release()
+            tab.modified = False
+            self.cache.put(tab, hike_data)
+            self._activate(tab)
+        else:
+            self.cache.put(tab, hike_data)
+        self.update_tab_title(tab)
+
+    def update_tab_title(self, tab):
+        index = self.indexOf(tab)
+        if index >= 0:
+            self.setTabText(index, tab.title())
+
+    def _on_current_changed(self, index):
+        tab = self.widget(index) if index >= 0 else None
+        if tab is self.active_tab:
+            return
+        if self.active_tab is not None and self.indexOf(self.active_tab) >= 0:
+            previous = self.active_tab
+            hike_data = previous.release()
+            if hike_data is not None:
+                pinned = previous.modified or previous.filename is None
+                self.cache.put(previous, hike_data, pinned=pinned)
+        self.active_tab = tab
+        if tab is not None:
+            self._activate(tab)
+        if hasattr(self.window(), "on_hike_tab_changed"):
+            self.window().on_hike_tab_changed(tab)
+
+    def _activate(self, tab):
+        hike_data = self.cache.pop(tab)
+        if hike_data is None:
+            hike_data = self.loader(tab.filename)
+        tab.works_widget = MainWorksWidget(hike_data, tab)
+        tab.works_widget.has_unsaved_changes = tab.modified
+        tab.set_view(tab.works_widget)